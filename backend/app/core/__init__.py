@@ -32,11 +32,8 @@ from .events import (
     shutdown_services,
 )
 
-# Configurar logging
-from .logging import setup_logging, get_logger
-
-# Configurar logging al importar el módulo
-logger = setup_logging()
+# Logging (se configura una sola vez al arrancar la aplicación)
+from .logging import setup_logging, get_logger, logger
 
 # Versión de la API
 __version__ = "1.0.0"
@@ -57,8 +57,44 @@ class Settings(BaseSettings):
     OPENAI_TEMPERATURE: float = 0.7
     OPENAI_MAX_TOKENS: int = 1000
     
-    # Whisper (STT)
+    # Pool HTTP compartido con las APIs externas
+    HTTP_MAX_CONNECTIONS: int = 100
+    HTTP_MAX_KEEPALIVE: int = 20  # Conexiones inactivas que se mantienen abiertas
+    HTTP_KEEPALIVE_EXPIRY: float = 60.0  # segundos
+    HTTP2: bool = True  # Solo si el paquete h2 está instalado
+    HTTP_WARMUP_CONNECTIONS: int = 2  # Conexiones abiertas al arrancar
+    
+    # Calentamiento al arrancar (/readyz responde 503 hasta que termina)
+    WARMUP_TIMEOUT: float = 60.0  # Tiempo máximo de cada paso
+    WARMUP_TTS_PREFILL: int = 32  # Frases predefinidas que se sintetizan de antemano
+    
+    # Memoria de conversación (historial por sesión)
+    CONVERSATION_MAX_TOKENS: int = 1500  # Presupuesto del prompt completo
+    CONVERSATION_WINDOW_TURNS: int = 6  # Turnos recientes enviados sin resumir
+    CONVERSATION_SUMMARY_TOKENS: int = 200  # Longitud máxima del resumen de los turnos antiguos
+    
+    # Enrutado de LLM (LLMOrchestrator)
+    LLM_LATENCY_BUDGET_MS: float = 2500  # p95 máximo antes de desviar el tráfico
+    LLM_MAX_ERROR_RATE: float = 0.5
+    LLM_RECOVERY_SECONDS: float = 30  # Tras este tiempo sin tráfico se vuelve a probar un backend
+    LLM_STATS_WINDOW: int = 100  # Peticiones recientes usadas para los percentiles
+    LLM_HEDGE: bool = False  # Duplicar en el backend alternativo las consultas lentas
+    LLM_HEDGE_PERCENTILE: float = 95  # Percentil de latencia que dispara el duplicado
+    LLM_HEDGE_MIN_DELAY_MS: float = 50
+    LLM_HEDGE_MAX_RATE: float = 0.1  # Fracción máxima de consultas duplicadas
+    
+    # LLM local (proceso residente con llama.cpp)
+    LOCAL_LLM_MODEL_PATH: str = ""  # Modelo GGUF; "echo" usa el modelo de prueba; vacío lo desactiva
+    LOCAL_LLM_CTX: int = 2048
+    LOCAL_LLM_MAX_TOKENS: int = 128
+    LOCAL_LLM_QUEUE_SIZE: int = 16
+    
+    # Whisper (STT): "whisper-1" usa la API de OpenAI; tiny, base, small,
+    # medium o large-v3 cargan un modelo local de openai-whisper al arrancar
     WHISPER_MODEL: str = "whisper-1"
+    WHISPER_DEVICE: str = "cpu"
+    STT_BATCH_SIZE: int = 8  # Clips por lote con Whisper local (1 = sin lotes)
+    STT_BATCH_WAIT_MS: float = 10.0  # Espera máxima para completar un lote
     
     # TTS
     TTS_VOICE: str = "alloy"  # Voz por defecto para TTS
@@ -67,14 +103,14 @@ class Settings(BaseSettings):
     BASE_DIR: Path = Path(__file__).resolve().parent.parent.parent
     UPLOAD_DIR: Path = BASE_DIR / "uploads"
     AUDIO_CACHE_DIR: Path = BASE_DIR / "static" / "audio"
+    AUDIO_CHUNK_BYTES: int = 32 * 1024  # Audio máximo por frame binario de respuesta
+    AUDIO_ENCODE_WORKERS: int = 2  # Hilos que codifican el audio de respuesta (ogg, flac, pcm)
+    AUDIO_OGG_QUALITY: float = 0.4  # Calidad de Vorbis (0-1)
+    TTS_CACHE_MEMORY_BYTES: int = 32 * 1024 * 1024  # Nivel en memoria del caché de audio TTS
+    TTS_CACHE_DISK_BYTES: int = 512 * 1024 * 1024  # Nivel en disco (TTS_CACHE_DIR)
+    TTS_CACHE_DIR: Path = BASE_DIR / "cache" / "tts"  # Fuera de static/: no se sirve en /static
     LOG_DIR: Path = BASE_DIR / "logs"
     
-    # Crear directorios necesarios
-    @validator("UPLOAD_DIR", "AUDIO_CACHE_DIR", "LOG_DIR", pre=True)
-    def create_dirs(cls, v: Path) -> Path:
-        v.mkdir(parents=True, exist_ok=True)
-        return v
-    
     # Configuración de logs
     LOG_LEVEL: str = "INFO"
     LOG_FORMAT: str = "%(asctime)s - %(name)s - %(levelname)s - %(message)s"
@@ -97,6 +133,8 @@ class Settings(BaseSettings):
     
     # Configuración de caché
     CACHE_TTL: int = 300  # 5 minutos
+    LLM_CACHE_SIZE: int = 512  # Respuestas del LLM guardadas como máximo
+    LLM_CACHE_MAX_TEMPERATURE: float = 0.3  # Por encima no se cachea
     
     class Config:
         case_sensitive = True
@@ -117,14 +155,20 @@ def get_settings() -> Settings:
 # Instancia de configuración
 settings = get_settings()
 
-# Configuración de logging
-if not settings.LOG_DIR.exists():
-    settings.LOG_DIR.mkdir(parents=True, exist_ok=True)
-
-# Configuración de directorios de medios
-if not settings.UPLOAD_DIR.exists():
-    settings.UPLOAD_DIR.mkdir(parents=True, exist_ok=True)
+_directories_ready = False
 
-if not settings.AUDIO_CACHE_DIR.exists():
-    settings.AUDIO_CACHE_DIR.mkdir(parents=True, exist_ok=True)
 
+def ensure_directories(config: Optional[Settings] = None) -> None:
+    """
+    Crea los directorios de logs, subidas, audio estático y caché de TTS.
+    
+    Se ejecuta una sola vez por proceso (al arrancar la aplicación), no al
+    importar el módulo ni cada vez que se construye un `Settings`.
+    """
+    global _directories_ready
+    if _directories_ready:
+        return
+    config = config or settings
+    for directory in (config.LOG_DIR, config.UPLOAD_DIR, config.AUDIO_CACHE_DIR, config.TTS_CACHE_DIR):
+        directory.mkdir(parents=True, exist_ok=True)
+    _directories_ready = True
@@ -8,9 +8,7 @@ from typing import Dict, Any, Optional
 
 from .config import settings
 
-# Crear directorio de logs si no existe
 LOG_DIR = Path("logs")
-LOG_DIR.mkdir(exist_ok=True)
 
 # Configuración por defecto
 DEFAULT_LOG_LEVEL = logging.INFO
@@ -41,15 +39,25 @@ class JsonFormatter(logging.Formatter):
         
         return json.dumps(log_record, ensure_ascii=False)
 
-def setup_logging() -> logging.Logger:
+_configured = False
+
+def setup_logging(force: bool = False) -> logging.Logger:
     """Configura el sistema de logging de la aplicación.
     
+    Es idempotente: solo la primera llamada instala los manejadores; las
+    siguientes devuelven el logger raíz tal cual, salvo con `force=True`.
+    
     Returns:
         logging.Logger: Logger raíz configurado
     """
-    # Configurar el logger raíz
+    global _configured
     logger = logging.getLogger()
+    if _configured and not force:
+        return logger
+    
+    # Configurar el logger raíz
     logger.setLevel(DEFAULT_LOG_LEVEL)
+    LOG_DIR.mkdir(exist_ok=True)
     
     # Limpiar manejadores existentes
     for handler in logger.handlers[:]:
@@ -90,6 +98,7 @@ def setup_logging() -> logging.Logger:
     logging.getLogger("uvicorn.access").setLevel(logging.WARNING)
     logging.getLogger("httpx").setLevel(logging.WARNING)
     
+    _configured = True
     return logger
 
 def get_logger(name: Optional[str] = None) -> logging.Logger:
@@ -105,6 +114,6 @@ def get_logger(name: Optional[str] = None) -> logging.Logger:
         return logging.getLogger()
     return logging.getLogger(name)
 
-# Configurar logging al importar el módulo
-logger = setup_logging()
+# La configuración la hace la aplicación al arrancar (setup_logging en app/main.py)
+logger = get_logger()
 
@@ -2,12 +2,12 @@ from datetime import datetime, timedelta
 from typing import Optional, Dict, Any, Union
 from jose import jwt, JWTError
 from passlib.context import CryptContext
-from fastapi import WebSocket, status, HTTPException
+from fastapi import Depends, WebSocket, status, HTTPException
 from fastapi.security import OAuth2PasswordBearer
 from pydantic import ValidationError
 
 from ..models.auth import TokenData, UserInDB
-from ..config import settings
+from .config import settings
 
 # Configuración de seguridad
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
@@ -8,10 +8,16 @@ from fastapi.staticfiles import StaticFiles
 from contextlib import asynccontextmanager
 
 # Importar configuración y utilidades
-from .core.config import settings
+from .core.config import ensure_directories, settings
 from .core.logging import setup_logging
 from .core.security import get_websocket_user
+from .services.message_codec import get_codec
+from .services.registry import ServiceRegistry, get_service_registry
 from .services.websocket_manager import WebSocketHandler
+from services.audio_encoding import get_audio_encoder
+from services.http_clients import close_http_client, open_client_registry
+from services.local_llm import get_local_llm
+from services.warmup import build_warmup
 
 # Configurar logging
 logger = setup_logging()
@@ -26,10 +32,37 @@ async def lifespan(app: FastAPI):
     if not settings.OPENAI_API_KEY:
         logger.warning("OPENAI_API_KEY no está configurada. Algunas funcionalidades pueden no estar disponibles.")
     
+    # Clientes HTTP compartidos por todas las sesiones, con las conexiones ya abiertas
+    app.state.clients = await open_client_registry(
+        api_key=settings.OPENAI_API_KEY,
+        max_connections=settings.HTTP_MAX_CONNECTIONS,
+        max_keepalive=settings.HTTP_MAX_KEEPALIVE,
+        keepalive_expiry=settings.HTTP_KEEPALIVE_EXPIRY,
+        http2=settings.HTTP2,
+        warm_up=False,
+    )
+    
+    # Servicios y tabla de conexiones compartidos por todas las sesiones
+    app.state.services = ServiceRegistry.create(settings)
+    
+    # Calentamiento en segundo plano: /healthz responde ya, /readyz cuando termine
+    app.state.warmup = build_warmup(
+        app.state.services.stt,
+        app.state.services.tts,
+        prefill=settings.WARMUP_TTS_PREFILL,
+        timeout=settings.WARMUP_TIMEOUT,
+    )
+    app.state.warmup.start()
+    
     yield
     
     # Código que se ejecuta al apagar la aplicación
     logger.info("Apagando la aplicación...")
+    await app.state.warmup.close()
+    await app.state.services.close()
+    await get_local_llm().close()
+    get_audio_encoder().close()
+    await close_http_client()
 
 app = FastAPI(
     title=settings.PROJECT_NAME,
@@ -50,8 +83,8 @@ app.add_middleware(
 )
 
 # Montar directorio estático para archivos de audio generados
-os.makedirs("static/audio", exist_ok=True)
-app.mount("/static", StaticFiles(directory="static"), name="static")
+ensure_directories()
+app.mount("/static", StaticFiles(directory=settings.AUDIO_CACHE_DIR.parent), name="static")
 
 # Manejador de errores global
 @app.exception_handler(Exception)
@@ -66,7 +99,8 @@ async def global_exception_handler(request: Request, exc: Exception):
 @app.get("/healthz", tags=["Sistema"])
 async def health_check():
     """
-    Verifica el estado del servicio.
+    Verifica que el proceso está vivo (liveness). La disponibilidad para
+    recibir tráfico se consulta en /readyz.
     """
     return {
         "status": "ok",
@@ -74,23 +108,47 @@ async def health_check():
         "environment": "development" if settings.DEBUG else "production"
     }
 
+# Endpoint de disponibilidad
+@app.get("/readyz", tags=["Sistema"])
+async def readiness_check(request: Request):
+    """
+    Indica si el servicio puede recibir tráfico: responde 503 hasta que
+    termina el calentamiento (modelos, procesos TTS, cachés y conexiones).
+    """
+    warmup = request.app.state.warmup
+    return JSONResponse(
+        status_code=status.HTTP_200_OK if warmup.ready else status.HTTP_503_SERVICE_UNAVAILABLE,
+        content={"status": "ready" if warmup.ready else "warming_up", **warmup.status()},
+    )
+
+# Sesiones activas
+@app.get("/sessions", tags=["Sistema"])
+async def list_sessions(request: Request):
+    """
+    Sesiones WebSocket activas en este proceso, según la tabla de conexiones compartida.
+    """
+    return request.app.state.services.stats()
+
 # Endpoint WebSocket
 @app.websocket("/ws/assistant")
 async def websocket_endpoint(
     websocket: WebSocket,
     token: str = None,
+    encoding: str = "json",
+    services: ServiceRegistry = Depends(get_service_registry),
 ):
     """
     Endpoint WebSocket para la comunicación con el asistente de voz.
     
     Parámetros de consulta:
     - token: Token JWT para autenticación (opcional si se envía en el mensaje AUTH)
+    - encoding: Codificación de los mensajes de control, `json` (por defecto) o `msgpack`
     """
     # Generar un ID único para la conexión
     connection_id = str(uuid.uuid4())
     
-    # Crear manejador WebSocket
-    handler = WebSocketHandler(websocket, connection_id)
+    # Crear manejador WebSocket (los servicios ya existen; solo se registra la sesión)
+    handler = WebSocketHandler(websocket, connection_id, services, get_codec(encoding))
     
     try:
         # Manejar la conexión
@@ -99,8 +157,7 @@ async def websocket_endpoint(
         logger.error(f"Error en la conexión WebSocket {connection_id}: {str(e)}", exc_info=True)
     finally:
         # Limpiar recursos
-        if hasattr(handler, 'manager'):
-            handler.manager.disconnect(connection_id)
+        services.connections.disconnect(connection_id)
 
 # Incluir routers de la API
 # from .api.v1.endpoints import auth, users, conversations
@@ -1,5 +1,6 @@
-from pydantic import BaseModel, Field, validator
-from typing import Dict, Any, Optional, List, Union
+from pydantic import BaseModel, Discriminator, Field, Tag, field_validator
+from typing import Dict, Any, Optional, List, Literal, Union
+from typing_extensions import Annotated
 from enum import Enum
 
 class MessageType(str, Enum):
@@ -37,6 +38,13 @@ class ConfigModel(BaseModel):
     voice_speed: float = Field(default=1.0, ge=0.5, le=2.0, description="Velocidad de la voz (0.5-2.0)")
     voice_volume: float = Field(default=0.9, ge=0.0, le=1.0, description="Volumen de la voz (0-1)")
     
+    # Audio de salida: codecs aceptados por orden de preferencia (wav, pcm, flac, ogg)
+    audio_codecs: List[str] = Field(default_factory=lambda: ["wav"], description="Codecs de audio aceptados por el cliente")
+    output_sample_rate: Optional[int] = Field(
+        default=None, ge=8000, le=48000,
+        description="Frecuencia del audio de respuesta (por defecto la del TTS)"
+    )
+    
     # Idioma
     language: str = Field(default="es-ES", description="Idioma para STT/TTS")
     
@@ -64,71 +72,110 @@ class ConfigModel(BaseModel):
                 "voice_type": "default",
                 "voice_speed": 1.0,
                 "voice_volume": 0.9,
+                "audio_codecs": ["ogg", "flac", "wav"],
+                "output_sample_rate": 24000,
                 "language": "es-ES",
                 "system_prompt": "Eres un asistente amable y servicial.",
                 "elevenlabs_voice_id": None
             }
         }
     
-    def update(self, new_config: Dict[str, Any]) -> None:
-        """Actualiza la configuración con nuevos valores"""
+    def update(self, new_config: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Actualiza la configuración con nuevos valores.
+
+        Returns:
+            Dict[str, Any]: Solo los campos que han cambiado (el delta que se envía al cliente)
+        """
+        changed = {}
         for key, value in new_config.items():
-            if hasattr(self, key):
+            if key in type(self).model_fields and getattr(self, key) != value:
                 setattr(self, key, value)
+                changed[key] = value
+        return changed
 
 class WebSocketMessage(BaseModel):
     """Modelo base para mensajes WebSocket"""
     type: MessageType
     data: Optional[Dict[str, Any]] = None
     
-    @validator('type', pre=True)
+    @field_validator("type", mode="before")
+    @classmethod
     def validate_message_type(cls, v):
-        if isinstance(v, str):
-            return MessageType(v.lower())
-        return v
+        # Los clientes pueden enviar el tipo en mayúsculas ("AUTH", "Text")
+        return v.lower() if isinstance(v, str) else v
 
 class AuthMessage(WebSocketMessage):
     """Mensaje de autenticación WebSocket"""
-    type: MessageType = MessageType.AUTH
+    type: Literal[MessageType.AUTH] = MessageType.AUTH
     token: str
 
 class ConfigMessage(WebSocketMessage):
     """Mensaje de configuración WebSocket"""
-    type: MessageType = MessageType.CONFIG
+    type: Literal[MessageType.CONFIG] = MessageType.CONFIG
     config: Dict[str, Any]
 
 class AudioMessage(WebSocketMessage):
     """Mensaje de audio WebSocket"""
-    type: MessageType = MessageType.AUDIO
+    type: Literal[MessageType.AUDIO] = MessageType.AUDIO
     audio_data: bytes
     sample_rate: Optional[int] = None
     channels: Optional[int] = None
 
 class TextMessage(WebSocketMessage):
     """Mensaje de texto WebSocket"""
-    type: MessageType = MessageType.TEXT
+    type: Literal[MessageType.TEXT] = MessageType.TEXT
     text: str
 
 class ResponseMessage(WebSocketMessage):
-    """Mensaje de respuesta WebSocket"""
-    type: MessageType = MessageType.RESPONSE
+    """
+    Mensaje de respuesta WebSocket (frame de control).
+
+    El audio no viaja en el JSON: si `audio_id` está presente, a continuación
+    llegan frames binarios con ese id y su índice de fragmento
+    (`services.audio_frames`), y el último lleva la marca de final.
+    """
+    type: Literal[MessageType.RESPONSE] = MessageType.RESPONSE
     text: str
-    audio_data: Optional[bytes] = None
+    audio_id: Optional[str] = Field(default=None, description="Id de los frames binarios con el audio de la respuesta")
+    timings: Optional[Dict[str, float]] = Field(default=None, description="Duración de cada etapa en milisegundos")
     config: Optional[Dict[str, Any]] = None
 
 class ErrorMessage(WebSocketMessage):
     """Mensaje de error WebSocket"""
-    type: MessageType = MessageType.ERROR
+    type: Literal[MessageType.ERROR] = MessageType.ERROR
     error: str
     details: Optional[Dict[str, Any]] = None
 
 class PingMessage(WebSocketMessage):
     """Mensaje de ping/pong para mantener la conexión activa"""
-    type: MessageType = MessageType.PING
+    type: Literal[MessageType.PING] = MessageType.PING
     timestamp: float
 
 class PongMessage(WebSocketMessage):
     """Respuesta a un mensaje de ping"""
-    type: MessageType = MessageType.PONG
+    type: Literal[MessageType.PONG] = MessageType.PONG
     timestamp: float
 
+
+def _message_tag(message: Any) -> Optional[str]:
+    """`type` de un mensaje sin distinguir mayúsculas (la unión sigue eligiendo el modelo por etiqueta)"""
+    tag = message.get("type") if isinstance(message, dict) else getattr(message, "type", None)
+    if isinstance(tag, Enum):
+        tag = tag.value
+    return tag.lower() if isinstance(tag, str) else None
+
+
+# Mensajes que puede enviar el cliente por el canal de control, distinguidos
+# por `type` (el audio llega en frames binarios, ver `services.audio_frames`).
+# pydantic no admite validadores `before` en un discriminador por campo, así
+# que se usa uno por función para aceptar "AUTH" o "Text" como hasta ahora.
+ClientMessage = Annotated[
+    Union[
+        Annotated[AuthMessage, Tag(MessageType.AUTH.value)],
+        Annotated[ConfigMessage, Tag(MessageType.CONFIG.value)],
+        Annotated[TextMessage, Tag(MessageType.TEXT.value)],
+        Annotated[PingMessage, Tag(MessageType.PING.value)],
+    ],
+    Discriminator(_message_tag),
+]
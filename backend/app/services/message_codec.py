@@ -0,0 +1,122 @@
+"""
+Codificación de los mensajes de control del WebSocket.
+
+- Entrada: un único `TypeAdapter` sobre la unión discriminada por `type`
+  (`ClientMessage`), compilado al importar el módulo. pydantic-core parsea y
+  valida el JSON en un solo paso, sin `json.loads` previo ni búsqueda del
+  modelo a mano.
+- Salida: `model_dump` + orjson.
+- Modo msgpack opcional, negociado por conexión (`?encoding=msgpack`): los
+  mensajes de control viajan como frames binarios msgpack. En ese modo el
+  audio tiene que llegar en frames con cabecera `VA` (`services.audio_frames`):
+  cualquier otro frame binario se decodifica como mensaje de control. El
+  audio antiguo sin cabecera puede empezar por cualquier byte, incluidos los
+  de un mapa msgpack, así que solo se admite en modo JSON.
+"""
+
+import logging
+from typing import Any, Dict, Optional, Union
+
+import orjson
+from pydantic import TypeAdapter, ValidationError
+
+from ..models.websocket import ClientMessage, WebSocketMessage
+from services.audio_frames import is_audio_frame
+
+logger = logging.getLogger(__name__)
+
+JSON = "json"
+MSGPACK = "msgpack"
+
+_CLIENT_MESSAGE = TypeAdapter(ClientMessage)
+
+_UNSET = object()
+_msgpack = _UNSET
+
+
+def _get_msgpack():
+    global _msgpack
+    if _msgpack is _UNSET:
+        try:
+            import msgpack  # Dependencia opcional
+            _msgpack = msgpack
+        except ImportError:
+            _msgpack = None
+    return _msgpack
+
+
+class MessageDecodeError(ValueError):
+    """El mensaje del cliente no es válido; el texto se le devuelve como error"""
+
+
+class MessageCodec:
+    """Codifica y decodifica los mensajes de control de una conexión"""
+
+    def __init__(self, encoding: str = JSON):
+        """
+        :param encoding: `json` (frames de texto) o `msgpack` (frames binarios)
+        """
+        if encoding == MSGPACK and _get_msgpack() is None:
+            logger.warning("msgpack no está instalado; la conexión usará JSON")
+            encoding = JSON
+        self.encoding = encoding if encoding in (JSON, MSGPACK) else JSON
+        self.binary = self.encoding == MSGPACK
+
+    def encode(self, message: WebSocketMessage) -> Union[str, bytes]:
+        """Serializa un mensaje: `str` para frames de texto, `bytes` para binarios"""
+        if self.binary:
+            return _get_msgpack().packb(message.model_dump(mode="json", exclude_none=True))
+        return orjson.dumps(message.model_dump(exclude_none=True)).decode()
+
+    def decode(self, data: Union[str, bytes]) -> WebSocketMessage:
+        """
+        Valida un mensaje del cliente y devuelve el modelo de su `type`.
+
+        Raises:
+            MessageDecodeError: Si no se puede decodificar o no es un mensaje conocido
+        """
+        try:
+            if isinstance(data, str):
+                return _CLIENT_MESSAGE.validate_json(data)
+            payload = _get_msgpack().unpackb(data) if self.binary else orjson.loads(data)
+            return _CLIENT_MESSAGE.validate_python(payload)
+        except ValidationError as e:
+            raise MessageDecodeError(_describe(e)) from None
+        except ValueError:  # JSON o msgpack mal formado
+            raise MessageDecodeError("Formato del mensaje inválido") from None
+
+    def is_control_frame(self, data: bytes) -> bool:
+        """En modo msgpack, todo frame binario que no sea audio con cabecera `VA` es de control"""
+        return self.binary and bool(data) and not is_audio_frame(data)
+
+    async def send(self, websocket, message: WebSocketMessage) -> None:
+        payload = self.encode(message)
+        if self.binary:
+            await websocket.send_bytes(payload)
+        else:
+            await websocket.send_text(payload)
+
+
+def _describe(error: ValidationError) -> str:
+    first: Dict[str, Any] = error.errors(include_url=False)[0]
+    kind = first["type"]
+    if kind == "json_invalid":
+        return "Formato JSON inválido"
+    if kind == "union_tag_invalid":
+        return f"Tipo de mensaje no soportado: {first['ctx']['tag']}"
+    if kind == "union_tag_not_found":
+        return "Mensaje sin campo 'type'"
+    location = ".".join(str(part) for part in first["loc"][1:])
+    return f"Mensaje inválido: {location or first['loc']} ({first['msg']})"
+
+
+_CODECS: Dict[str, MessageCodec] = {}
+
+
+def get_codec(encoding: Optional[str] = None) -> MessageCodec:
+    """Codec compartido para cada codificación (no guarda estado por conexión)"""
+    encoding = MSGPACK if (encoding or "").lower() == MSGPACK else JSON
+    codec = _CODECS.get(encoding)
+    if codec is None:
+        codec = _CODECS[encoding] = MessageCodec(encoding)
+    return codec
@@ -0,0 +1,170 @@
+import time
+import asyncio
+import logging
+from typing import Any, Dict, List, Optional, Union
+
+from fastapi import WebSocket
+
+from ..models.websocket import WebSocketMessage
+from .message_codec import MessageCodec, get_codec
+
+logger = logging.getLogger(__name__)
+
+
+class WebSocketConnectionManager:
+    """Tabla de conexiones WebSocket activas, única para toda la aplicación"""
+    def __init__(self):
+        self.active_connections: Dict[str, WebSocket] = {}
+        self._codecs: Dict[str, MessageCodec] = {}
+        self._sessions: Dict[str, Dict[str, Any]] = {}
+
+    def __len__(self) -> int:
+        return len(self.active_connections)
+
+    async def connect(self, websocket: WebSocket, client_id: str, codec: Optional[MessageCodec] = None):
+        """
+        Establece una nueva conexión WebSocket.
+
+        :param codec: Codificación negociada para la conexión (JSON por defecto)
+        """
+        await websocket.accept()
+        codec = codec or get_codec()
+        self.active_connections[client_id] = websocket
+        self._codecs[client_id] = codec
+        self._sessions[client_id] = {"connected_at": time.time(), "user": None, "encoding": codec.encoding}
+        logger.info(f"Cliente conectado: {client_id} ({len(self)} activos)")
+
+    def disconnect(self, client_id: str):
+        """Cierra una conexión WebSocket"""
+        if client_id in self.active_connections:
+            del self.active_connections[client_id]
+            self._codecs.pop(client_id, None)
+            self._sessions.pop(client_id, None)
+            logger.info(f"Cliente desconectado: {client_id} ({len(self)} activos)")
+
+    def set_user(self, client_id: str, username: Optional[str]) -> None:
+        """Asocia el usuario autenticado a la sesión"""
+        if client_id in self._sessions:
+            self._sessions[client_id]["user"] = username
+
+    async def send_message(self, client_id: str, message: WebSocketMessage):
+        """Envía un mensaje a un cliente específico"""
+        if client_id in self.active_connections:
+            await self._send_encoded(client_id, self._codecs[client_id].encode(message))
+
+    async def _send_encoded(self, client_id: str, payload: Union[str, bytes]) -> None:
+        websocket = self.active_connections.get(client_id)
+        if websocket is None:
+            return
+        try:
+            if isinstance(payload, bytes):
+                await websocket.send_bytes(payload)
+            else:
+                await websocket.send_text(payload)
+        except Exception as e:
+            logger.error(f"Error enviando mensaje a {client_id}: {str(e)}")
+            self.disconnect(client_id)
+
+    async def send_frames(self, client_id: str, frames: List[bytes]) -> None:
+        """Envía frames binarios (audio de una respuesta) a un cliente específico"""
+        if client_id in self.active_connections:
+            websocket = self.active_connections[client_id]
+            try:
+                for frame in frames:
+                    await websocket.send_bytes(frame)
+            except Exception as e:
+                logger.error(f"Error enviando audio a {client_id}: {str(e)}")
+                self.disconnect(client_id)
+
+    async def broadcast(self, message: WebSocketMessage) -> int:
+        """Envía un mensaje a todas las sesiones activas; devuelve a cuántas llegó"""
+        client_ids = list(self.active_connections)
+        # Se serializa una vez por codificación, no una vez por cliente
+        encoded: Dict[str, Union[str, bytes]] = {}
+        for client_id in client_ids:
+            codec = self._codecs[client_id]
+            if codec.encoding not in encoded:
+                encoded[codec.encoding] = codec.encode(message)
+        await asyncio.gather(*(
+            self._send_encoded(client_id, encoded[self._codecs[client_id].encoding]) for client_id in client_ids
+        ))
+        return sum(1 for client_id in client_ids if client_id in self.active_connections)
+
+    def sessions(self) -> List[Dict[str, Any]]:
+        """Vista de las sesiones activas para métricas"""
+        now = time.time()
+        return [
+            {
+                "id": client_id,
+                "user": info["user"],
+                "encoding": info["encoding"],
+                "connected_s": round(now - info["connected_at"], 1),
+            }
+            for client_id, info in self._sessions.items()
+        ]
+
+
+class ServiceRegistry:
+    """
+    Servicios compartidos por todas las conexiones de la aplicación.
+
+    Se crea una vez en el `lifespan` y se inyecta en cada `WebSocketHandler`,
+    así que aceptar una conexión no construye servicios, clientes ni motores
+    TTS: solo reserva su entrada en la tabla de conexiones.
+    """
+
+    def __init__(self, stt_service, llm_service, tts_service):
+        """
+        :param stt_service: Servicio de transcripción (`services.stt_service.STTService`)
+        :param llm_service: Servicio de LLM (`services.llm_service.OpenAIService`)
+        :param tts_service: Servicio de síntesis (`services.tts_service.TTSservice`)
+        """
+        self.stt = stt_service
+        self.llm = llm_service
+        self.tts = tts_service
+        self.connections = WebSocketConnectionManager()
+
+    @classmethod
+    def create(cls, config=None) -> "ServiceRegistry":
+        """
+        Registro con las instancias por defecto del proceso.
+
+        :param config: Configuración de la aplicación (`app.core.config.Settings`);
+                       sin ella, cada servicio usa sus variables de entorno
+        """
+        from services.stt_service import STTService
+        from services.llm_service import OpenAIService, llm_service
+        from services.response_cache import TTLCache
+        from services.tts_cache import TTSCache
+        from services.tts_service import TTSservice, tts_service
+
+        if config is None:
+            return cls(STTService(), llm_service, tts_service)
+        llm = OpenAIService(
+            cache=TTLCache(maxsize=config.LLM_CACHE_SIZE, ttl=config.CACHE_TTL),
+            cache_max_temperature=config.LLM_CACHE_MAX_TEMPERATURE,
+        )
+        # El motor de STT (API o Whisper local) se elige con WHISPER_MODEL
+        stt = STTService(model=config.WHISPER_MODEL, device=config.WHISPER_DEVICE)
+        tts = TTSservice(cache=TTSCache(
+            config.TTS_CACHE_DIR,
+            memory_bytes=config.TTS_CACHE_MEMORY_BYTES,
+            disk_bytes=config.TTS_CACHE_DISK_BYTES,
+        ))
+        return cls(stt, llm, tts)
+
+    async def close(self) -> None:
+        await self.stt.close()
+        self.tts.close()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "connections": len(self.connections),
+            "sessions": self.connections.sessions(),
+            "stt_backend": self.stt.backend.name,
+        }
+
+
+def get_service_registry(websocket: WebSocket) -> ServiceRegistry:
+    """Dependencia de FastAPI: el registro creado en el `lifespan` de la aplicación"""
+    return websocket.app.state.services
@@ -1,63 +1,51 @@
-import asyncio
-import json
+import time
+import uuid
 import logging
-from typing import Dict, Any, Optional, Callable, Awaitable
+from typing import Dict, Any, Optional, Union
 from fastapi import WebSocket, WebSocketDisconnect
 from ..models.websocket import (
-    WebSocketMessage, AuthMessage, ConfigMessage, AudioMessage, 
+    WebSocketMessage, AuthMessage, ConfigMessage, PingMessage, PongMessage,
     TextMessage, MessageType, ConfigModel, ErrorMessage, ResponseMessage
 )
-from ..models.auth import TokenData
-from ..core.security import get_current_user_ws
-from .stt_service import STTService
-from .llm_service import OpenAIService
-from .tts_service import TTSService
-from ..config import settings
+from ..models.auth import UserInDB
+from ..core.security import get_websocket_user
+from .message_codec import MessageCodec, MessageDecodeError, get_codec
+from .registry import ServiceRegistry, WebSocketConnectionManager
+from services.audio_encoding import get_audio_encoder, negotiate_format
+from services.audio_frames import AudioFrame, parse_audio_frame, split_audio_frames
+from services.conversation_memory import ConversationMemory, llm_summarizer
+from services.voice_pipeline import tts_params
 
 logger = logging.getLogger(__name__)
 
-class WebSocketConnectionManager:
-    """Maneja las conexiones WebSocket activas"""
-    def __init__(self):
-        self.active_connections: Dict[str, WebSocket] = {}
-        self.stt_service = STTService()
-        self.llm_service = OpenAIService()
-        self.tts_service = TTSService()
-    
-    async def connect(self, websocket: WebSocket, client_id: str):
-        """Establece una nueva conexión WebSocket"""
-        await websocket.accept()
-        self.active_connections[client_id] = websocket
-        logger.info(f"Cliente conectado: {client_id}")
-    
-    def disconnect(self, client_id: str):
-        """Cierra una conexión WebSocket"""
-        if client_id in self.active_connections:
-            del self.active_connections[client_id]
-            logger.info(f"Cliente desconectado: {client_id}")
-    
-    async def send_message(self, client_id: str, message: WebSocketMessage):
-        """Envía un mensaje a un cliente específico"""
-        if client_id in self.active_connections:
-            websocket = self.active_connections[client_id]
-            try:
-                await websocket.send_json(message.dict(exclude_none=True))
-            except Exception as e:
-                logger.error(f"Error enviando mensaje a {client_id}: {str(e)}")
-                self.disconnect(client_id)
-
 class WebSocketHandler:
     """Maneja la lógica de los mensajes WebSocket"""
-    def __init__(self, websocket: WebSocket, client_id: str):
+    def __init__(
+        self,
+        websocket: WebSocket,
+        client_id: str,
+        services: ServiceRegistry,
+        codec: Optional[MessageCodec] = None,
+    ):
+        """
+        :param services: Registro de la aplicación (servicios y tabla de conexiones compartidos)
+        :param codec: Codificación de los mensajes de control negociada al conectar (JSON por defecto)
+        """
         self.websocket = websocket
         self.client_id = client_id
+        self.codec = codec or get_codec()
         self.config = ConfigModel()
-        self.user: Optional[TokenData] = None
-        self.manager = WebSocketConnectionManager()
+        self.user: Optional[UserInDB] = None
+        self.services = services
+        self.manager: WebSocketConnectionManager = services.connections
+        # Historial de la sesión acotado por tokens; los turnos antiguos se resumen
+        self.memory = ConversationMemory(summarizer=llm_summarizer(services.llm))
+        # Formato del audio de salida, negociado en el mensaje de configuración
+        self.output_format = negotiate_format(self.config.audio_codecs, self.config.output_sample_rate)
     
     async def handle_connection(self):
         """Maneja la conexión WebSocket"""
-        await self.manager.connect(self.websocket, self.client_id)
+        await self.manager.connect(self.websocket, self.client_id, self.codec)
         
         try:
             while True:
@@ -66,9 +54,11 @@ class WebSocketHandler:
                 
                 # Manejar diferentes tipos de mensajes
                 if data["type"] == "websocket.receive":
-                    if "text" in data:
-                        await self._handle_text_message(data["text"])
-                    elif "bytes" in data:
+                    if data.get("text") is not None:
+                        await self._handle_control_message(data["text"])
+                    elif self.codec.is_control_frame(data.get("bytes")):
+                        await self._handle_control_message(data["bytes"])
+                    elif data.get("bytes") is not None:
                         await self._handle_binary_message(data["bytes"])
                 elif data["type"] == "websocket.disconnect":
                     logger.info(f"Cliente {self.client_id} desconectado")
@@ -81,26 +71,20 @@ class WebSocketHandler:
             await self._send_error("Error interno del servidor")
         finally:
             self.manager.disconnect(self.client_id)
+            await self.memory.close()
     
-    async def _handle_text_message(self, text: str):
-        """Maneja un mensaje de texto del WebSocket"""
+    async def _handle_control_message(self, raw: Union[str, bytes]):
+        """Decodifica un mensaje de control y lo entrega a su manejador según `type`"""
         try:
-            message_data = json.loads(text)
-            message_type = message_data.get("type")
-            
-            if message_type == MessageType.AUTH:
-                await self._handle_auth(AuthMessage(**message_data))
-            elif message_type == MessageType.CONFIG:
-                await self._handle_config(ConfigMessage(**message_data))
-            elif message_type == MessageType.TEXT:
-                await self._handle_text(TextMessage(**message_data))
-            else:
-                await self._send_error(f"Tipo de mensaje no soportado: {message_type}")
-                
-        except json.JSONDecodeError:
-            await self._send_error("Formato JSON inválido")
+            message = self.codec.decode(raw)
+        except MessageDecodeError as e:
+            await self._send_error(str(e))
+            return
+        
+        try:
+            await self._dispatch[message.type](self, message)
         except Exception as e:
-            logger.error(f"Error procesando mensaje de texto: {str(e)}", exc_info=True)
+            logger.error(f"Error procesando mensaje {message.type.value}: {str(e)}", exc_info=True)
             await self._send_error(f"Error procesando el mensaje: {str(e)}")
     
     async def _handle_binary_message(self, data: bytes):
@@ -110,9 +94,10 @@ class WebSocketHandler:
             return
             
         try:
-            # Crear mensaje de audio
-            audio_message = AudioMessage(audio_data=data)
-            await self._handle_audio(audio_message)
+            # Frame con cabecera binaria (o, solo en modo JSON, el audio sin
+            # cabecera de los clientes antiguos); el payload es una vista, el
+            # audio no se copia
+            await self._handle_audio(parse_audio_frame(data))
         except Exception as e:
             logger.error(f"Error procesando audio: {str(e)}", exc_info=True)
             await self._send_error("Error procesando el audio")
@@ -120,8 +105,12 @@ class WebSocketHandler:
     async def _handle_auth(self, message: AuthMessage):
         """Maneja la autenticación del WebSocket"""
         try:
-            self.user = await get_current_user_ws(message.token)
-            await self._send_success("Autenticación exitosa")
+            self.user = await get_websocket_user(self.websocket, token=message.token)
+            if self.user is None:
+                raise ValueError("Token inválido o usuario inexistente")
+            self.manager.set_user(self.client_id, self.user.username)
+            # La configuración completa se envía una vez; después solo los cambios
+            await self._send_success("Autenticación exitosa", config=self.config.model_dump(mode="json"))
         except Exception as e:
             logger.error(f"Error de autenticación: {str(e)}")
             await self._send_error("Autenticación fallida")
@@ -133,50 +122,73 @@ class WebSocketHandler:
             return
             
         try:
-            self.config.update(message.config)
-            await self._send_success("Configuración actualizada")
+            changed = self.config.update(message.config)
+            self.output_format = negotiate_format(self.config.audio_codecs, self.config.output_sample_rate)
+            await self._send_success(
+                "Configuración actualizada",
+                config=changed,
+                data={"audio": self.output_format.as_dict()}
+            )
         except Exception as e:
             logger.error(f"Error actualizando configuración: {str(e)}")
             await self._send_error("Error actualizando la configuración")
     
-    async def _handle_text(self, message: TextMessage):
-        """Maneja un mensaje de texto del usuario"""
+    async def _handle_text(self, message: TextMessage, timings: Optional[Dict[str, float]] = None):
+        """
+        Maneja un mensaje de texto del usuario.
+
+        La respuesta sale en un frame JSON de control (texto, tiempos e id del
+        audio) y el audio en frames binarios con ese id, así el texto llega
+        sin esperar al TTS y el audio no pasa por el codificador JSON.
+        """
         if not self.user:
             await self._send_error("No autenticado")
             return
             
+        timings = dict(timings or {})
         try:
             # Procesar el texto con el LLM
-            response = await self.llm_service.generate_response(
+            start = time.perf_counter()
+            result = await self.services.llm.generate_response(
                 prompt=message.text,
                 system_prompt=self.config.system_prompt,
+                conversation_history=self.memory.messages(self.config.system_prompt, message.text),
                 temperature=self.config.temperature,
                 max_tokens=self.config.max_tokens
             )
+            timings["llm_ms"] = round((time.perf_counter() - start) * 1000, 1)
+            response = result["response"]
+            if result.get("success"):
+                self.memory.add_turn(message.text, response)
             
             # Enviar la respuesta
+            audio_id = uuid.uuid4().hex if self.config.use_tts else None
             response_message = ResponseMessage(
                 text=response,
-                config=self.config.dict()
+                audio_id=audio_id,
+                timings=timings
             )
             
-            # Si está habilitado el TTS, generar y enviar audio
-            if self.config.use_tts:
-                audio_data = await self.tts_service.synthesize(
-                    text=response,
-                    voice_type=self.config.voice_type,
-                    speed=self.config.voice_speed,
+            await self.manager.send_message(self.client_id, response_message)
+            
+            # Si está habilitado el TTS, el audio va a continuación en frames binarios
+            if audio_id is not None:
+                rate, _ = tts_params({"voiceSpeed": self.config.voice_speed})
+                audio_data = await self.services.tts.generate_audio(
+                    response,
+                    rate=rate,
                     volume=self.config.voice_volume
                 )
-                response_message.audio_data = audio_data
-            
-            await self.manager.send_message(self.client_id, response_message)
+                encoded = await get_audio_encoder().encode(audio_data, self.output_format)
+                await self.manager.send_frames(self.client_id, split_audio_frames(
+                    encoded.data, audio_id, encoded.codec, encoded.sample_rate, encoded.channels
+                ))
             
         except Exception as e:
             logger.error(f"Error generando respuesta: {str(e)}", exc_info=True)
             await self._send_error("Error generando la respuesta")
     
-    async def _handle_audio(self, message: AudioMessage):
+    async def _handle_audio(self, frame: AudioFrame):
         """Maneja un mensaje de audio del usuario"""
         if not self.user:
             await self._send_error("No autenticado")
@@ -184,24 +196,45 @@ class WebSocketHandler:
             
         try:
             # Transcribir el audio a texto
-            text = await self.stt_service.transcribe_audio(message.audio_data)
+            start = time.perf_counter()
+            if frame.raw_pcm:
+                text = await self.services.stt.transcribe_audio(
+                    frame.payload, sample_rate=frame.sample_rate, channels=frame.channels
+                )
+            else:
+                text = await self.services.stt.transcribe_audio(frame.payload)
+            stt_ms = round((time.perf_counter() - start) * 1000, 1)
             
             if not text:
                 await self._send_error("No se pudo transcribir el audio")
                 return
             
             # Procesar el texto como si fuera un mensaje de texto
-            await self._handle_text(TextMessage(text=text))
+            await self._handle_text(TextMessage(text=text), timings={"stt_ms": stt_ms})
             
         except Exception as e:
             logger.error(f"Error procesando audio: {str(e)}", exc_info=True)
             await self._send_error("Error procesando el audio")
     
-    async def _send_success(self, message: str):
-        """Envía un mensaje de éxito"""
+    async def _handle_ping(self, message: PingMessage):
+        """Responde a un ping del cliente con el mismo `timestamp`"""
+        await self.manager.send_message(self.client_id, PongMessage(timestamp=message.timestamp))
+    
+    async def _send_success(
+        self,
+        message: str,
+        config: Optional[Dict[str, Any]] = None,
+        data: Optional[Dict[str, Any]] = None
+    ):
+        """
+        Envía un mensaje de éxito.
+
+        :param config: Campos de la configuración que el cliente aún no conoce (se omite si no hay)
+        """
         success_message = ResponseMessage(
             text=message,
-            config=self.config.dict()
+            data=data,
+            config=config or None
         )
         await self.manager.send_message(self.client_id, success_message)
     
@@ -212,4 +245,11 @@ class WebSocketHandler:
             details=details or {}
         )
         await self.manager.send_message(self.client_id, error_message)
-
+    
+    # Manejador de cada tipo de mensaje de control (ver `ClientMessage`)
+    _dispatch = {
+        MessageType.AUTH: _handle_auth,
+        MessageType.CONFIG: _handle_config,
+        MessageType.TEXT: _handle_text,
+        MessageType.PING: _handle_ping,
+    }
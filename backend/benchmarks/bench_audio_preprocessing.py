@@ -0,0 +1,77 @@
+"""
+Micro-benchmark de la normalización de audio previa al STT.
+
+Mide el tiempo de `normalize_for_stt` sobre los WAV de `static/` y sobre
+audio sintético con los formatos habituales de los navegadores, y la
+reducción de bytes que se suben a Whisper por turno.
+
+Uso:
+    python -m benchmarks.bench_audio_preprocessing [--repeat 20]
+"""
+
+import sys
+import time
+import struct
+import argparse
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from services.audio_preprocessing import AudioDecodeError, normalize_for_stt  # noqa: E402
+
+STATIC_DIR = Path(__file__).resolve().parent.parent / "static"
+
+
+def synthetic_wav(sample_rate: int, channels: int, seconds: float, float32: bool) -> bytes:
+    """Genera un WAV con un tono y algo de ruido"""
+    rng = np.random.default_rng(0)
+    n = int(sample_rate * seconds)
+    t = np.arange(n) / sample_rate
+    mono = 0.3 * np.sin(2 * np.pi * 220 * t) + rng.normal(0, 0.01, n)
+    samples = np.repeat(mono[:, None], channels, axis=1)
+    if float32:
+        payload, fmt, width = samples.astype("<f4").tobytes(), 3, 4
+    else:
+        payload, fmt, width = (samples * 32767).astype("<i2").tobytes(), 1, 2
+    header = struct.pack(
+        "<4sI4s4sIHHIIHH4sI",
+        b"RIFF", 36 + len(payload), b"WAVE",
+        b"fmt ", 16, fmt, channels, sample_rate, sample_rate * channels * width, channels * width, width * 8,
+        b"data", len(payload),
+    )
+    return header + payload
+
+
+def bench(name: str, data: bytes, repeat: int) -> None:
+    try:
+        out = normalize_for_stt(data)
+    except AudioDecodeError as e:
+        print(f"{name:<40} no decodificable: {e}")
+        return
+
+    start = time.perf_counter()
+    for _ in range(repeat):
+        normalize_for_stt(data)
+    elapsed_ms = (time.perf_counter() - start) * 1000 / repeat
+    print(f"{name:<40} {len(data) / 1024:>9.1f} KB → {len(out) / 1024:>8.1f} KB "
+          f"(x{len(data) / len(out):>4.1f})  {elapsed_ms:>7.2f} ms")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=20, help="Iteraciones por fichero")
+    args = parser.parse_args()
+
+    print(f"{'Entrada':<40} {'Tamaño':>12}   {'Salida':>11}  {'Ratio':>6}  {'Tiempo':>10}")
+    for path in sorted(STATIC_DIR.glob("*.wav")):
+        bench(path.name, path.read_bytes(), args.repeat)
+
+    for rate, channels, float32 in [(48000, 2, True), (48000, 2, False), (44100, 1, False), (16000, 1, False)]:
+        label = f"sintético {rate} Hz {channels}ch {'float32' if float32 else 'int16'} 10 s"
+        bench(label, synthetic_wav(rate, channels, 10.0, float32), args.repeat)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+"""
+Micro-benchmark del índice de respuestas predefinidas.
+
+Rellena el índice con tablas sintéticas de tamaño creciente, además de los
+intents reales de `data/canned_responses.json`, y mide el coste medio de una
+consulta exacta, una aproximada (errores de transcripción) y una pregunta
+que no debe coincidir. El coste debe mantenerse plano al crecer la tabla.
+
+Uso:
+    python -m benchmarks.bench_canned_responses [--sizes 100 1000 10000 100000] [--repeat 2000]
+"""
+
+import sys
+import time
+import random
+import argparse
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from services.canned_responses import CANNED_RESPONSES_PATH, CannedResponseIndex  # noqa: E402
+
+QUERIES = {
+    "exacta": "¿Qué hora es?",
+    "aproximada": "muchas grasias",
+    "sin coincidencia": "¿Cuál es la capital de Francia?",
+}
+
+SYLLABLES = ["ca", "sa", "me", "lo", "ti", "ra", "pu", "ne", "do", "vi", "ga", "ze", "fo", "ju"]
+
+
+def synthetic_phrase(rng: random.Random) -> str:
+    words = ["".join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 4))) for _ in range(rng.randint(2, 5))]
+    return " ".join(words)
+
+
+def build_index(size: int) -> CannedResponseIndex:
+    index = CannedResponseIndex.from_file(CANNED_RESPONSES_PATH)
+    rng = random.Random(size)
+    for i in range(size):
+        index.add(f"sintetico_{i}", [synthetic_phrase(rng)], "-")
+    return index
+
+
+def time_lookup(index: CannedResponseIndex, query: str, repeat: int) -> float:
+    index.match(query)
+    start = time.perf_counter()
+    for _ in range(repeat):
+        index.match(query)
+    return (time.perf_counter() - start) / repeat * 1e6
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100, 1000, 10000, 100000])
+    parser.add_argument("--repeat", type=int, default=2000)
+    args = parser.parse_args()
+
+    print(f"{'frases':>8}  " + "  ".join(f"{name:>18}" for name in QUERIES))
+    for size in args.sizes:
+        index = build_index(size)
+        timings = [time_lookup(index, query, args.repeat) for query in QUERIES.values()]
+        print(f"{len(index):>8}  " + "  ".join(f"{t:>15.1f} µs" for t in timings))
+
+
+if __name__ == "__main__":
+    main()
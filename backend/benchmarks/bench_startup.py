@@ -0,0 +1,144 @@
+"""
+Benchmark del arranque de la aplicación.
+
+Cada medida se toma en un intérprete nuevo, como le ocurre a un worker recién
+escalado o a una ejecución de los tests:
+
+- import en frío de cada módulo indicado;
+- tiempo hasta la primera respuesta: import de la aplicación, arranque
+  (eventos de startup / lifespan) y primera petición al endpoint de vida;
+- tiempo hasta estar disponible: hasta que el endpoint de disponibilidad
+  responde 200 (fin del calentamiento), si se pide con --ready.
+
+Uso:
+    python -m benchmarks.bench_startup [--modules main services.stt_service] [--repeat 5]
+                                       [--app main:app --path /health] [--ready /readyz]
+                                       [--importtime 15]
+"""
+
+import os
+import sys
+import json
+import argparse
+import statistics
+import subprocess
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+
+IMPORT_SCRIPT = """
+import time
+start = time.perf_counter()
+import {module}
+print((time.perf_counter() - start) * 1000)
+"""
+
+FIRST_REQUEST_SCRIPT = """
+import json, time, importlib
+from fastapi.testclient import TestClient
+
+start = time.perf_counter()
+module_name, _, attr = {app!r}.partition(":")
+app = getattr(importlib.import_module(module_name), attr or "app")
+imported = time.perf_counter()
+result = {{"import_ms": (imported - start) * 1000}}
+with TestClient(app) as client:
+    started = time.perf_counter()
+    response = client.get({path!r})
+    answered = time.perf_counter()
+    result.update(
+        startup_ms=(started - imported) * 1000,
+        first_request_ms=(answered - started) * 1000,
+        total_ms=(answered - start) * 1000,
+        status=response.status_code,
+    )
+    if {ready!r}:
+        deadline = answered + {ready_timeout}
+        while time.perf_counter() < deadline:
+            if client.get({ready!r}).status_code == 200:
+                result["ready_ms"] = (time.perf_counter() - start) * 1000
+                break
+            time.sleep(0.05)
+print(json.dumps(result))
+"""
+
+
+def _run(script: str) -> str:
+    env = dict(os.environ)
+    env.setdefault("OPENAI_API_KEY", "bench-key")  # llm_service la exige al importarse
+    completed = subprocess.run(
+        [sys.executable, "-c", script], cwd=str(BACKEND_DIR), env=env,
+        capture_output=True, text=True, check=True,
+    )
+    return completed.stdout.strip().splitlines()[-1]
+
+
+def _summary(samples) -> str:
+    return f"mediana {statistics.median(samples):8.1f} ms   mín {min(samples):8.1f} ms"
+
+
+def bench_imports(modules, repeat: int) -> None:
+    print(f"Import en frío ({repeat} intérpretes nuevos por módulo)")
+    for module in modules:
+        samples = [float(_run(IMPORT_SCRIPT.format(module=module))) for _ in range(repeat)]
+        print(f"  {module:<32} {_summary(samples)}")
+
+
+def bench_first_request(app: str, path: str, ready: str, ready_timeout: float, repeat: int) -> None:
+    print(f"\nPrimera petición a {app} ({path}), {repeat} arranques")
+    runs = [json.loads(_run(FIRST_REQUEST_SCRIPT.format(
+        app=app, path=path, ready=ready, ready_timeout=ready_timeout
+    ))) for _ in range(repeat)]
+    print(f"  estado HTTP: {sorted({r['status'] for r in runs})}")
+    for key, label in (
+        ("import_ms", "import de la aplicación"),
+        ("startup_ms", "arranque (startup/lifespan)"),
+        ("first_request_ms", "primera petición"),
+        ("total_ms", "total hasta la respuesta"),
+        ("ready_ms", f"hasta {ready} = 200"),
+    ):
+        samples = [r[key] for r in runs if key in r]
+        if samples:
+            print(f"  {label:<32} {_summary(samples)}")
+        elif key == "ready_ms" and ready:
+            print(f"  {label:<32} no disponible tras {ready_timeout:g}s")
+
+
+def top_imports(module: str, count: int) -> None:
+    """Módulos más lentos de importar según `python -X importtime`"""
+    env = dict(os.environ)
+    env.setdefault("OPENAI_API_KEY", "bench-key")
+    completed = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=str(BACKEND_DIR), env=env, capture_output=True, text=True, check=True,
+    )
+    rows = []
+    for line in completed.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        rows.append((int(cumulative) / 1000, name.strip()))
+    print(f"\nImports más costosos de {module} (acumulado, incluye sus dependencias)")
+    for ms, name in sorted(rows, reverse=True)[:count]:
+        print(f"  {ms:8.1f} ms  {name}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--modules", nargs="+", default=["main", "services.voice_pipeline", "services.stt_service"])
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--app", default="main:app", help="Aplicación ASGI en formato módulo:atributo")
+    parser.add_argument("--path", default="/health", help="Endpoint de vida para la primera petición")
+    parser.add_argument("--ready", default="", help="Endpoint de disponibilidad a esperar (p. ej. /readyz)")
+    parser.add_argument("--ready-timeout", type=float, default=60.0)
+    parser.add_argument("--importtime", type=int, default=0, help="Muestra los N imports más lentos de la aplicación")
+    args = parser.parse_args()
+
+    bench_imports(args.modules, args.repeat)
+    bench_first_request(args.app, args.path, args.ready, args.ready_timeout, args.repeat)
+    if args.importtime:
+        top_imports(args.app.partition(":")[0], args.importtime)
+
+
+if __name__ == "__main__":
+    main()
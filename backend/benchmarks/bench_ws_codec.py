@@ -0,0 +1,128 @@
+"""
+Benchmark de la ruta de mensajes de control del WebSocket (`app/`).
+
+Mide mensajes por segundo en un solo núcleo, sin red, de:
+
+- entrada: decodificar un mensaje del cliente y elegir su manejador;
+- salida: construir y serializar una respuesta.
+
+"antes" reproduce la ruta anterior (`json.loads`, cadena if/elif, modelo
+construido con `**datos`, `model_dump(mode="json")` + `json.dumps` como
+hace `send_json`, y la configuración completa en cada respuesta); "después"
+usa `MessageCodec` (unión discriminada precompilada, orjson, tabla de
+despacho y configuración solo cuando cambia). Con msgpack instalado también
+se mide el modo msgpack.
+
+Uso:
+    python -m benchmarks.bench_ws_codec [--seconds 1.0]
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.models.websocket import (  # noqa: E402
+    AuthMessage, ConfigMessage, ConfigModel, MessageType, PingMessage, ResponseMessage, TextMessage
+)
+from app.services.message_codec import MSGPACK, get_codec  # noqa: E402
+
+INBOUND = [
+    {"type": "text", "text": "¿Qué tiempo hará mañana en Madrid?"},
+    {"type": "config", "config": {"temperature": 0.5, "voice_speed": 1.2}},
+    {"type": "ping", "timestamp": 1712345678.123},
+    {"type": "auth", "token": "eyJhbGciOiJIUzI1NiJ9.eyJzdWIiOiJhZG1pbiJ9.firma"},
+]
+RESPONSE_TEXT = "Mañana en Madrid habrá cielos despejados y unos 24 grados por la tarde."
+TIMINGS = {"stt_ms": 182.4, "llm_ms": 640.2}
+
+_DISPATCH = {
+    MessageType.AUTH: lambda message: None,
+    MessageType.CONFIG: lambda message: None,
+    MessageType.TEXT: lambda message: None,
+    MessageType.PING: lambda message: None,
+}
+
+
+def _rate(fn, payloads, seconds: float) -> float:
+    """Mensajes por segundo procesando `payloads` en bucle durante `seconds`"""
+    count = 0
+    deadline = time.perf_counter() + seconds
+    start = time.perf_counter()
+    while time.perf_counter() < deadline:
+        for payload in payloads:
+            fn(payload)
+        count += len(payloads)
+    return count / (time.perf_counter() - start)
+
+
+def inbound_before(text: str):
+    message_data = json.loads(text)
+    message_type = message_data.get("type")
+    if message_type == MessageType.AUTH:
+        return AuthMessage(**message_data)
+    elif message_type == MessageType.CONFIG:
+        return ConfigMessage(**message_data)
+    elif message_type == MessageType.TEXT:
+        return TextMessage(**message_data)
+    elif message_type == MessageType.PING:
+        return PingMessage(**message_data)
+    return None
+
+
+def make_inbound_after(codec):
+    def inbound_after(raw):
+        message = codec.decode(raw)
+        _DISPATCH[message.type](message)
+        return message
+    return inbound_after
+
+
+def outbound_before(config: ConfigModel):
+    def send(text: str) -> str:
+        message = ResponseMessage(text=text, audio_id="3f2a9c", timings=TIMINGS, config=config.model_dump())
+        return json.dumps(message.model_dump(mode="json", exclude_none=True), separators=(",", ":"), ensure_ascii=False)
+    return send
+
+
+def make_outbound_after(codec):
+    def send(text: str):
+        return codec.encode(ResponseMessage(text=text, audio_id="3f2a9c", timings=TIMINGS))
+    return send
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--seconds", type=float, default=1.0, help="Duración de cada medida")
+    args = parser.parse_args()
+
+    json_frames = [json.dumps(message, ensure_ascii=False) for message in INBOUND]
+    config = ConfigModel()
+    codecs = [("json", get_codec(), json_frames)]
+    msgpack_codec = get_codec(MSGPACK)
+    if msgpack_codec.binary:
+        import msgpack
+        codecs.append(("msgpack", msgpack_codec, [msgpack.packb(message) for message in INBOUND]))
+
+    print(f"Mensajes por segundo en un núcleo ({args.seconds:g}s por medida)")
+    before_in = _rate(inbound_before, json_frames, args.seconds)
+    before_out = _rate(outbound_before(config), [RESPONSE_TEXT], args.seconds)
+    print(f"  {'antes (json)':<20} entrada {before_in:>10,.0f}/s   salida {before_out:>10,.0f}/s")
+    for name, codec, frames in codecs:
+        after_in = _rate(make_inbound_after(codec), frames, args.seconds)
+        after_out = _rate(make_outbound_after(codec), [RESPONSE_TEXT], args.seconds)
+        print(
+            f"  {'después (' + name + ')':<20} entrada {after_in:>10,.0f}/s   salida {after_out:>10,.0f}/s"
+            f"   (x{after_in / before_in:.1f} / x{after_out / before_out:.1f})"
+        )
+
+    full = len(outbound_before(config)(RESPONSE_TEXT))
+    lean = len(make_outbound_after(get_codec())(RESPONSE_TEXT))
+    print(f"\nTamaño de una respuesta: {full} bytes con la configuración completa, {lean} sin ella")
+
+
+if __name__ == "__main__":
+    main()
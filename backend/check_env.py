@@ -46,6 +46,7 @@ def check_optional_vars():
         "WEBSOCKET_PATH": "No configurado (por defecto: /ws/assistant)",
         "TTS_VOICE": "No configurado (por defecto: alloy)",
         "WHISPER_MODEL": "No configurado (por defecto: whisper-1)",
+        "WHISPER_DEVICE": "No configurado (por defecto: cpu)",
     }
     
     print("\nVariables opcionales:")
@@ -8,6 +8,7 @@ import os
 import json
 from dotenv import load_dotenv
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
 from datetime import datetime
 from typing import Dict, Any, List, Optional
 import asyncio
@@ -16,14 +17,22 @@ from starlette.websockets import WebSocketDisconnect
 # Servicios personalizados
 from services.stt_service import STTService
 from services.llm_service import llm_service as openai_service
-from services.tts_service import TTSservice as tts_service  # Corregido mayúsculas
+from services.tts_service import tts_service
+from services.voice_pipeline import VoicePipeline, output_format
+from services.audio_encoding import get_audio_encoder
+from services.audio_stream import StreamingTranscriber, is_stream_chunk
+from services.audio_frames import AudioFrameError, is_audio_frame, parse_audio_frame
+from services.http_clients import close_http_client, open_client_registry
+from services.local_llm import get_local_llm
+from services.conversation_memory import ConversationMemory, llm_summarizer
+from services.warmup import build_warmup
 
 # Configuración de logging
 logging.basicConfig(
     level=logging.INFO,
     format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
     handlers=[
-        logging.FileHandler('backend.log'),
+        logging.FileHandler('backend.log', delay=True),  # El fichero se abre con el primer mensaje
         logging.StreamHandler()
     ]
 )
@@ -47,8 +56,8 @@ app = FastAPI(
 CONVERSATION_LOG = "conversations.log"
 
 # Inicializar servicios
-stt_service = STTService(model="whisper-1")  # Usando la API de Whisper
-tts_service = tts_service()  # Usando la importación existente
+stt_service = STTService()  # Motor según WHISPER_MODEL (API de OpenAI o Whisper local)
+warmup = build_warmup(stt_service, tts_service)
 
 def log_conversation(user_input: str, ai_response: str) -> None:
     """Registra la conversación en un archivo de log."""
@@ -59,39 +68,26 @@ def log_conversation(user_input: str, ai_response: str) -> None:
     except Exception as e:
         logger.error(f"Error al registrar conversación: {str(e)}")
 
-def generate_audio(text, output_path, voice_settings=None):
-    import pyttsx3
-    engine = pyttsx3.init()
-    
-    # Configuración de voz
-    voices = engine.getProperty('voices')
-    spanish_voice = next((v for v in voices if 'spanish' in v.languages or 'es' in v.id.lower()), voices[0])
-    engine.setProperty('voice', spanish_voice.id)
-    
-    # Aplicar ajustes desde frontend
-    if voice_settings:
-        engine.setProperty('rate', 170 * voice_settings.get('rate', 1))
-        engine.setProperty('volume', voice_settings.get('volume', 0.9))
-        engine.setProperty('pitch', 110 * voice_settings.get('pitch', 1))
-    else:
-        engine.setProperty('rate', 170)
-        engine.setProperty('volume', 0.9)
-        engine.setProperty('pitch', 110)
-    
-    engine.save_to_file(text, output_path)
-    engine.runAndWait()
-    
-    # Debug: Mostrar voces disponibles
-    print("Voces disponibles:")
-    for i, voice in enumerate(voices):
-        print(f"{i}: {voice.name} | ID: {voice.id} | Idiomas: {getattr(voice, 'languages', 'Desconocido')}")
-
 @app.on_event("startup")
 async def startup():
     """Inicialización de la aplicación"""
     logger.info("Servicio iniciado")
     logger.info('Iniciando verificaciones de dependencias...')
-    # Verificar conexiones a servicios externos
+    # Pool HTTP compartido; sus conexiones se abren durante el calentamiento
+    await open_client_registry(warm_up=False)
+    # Calentamiento en segundo plano (pool HTTP, Whisper, procesos TTS y caché
+    # de audio); /readyz responde 503 hasta que termina
+    warmup.start()
+
+@app.on_event("shutdown")
+async def shutdown():
+    """Liberación de recursos al parar"""
+    await warmup.close()
+    await stt_service.close()
+    tts_service.close()
+    await get_local_llm().close()
+    get_audio_encoder().close()
+    await close_http_client()
 
 @app.get('/health', include_in_schema=False)
 async def health_check():
@@ -105,6 +101,15 @@ async def health_check():
         'timestamp': datetime.now().isoformat()
     }
 
+@app.get("/readyz", include_in_schema=False)
+async def readiness_check():
+    """Disponibilidad: 200 solo cuando el calentamiento ha terminado (/health es solo de vida)"""
+    status_code = status.HTTP_200_OK if warmup.ready else status.HTTP_503_SERVICE_UNAVAILABLE
+    return JSONResponse(
+        status_code=status_code,
+        content={"status": "ready" if warmup.ready else "warming_up", **warmup.status()}
+    )
+
 # Configura CORS
 app.add_middleware(
     CORSMiddleware,
@@ -189,10 +194,37 @@ async def websocket_endpoint(websocket: WebSocket):
     Endpoint WebSocket para la comunicación en tiempo real con el asistente.
     Desactivamos temporalmente la autenticación para pruebas.
     """
+    pipeline = None
+    audio_stream = None
+    memory = None
     try:
         await websocket.accept()
         logger.info("Nueva conexión WebSocket establecida")
         
+        # Historial de la sesión, con presupuesto de tokens y resumen de los turnos antiguos
+        memory = ConversationMemory(summarizer=llm_summarizer(openai_service))
+        
+        # Pipeline STT → LLM → TTS propio de esta conexión
+        pipeline = VoicePipeline(
+            stt_service,
+            openai_service,
+            tts_service,
+            send_json=websocket.send_json,
+            send_bytes=websocket.send_bytes,
+            memory=memory,
+        )
+        pipeline.start()
+        
+        # Identificador del stream de audio en curso (protocolo audio.start / audio.end)
+        stream_message_id = None
+        
+        async def send_partial(text: str) -> None:
+            await pipeline.send({
+                "type": "transcription.partial",
+                "text": text,
+                "status": "success"
+            })
+        
         # Variables para almacenar configuraciones personalizadas
         custom_config = {
             "aiName": "Amigo",
@@ -206,7 +238,8 @@ async def websocket_endpoint(websocket: WebSocket):
             "voiceType": "default",
             "voiceSpeed": 1.0,
             "voiceVolume": 80,
-            "useAdvancedVoice": False
+            "useAdvancedVoice": False,
+            "streamResponse": True
         }
         
         while True:
@@ -226,126 +259,87 @@ async def websocket_endpoint(websocket: WebSocket):
                             if json_data.get("type") == "config":
                                 custom_config.update(json_data.get("config", {}))
                                 logger.info(f"Configuraciones personalizadas actualizadas: {custom_config}")
-                                await websocket.send_json({"status": "config received"})
+                                # Se confirma el formato de audio elegido entre los que acepta el cliente
+                                await pipeline.send({
+                                    "status": "config received",
+                                    "audio": output_format(custom_config).as_dict()
+                                })
+                                continue
+                            if json_data.get("type") == "audio.start":
+                                # Inicio de un stream de audio PCM de 16 bits por fragmentos
+                                if audio_stream is not None:
+                                    audio_stream.cancel()
+                                audio_stream = StreamingTranscriber(
+                                    stt_service,
+                                    sample_rate=int(json_data.get("sampleRate", 16000)),
+                                    channels=int(json_data.get("channels", 1)),
+                                    on_partial=send_partial,
+                                )
+                                stream_message_id = json_data.get("id")
+                                logger.info(f"Stream de audio iniciado con ID: {stream_message_id}")
+                                continue
+                            if json_data.get("type") == "audio.end":
+                                if audio_stream is None:
+                                    logger.warning("audio.end recibido sin un stream de audio activo")
+                                    continue
+                                # Si el VAD ya cerró el stream, el turno ya está encolado
+                                if not audio_stream.closed:
+                                    audio_stream.close()
+                                    await pipeline.submit_stream(audio_stream, custom_config, stream_message_id)
+                                audio_stream = None
                                 continue
                         except json.JSONDecodeError:
                             logger.warning("Mensaje de texto recibido no es JSON válido")
                             continue
+                    elif 'bytes' in data and audio_stream is not None and (
+                        not audio_stream.closed or is_stream_chunk(data['bytes'], stream_message_id)
+                    ):
+                        # Fragmento de un stream de audio en curso; si el VAD detecta
+                        # el final de la intervención se procesa sin esperar a audio.end.
+                        # Tras ese cierre los fragmentos rezagados se descartan, pero un
+                        # audio completo con su propio id sigue el camino normal
+                        chunk = data['bytes']
+                        if is_audio_frame(chunk):
+                            try:
+                                chunk = parse_audio_frame(chunk).payload
+                            except AudioFrameError as e:
+                                logger.warning(f"Fragmento de audio descartado: {e}")
+                                continue
+                        if audio_stream.write(chunk):
+                            logger.info("Fin de intervención detectado por VAD")
+                            audio_stream.close()
+                            await pipeline.submit_stream(audio_stream, custom_config, stream_message_id)
+                            await pipeline.send({"type": "audio.endpoint", "id": stream_message_id})
                     elif 'bytes' in data:
-                        combined_data = data['bytes']
-                        audio_data = None
-                        message_id = None
+                        # Cabecera binaria de longitud fija (o el formato antiguo
+                        # `{json}\n` + audio); el audio no se copia ni se recorre
                         try:
-                            # Búsqueda robusta del final del JSON
-                            json_end_index = combined_data.find(b'}\n')
-                            if json_end_index == -1:
-                                json_end_index = combined_data.find(b'}')
-
-                            if json_end_index != -1:
-                                json_part = combined_data[:json_end_index + 1]
-                                audio_data = combined_data[json_end_index + 1:]
-                                
-                                metadata = json.loads(json_part.decode('utf-8'))
-                                message_id = metadata.get('id')
-                                logger.info(f"Metadatos extraídos con ID: {message_id}. Tamaño de audio: {len(audio_data)} bytes.")
-                            else:
-                                # Si no se encuentra JSON, se asume que es solo audio
-                                audio_data = combined_data
-                                logger.warning("No se encontró el delimitador JSON, tratando los datos como audio puro.")
-
-                        except Exception as e:
-                            logger.error(f"Error al procesar el blob combinado: {e}", exc_info=True)
+                            frame = parse_audio_frame(data['bytes'])
+                        except AudioFrameError as e:
+                            logger.warning(f"Mensaje de audio descartado: {e}")
                             continue
 
-                        if not audio_data:
+                        if not frame.payload:
                             logger.warning("No se recibió ningún audio válido")
                             continue
 
-                        # Procesar el audio usando el servicio STT
-                        try:
-                            logger.info(f"Procesando audio de {len(audio_data)} bytes...")
-                            
-                            # Transcribir el audio directamente usando el servicio STT
-                            logger.info("Iniciando transcripción...")
-                            user_message = await stt_service.transcribe_audio(audio_data)
-                            
-                            if not user_message:
-                                raise ValueError("No se pudo transcribir el audio o el resultado está vacío")
-                                
-                            logger.info(f"Mensaje transcribido: {user_message}")
-                            logger.info(f"Mensaje transcribido: {user_message}")
-                            
-                            # Enviar transcripción al frontend
-                            await websocket.send_json({
-                                "type": "transcription",
-                                "text": user_message,
-                                "status": "success"
-                            })
-                            
-                            # Generar respuesta del asistente
-                            response = await asyncio.wait_for(
-                                asyncio.to_thread(generate_response, user_message, custom_config),
-                                timeout=30.0  # 30 segundos de timeout
+                        # Encolar el turno; el pipeline lo transcribe, responde y
+                        # sintetiza sin bloquear este bucle de recepción
+                        logger.info(
+                            f"Encolando audio de {len(frame.payload)} bytes (id: {frame.message_id}, "
+                            f"formato v{frame.version}). Colas: {pipeline.queue_depths()}"
+                        )
+                        if frame.raw_pcm:
+                            await pipeline.submit_audio(
+                                frame.payload, custom_config, frame.message_id,
+                                sample_rate=frame.sample_rate, channels=frame.channels,
                             )
-                            
-                            if not response:
-                                raise ValueError("No se pudo generar una respuesta")
-                                
-                            logger.info(f"Respuesta generada: {response}")
-                            
-                            # Convertir texto a voz
-                            try:
-                                with tempfile.NamedTemporaryFile(suffix='.wav', delete=False) as temp_file:
-                                    engine = pyttsx3.init()
-                                    engine.setProperty('rate', custom_config['voiceSpeed'] * 100)
-                                    engine.setProperty('volume', custom_config['voiceVolume'] / 100)
-                                    engine.save_to_file(response, temp_file.name)
-                                    engine.runAndWait()
-                                    
-                                    # Leer el archivo de audio
-                                    with open(temp_file.name, 'rb') as audio_file:
-                                        audio_bytes = audio_file.read()
-                                    
-                                    # Enviar respuesta de texto
-                                    await websocket.send_json({
-                                        "type": "response",
-                                        "text": response,
-                                        "status": "success"
-                                    })
-                                    
-                                    # Enviar audio
-                                    await websocket.send_bytes(audio_bytes)
-                                    logger.info("Audio enviado al frontend")
-                                    
-                            except Exception as e:
-                                logger.error(f"Error al generar audio: {e}")
-                                # Aún así enviamos la respuesta de texto
-                                await websocket.send_json({
-                                    "type": "response",
-                                    "text": response,
-                                    "status": "success"
-                                })
-                                
-                        except asyncio.TimeoutError as e:
-                            error_msg = "Tiempo de espera agotado al procesar la solicitud"
-                            logger.error(error_msg)
-                            await websocket.send_json({
-                                "type": "error",
-                                "message": error_msg,
-                                "status": "error"
-                            })
-                        except Exception as e:
-                            error_msg = f"Error al procesar el audio: {str(e)}"
-                            logger.error(error_msg, exc_info=True)
-                            await websocket.send_json({
-                                "type": "error",
-                                "message": error_msg,
-                                "status": "error"
-                            })
+                        else:
+                            await pipeline.submit_audio(frame.payload, custom_config, frame.message_id)
                 
             except asyncio.TimeoutError:
                 logger.info("Timeout en la recepción de datos WebSocket, manteniendo conexión activa")
-                await websocket.send_json({"status": "keep-alive"})
+                await pipeline.send({"status": "keep-alive"})
                 continue
             except WebSocketDisconnect:
                 logger.info("Conexión WebSocket cerrada por el cliente")
@@ -356,6 +350,12 @@ async def websocket_endpoint(websocket: WebSocket):
     except Exception as e:
         logger.error(f"Error en el manejo del WebSocket: {e}", exc_info=True)
     finally:
+        if audio_stream is not None:
+            audio_stream.cancel()
+        if pipeline is not None:
+            await pipeline.close()
+        if memory is not None:
+            await memory.close()
         logger.info("Conexión WebSocket finalizada")
 
 # Configuración del servidor
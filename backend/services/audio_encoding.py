@@ -0,0 +1,198 @@
+"""
+Codificación del audio de las respuestas en el formato que pide el cliente.
+
+El TTS produce WAV sin comprimir. En el mensaje de configuración el cliente
+indica qué codecs acepta, por orden de preferencia, y la frecuencia a la que
+quiere el audio; el servidor elige el primero que puede generar localmente:
+
+- `ogg`  Vorbis en OGG (soundfile), el más compacto;
+- `flac` sin pérdidas (soundfile);
+- `pcm`  PCM de 16 bits sin cabecera, remuestreado a la frecuencia pedida;
+- `wav`  el WAV del TTS tal cual (por defecto, compatible con todos los clientes).
+
+La codificación corre en un pool de hilos propio: libsndfile y el remuestreo
+liberan el GIL, y el bucle de eventos sigue atendiendo la conexión.
+"""
+
+import io
+import os
+import asyncio
+import logging
+from concurrent.futures import Executor, ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Any, Dict, Iterable, Optional, Union
+
+from services.audio_frames import Codec
+from services.audio_preprocessing import (
+    _get_soundfile, decode_audio, encode_wav, resample, to_int16, to_mono
+)
+
+logger = logging.getLogger(__name__)
+
+# Hilos dedicados a codificar el audio de salida
+AUDIO_ENCODE_WORKERS = int(os.getenv("AUDIO_ENCODE_WORKERS", 2))
+# Calidad de Vorbis (0-1); 0.4 es suficiente para voz
+AUDIO_OGG_QUALITY = float(os.getenv("AUDIO_OGG_QUALITY", 0.4))
+
+MIN_SAMPLE_RATE = 8000
+MAX_SAMPLE_RATE = 48000
+
+_CODECS = {
+    "wav": Codec.WAV,
+    "pcm": Codec.PCM_S16LE,
+    "flac": Codec.FLAC,
+    "ogg": Codec.OGG,
+}
+# Formato y subtipo de soundfile de los codecs comprimidos
+_SOUNDFILE_FORMATS = {
+    "flac": ("FLAC", "PCM_16"),
+    "ogg": ("OGG", "VORBIS"),
+}
+
+
+@dataclass(frozen=True)
+class OutputFormat:
+    """Formato negociado para el audio de salida de una sesión"""
+    codec: str = "wav"
+    sample_rate: Optional[int] = None  # None: la frecuencia del TTS
+
+    @property
+    def passthrough(self) -> bool:
+        """El WAV del TTS se envía sin tocar"""
+        return self.codec == "wav" and self.sample_rate is None
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {"codec": self.codec, "sampleRate": self.sample_rate}
+
+
+@dataclass(frozen=True)
+class EncodedAudio:
+    """Audio ya codificado con lo que necesita la cabecera de sus frames"""
+    data: bytes
+    codec: Codec
+    sample_rate: int = 0
+    channels: int = 1
+
+
+DEFAULT_FORMAT = OutputFormat()
+
+
+def supported_codecs() -> Dict[str, bool]:
+    """Codecs de salida disponibles en este proceso"""
+    sf = _get_soundfile()
+    available = set(sf.available_formats()) if sf is not None else set()
+    return {
+        codec: codec not in _SOUNDFILE_FORMATS or _SOUNDFILE_FORMATS[codec][0] in available
+        for codec in _CODECS
+    }
+
+
+def negotiate_format(
+    codecs: Union[str, Iterable[str], None] = None,
+    sample_rate: Optional[int] = None,
+) -> OutputFormat:
+    """
+    Elige el primer codec de la lista del cliente que se puede generar aquí.
+
+    Los valores vienen del cliente sin validar: lo que no se entiende se
+    ignora y se usan los valores por defecto, nunca se lanza una excepción.
+
+    :param codecs: Codecs aceptados por orden de preferencia (o uno solo)
+    :param sample_rate: Frecuencia pedida; se limita a 8-48 kHz
+    """
+    if isinstance(codecs, str):
+        codecs = [codecs]
+    elif not isinstance(codecs, (list, tuple)):
+        codecs = ()
+    available = supported_codecs()
+    codec = next(
+        (c.lower() for c in codecs if isinstance(c, str) and available.get(c.lower())),
+        DEFAULT_FORMAT.codec,
+    )
+    return OutputFormat(codec=codec, sample_rate=_sample_rate(sample_rate))
+
+
+def _sample_rate(value: Any) -> Optional[int]:
+    """Frecuencia pedida por el cliente dentro de 8-48 kHz, o None si no es válida"""
+    if isinstance(value, bool):
+        return None
+    try:
+        rate = int(value)
+    except (TypeError, ValueError, OverflowError):
+        return None
+    if rate <= 0:
+        return None
+    return min(max(rate, MIN_SAMPLE_RATE), MAX_SAMPLE_RATE)
+
+
+def encode_output(audio: bytes, output: OutputFormat) -> EncodedAudio:
+    """Convierte el WAV del TTS al formato negociado (bloqueante)"""
+    if output.passthrough:
+        return EncodedAudio(audio, Codec.WAV)
+
+    samples, rate = decode_audio(audio)
+    samples = to_mono(samples)
+    if output.sample_rate and output.sample_rate != rate:
+        samples = resample(samples, rate, output.sample_rate)
+        rate = output.sample_rate
+
+    if output.codec in _SOUNDFILE_FORMATS:
+        sf = _get_soundfile()
+        fmt, subtype = _SOUNDFILE_FORMATS[output.codec]
+        options = {"compression_level": 1.0 - AUDIO_OGG_QUALITY} if output.codec == "ogg" else {}
+        buffer = io.BytesIO()
+        sf.write(buffer, samples, rate, subtype=subtype, format=fmt, **options)
+        return EncodedAudio(buffer.getvalue(), _CODECS[output.codec], rate)
+
+    pcm = to_int16(samples, normalize=False)
+    if output.codec == "pcm":
+        return EncodedAudio(pcm.astype("<i2", copy=False).tobytes(), Codec.PCM_S16LE, rate)
+    return EncodedAudio(encode_wav(pcm, rate), Codec.WAV, rate)
+
+
+class AudioEncoder:
+    """Codifica el audio de salida en un pool de hilos compartido"""
+
+    def __init__(self, workers: int = AUDIO_ENCODE_WORKERS, executor: Optional[Executor] = None):
+        """
+        :param workers: Número de hilos de codificación
+        :param executor: Executor ya creado (por defecto, un pool de hilos)
+        """
+        self.workers = max(1, workers)
+        self._executor = executor
+
+    @property
+    def executor(self) -> Executor:
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="audio-encode")
+        return self._executor
+
+    async def encode(self, audio: bytes, output: OutputFormat = DEFAULT_FORMAT) -> EncodedAudio:
+        """
+        Codifica el audio en el formato negociado. Si falla, se envía el WAV
+        original: es más pesado, pero cualquier cliente lo reproduce.
+        """
+        if output.passthrough:
+            return EncodedAudio(audio, Codec.WAV)
+        loop = asyncio.get_running_loop()
+        try:
+            return await loop.run_in_executor(self.executor, encode_output, audio, output)
+        except Exception as e:
+            logger.warning(f"Error codificando el audio a {output.codec}, se envía WAV: {e}")
+            return EncodedAudio(audio, Codec.WAV)
+
+    def close(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+
+
+_AUDIO_ENCODER: Optional[AudioEncoder] = None
+
+
+def get_audio_encoder() -> AudioEncoder:
+    """Codificador compartido por todas las sesiones del proceso"""
+    global _AUDIO_ENCODER
+    if _AUDIO_ENCODER is None:
+        _AUDIO_ENCODER = AudioEncoder()
+    return _AUDIO_ENCODER
@@ -0,0 +1,205 @@
+"""
+Formato binario de los mensajes de audio, en los dos sentidos.
+
+Versión 1 (enteros en orden de red):
+
+    magic        2 bytes   b"VA"
+    versión      1 byte    1
+    header_len   2 bytes   longitud de la cabecera que sigue
+    cabecera     header_len bytes
+        codec         1 byte   (ver `Codec`)
+        flags         1 byte   bit 0: último fragmento del mensaje
+        canales       1 byte
+        sample_rate   4 bytes
+        secuencia     4 bytes  índice del fragmento dentro del mensaje
+        id_len        1 byte
+        id            id_len bytes (UTF-8)
+        (campos futuros: los lectores v1 los ignoran gracias a header_len)
+    payload      el resto del frame
+
+El payload se devuelve como `memoryview` sobre el mensaje recibido: el audio
+no se copia hasta que el STT lo decodifica.
+
+El servidor usa el mismo formato para el audio de las respuestas: un mensaje
+JSON de control anuncia el `audio_id` y a continuación llegan uno o más
+frames con ese id, su índice en `secuencia` y la marca de último fragmento
+en el último (`split_audio_frames`).
+
+Los clientes antiguos envían `{json}\\n` seguido del audio, o solo el audio;
+`parse_audio_frame` los sigue aceptando mientras dure la migración.
+"""
+
+import os
+import json
+import struct
+import logging
+from dataclasses import dataclass
+from enum import IntEnum
+from typing import List, Optional, Union
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b"VA"
+VERSION = 1
+
+_PREFIX = struct.Struct("!2sBH")
+_HEADER_V1 = struct.Struct("!BBBIIB")
+FLAG_FINAL = 0x01
+
+# Tamaño máximo del audio de cada frame de respuesta; el cliente puede
+# empezar a reproducir en cuanto llega el primero
+AUDIO_CHUNK_BYTES = int(os.getenv("AUDIO_CHUNK_BYTES", 32 * 1024))
+
+# Los clientes antiguos ponen el JSON de metadatos al principio; no se busca más allá
+LEGACY_HEADER_MAX = 4096
+
+
+class Codec(IntEnum):
+    """Formato del payload"""
+    AUTO = 0       # Contenedor autodescriptivo, se detecta al decodificar
+    PCM_S16LE = 1  # PCM de 16 bits sin cabecera: requiere sample_rate y canales
+    WAV = 2
+    WEBM_OPUS = 3
+    OGG = 4
+    FLAC = 5
+
+
+class AudioFrameError(ValueError):
+    """El frame tiene la firma del formato binario pero está mal formado"""
+
+
+@dataclass
+class AudioFrame:
+    """Un mensaje de audio ya separado en cabecera y payload"""
+    payload: memoryview
+    message_id: Optional[str] = None
+    codec: Codec = Codec.AUTO
+    sample_rate: Optional[int] = None
+    channels: int = 1
+    sequence: int = 0
+    final: bool = True
+    version: int = 0  # 0 = formato antiguo
+
+    @property
+    def raw_pcm(self) -> bool:
+        """El payload necesita sample_rate y canales para decodificarse"""
+        return self.codec == Codec.PCM_S16LE
+
+
+def is_audio_frame(data: Union[bytes, memoryview]) -> bool:
+    return len(data) >= _PREFIX.size and data[:2] == MAGIC
+
+
+def encode_audio_frame(
+    payload: Union[bytes, memoryview],
+    message_id: Optional[str] = None,
+    codec: Codec = Codec.AUTO,
+    sample_rate: int = 0,
+    channels: int = 1,
+    sequence: int = 0,
+    final: bool = True,
+) -> bytes:
+    """Construye un frame v1"""
+    id_bytes = (message_id or "").encode("utf-8")
+    if len(id_bytes) > 255:
+        raise ValueError("El id del mensaje no puede superar 255 bytes")
+    header = _HEADER_V1.pack(
+        int(codec), FLAG_FINAL if final else 0, channels, sample_rate, sequence, len(id_bytes)
+    ) + id_bytes
+    return b"".join((_PREFIX.pack(MAGIC, VERSION, len(header)), header, payload))
+
+
+def split_audio_frames(
+    audio: bytes,
+    audio_id: str,
+    codec: Codec = Codec.WAV,
+    sample_rate: int = 0,
+    channels: int = 1,
+    chunk_size: int = AUDIO_CHUNK_BYTES,
+) -> List[bytes]:
+    """
+    Trocea el audio de una respuesta en frames v1 con el id y el índice de
+    cada fragmento; el último lleva la marca de final. Un audio vacío
+    produce un único frame final sin payload.
+    """
+    view = memoryview(audio)
+    chunk_size = max(1, chunk_size)
+    offsets = range(0, len(view), chunk_size) or [0]
+    last = len(offsets) - 1
+    return [
+        encode_audio_frame(
+            view[offset:offset + chunk_size], audio_id, codec, sample_rate, channels,
+            sequence=index, final=index == last,
+        )
+        for index, offset in enumerate(offsets)
+    ]
+
+
+def parse_audio_frame(data: Union[bytes, memoryview]) -> AudioFrame:
+    """
+    Separa cabecera y audio de un mensaje binario, sin copiar el audio.
+
+    Raises:
+        AudioFrameError: Si tiene la firma del formato v1 pero está truncado
+            o es de una versión sin soporte
+    """
+    view = memoryview(data)
+    if is_audio_frame(view):
+        return _parse_v1(view)
+    return _parse_legacy(view)
+
+
+def _parse_v1(view: memoryview) -> AudioFrame:
+    _, version, header_len = _PREFIX.unpack_from(view)
+    if version != VERSION:
+        raise AudioFrameError(f"Versión de frame de audio no soportada: {version}")
+    header_end = _PREFIX.size + header_len
+    if header_len < _HEADER_V1.size or len(view) < header_end:
+        raise AudioFrameError("Frame de audio truncado")
+
+    codec, flags, channels, sample_rate, sequence, id_len = _HEADER_V1.unpack_from(view, _PREFIX.size)
+    id_start = _PREFIX.size + _HEADER_V1.size
+    if id_start + id_len > header_end:
+        raise AudioFrameError("Frame de audio con id fuera de la cabecera")
+    try:
+        codec = Codec(codec)
+    except ValueError:
+        raise AudioFrameError(f"Codec de audio desconocido: {codec}")
+    if codec == Codec.PCM_S16LE and not sample_rate:
+        raise AudioFrameError("Audio PCM sin sample_rate en la cabecera")
+
+    return AudioFrame(
+        payload=view[header_end:],
+        message_id=bytes(view[id_start:id_start + id_len]).decode("utf-8") or None,
+        codec=codec,
+        sample_rate=sample_rate or None,
+        channels=max(1, channels),
+        sequence=sequence,
+        final=bool(flags & FLAG_FINAL),
+        version=version,
+    )
+
+
+def _parse_legacy(view: memoryview) -> AudioFrame:
+    """
+    Formato antiguo: JSON de metadatos opcional al principio y después el
+    audio. Solo se busca el cierre del JSON si el mensaje empieza por `{`, y
+    solo en los primeros bytes, así que el audio no se recorre.
+    """
+    if view[:1] != b"{":
+        return AudioFrame(payload=view)
+
+    head = bytes(view[:LEGACY_HEADER_MAX])
+    for delimiter in (b"}\n", b"}"):
+        end = head.find(delimiter)
+        while end != -1:
+            try:
+                metadata = json.loads(head[:end + 1])
+            except ValueError:
+                end = head.find(delimiter, end + 1)
+                continue
+            message_id = metadata.get("id") if isinstance(metadata, dict) else None
+            return AudioFrame(payload=view[end + len(delimiter):], message_id=message_id)
+
+    logger.warning("Mensaje de audio con '{' inicial sin JSON válido, se trata como audio")
+    return AudioFrame(payload=view)
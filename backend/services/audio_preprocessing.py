@@ -0,0 +1,245 @@
+"""
+Normalización de audio antes del STT.
+
+Convierte lo que envíe el navegador (WAV de 48 kHz estéreo, float32, PCM
+crudo...) en audio mono de 16 kHz en int16, que es lo que espera Whisper.
+Todas las operaciones son vectorizadas con NumPy; no hay bucles por muestra.
+"""
+
+import io
+import struct
+import logging
+from math import gcd
+from typing import Optional, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+TARGET_SAMPLE_RATE = 16000
+TARGET_PEAK = 0.9
+
+# soundfile y scipy.signal se importan al primer uso: scipy.signal tarda más
+# en importarse que el resto de la aplicación y solo hace falta al remuestrear
+_UNSET = object()
+_soundfile = _UNSET
+_resample_poly = _UNSET
+
+
+def _get_soundfile():
+    global _soundfile
+    if _soundfile is _UNSET:
+        try:
+            import soundfile
+            _soundfile = soundfile
+        except (ImportError, OSError):  # libsndfile no disponible
+            _soundfile = None
+    return _soundfile
+
+
+def _get_resample_poly():
+    global _resample_poly
+    if _resample_poly is _UNSET:
+        try:
+            from scipy.signal import resample_poly
+            _resample_poly = resample_poly
+        except ImportError:
+            _resample_poly = None
+    return _resample_poly
+
+_WAVE_FORMAT_PCM = 0x0001
+_WAVE_FORMAT_IEEE_FLOAT = 0x0003
+_WAVE_FORMAT_EXTENSIBLE = 0xFFFE
+
+
+class AudioDecodeError(ValueError):
+    """El audio no está en un formato que se pueda decodificar localmente"""
+
+
+def decode_audio(
+    data: bytes,
+    sample_rate: Optional[int] = None,
+    channels: int = 1,
+) -> Tuple[np.ndarray, int]:
+    """
+    Decodifica audio a un array float32 de forma (muestras, canales).
+
+    Acepta WAV (PCM de 8/16/24/32 bits o float), cualquier formato que
+    soporte soundfile si está instalado (FLAC, OGG...) y PCM de 16 bits sin
+    cabecera si se indica `sample_rate`.
+
+    Raises:
+        AudioDecodeError: Si el formato no se reconoce
+    """
+    if data[:4] == b"RIFF" and data[8:12] == b"WAVE":
+        return _decode_wav(memoryview(data))
+
+    sf = _get_soundfile()
+    if sf is not None:
+        try:
+            samples, rate = sf.read(io.BytesIO(data), dtype="float32", always_2d=True)
+            return samples, rate
+        except Exception:
+            pass
+
+    if sample_rate:
+        usable = len(data) - len(data) % (2 * channels)
+        pcm = np.frombuffer(data, dtype="<i2", count=usable // 2)
+        return (pcm.astype(np.float32) / 32768.0).reshape(-1, channels), sample_rate
+
+    raise AudioDecodeError("Formato de audio no reconocido")
+
+
+def to_mono(samples: np.ndarray) -> np.ndarray:
+    """Mezcla todos los canales en uno"""
+    if samples.ndim == 1:
+        return samples
+    if samples.shape[1] == 1:
+        return samples[:, 0]
+    return samples.mean(axis=1, dtype=np.float32)
+
+
+def resample(samples: np.ndarray, rate_in: int, rate_out: int = TARGET_SAMPLE_RATE) -> np.ndarray:
+    """
+    Cambia la frecuencia de muestreo con un filtro polifásico
+    (`scipy.signal.resample_poly`, en requirements.txt).
+
+    Si scipy no está instalado se usa una aproximación más pobre, no
+    polifásica: un filtro paso bajo FIR seguido de interpolación lineal.
+    """
+    if rate_in == rate_out or len(samples) == 0:
+        return samples
+
+    resample_poly = _get_resample_poly()
+    if resample_poly is not None:
+        divisor = gcd(rate_in, rate_out)
+        return resample_poly(samples, rate_out // divisor, rate_in // divisor).astype(np.float32)
+
+    if rate_out < rate_in:
+        samples = _lowpass(samples, 0.5 * rate_out / rate_in)
+    n_out = int(round(len(samples) * rate_out / rate_in))
+    positions = np.arange(n_out, dtype=np.float64) * (rate_in / rate_out)
+    return np.interp(positions, np.arange(len(samples)), samples).astype(np.float32)
+
+
+def normalize_peak(samples: np.ndarray, peak: float = TARGET_PEAK) -> np.ndarray:
+    """Escala la señal para que su pico sea `peak` (el silencio no se amplifica)"""
+    if len(samples):
+        current = float(np.max(np.abs(samples)))
+        if current > 1e-4:
+            return (samples * (peak / current)).astype(np.float32, copy=False)
+    return samples
+
+
+def to_int16(samples: np.ndarray, normalize: bool = True, peak: float = TARGET_PEAK) -> np.ndarray:
+    """
+    Convierte a int16, normalizando opcionalmente el pico a `peak`.
+    """
+    if normalize:
+        samples = normalize_peak(samples, peak)
+    return (np.clip(samples, -1.0, 1.0) * 32767.0).astype(np.int16)
+
+
+def load_for_stt(
+    data: bytes,
+    sample_rate: Optional[int] = None,
+    channels: int = 1,
+    normalize: bool = True,
+) -> np.ndarray:
+    """
+    Decodifica, mezcla a mono, remuestrea a 16 kHz y normaliza el pico.
+
+    La normalización se hace aquí y no al codificar, para que el Whisper
+    local reciba el mismo audio que la API.
+
+    Returns:
+        np.ndarray: Audio mono float32 a `TARGET_SAMPLE_RATE`
+    """
+    samples, rate = decode_audio(data, sample_rate, channels)
+    samples = resample(to_mono(samples), rate, TARGET_SAMPLE_RATE)
+    return normalize_peak(samples) if normalize else samples
+
+
+def encode_wav(samples: np.ndarray, sample_rate: int = TARGET_SAMPLE_RATE) -> bytes:
+    """Genera un WAV PCM de 16 bits mono a partir de muestras int16"""
+    pcm = samples.astype("<i2", copy=False).tobytes()
+    header = struct.pack(
+        "<4sI4s4sIHHIIHH4sI",
+        b"RIFF", 36 + len(pcm), b"WAVE",
+        b"fmt ", 16, _WAVE_FORMAT_PCM, 1, sample_rate, sample_rate * 2, 2, 16,
+        b"data", len(pcm),
+    )
+    return header + pcm
+
+
+def normalize_for_stt(
+    data: bytes,
+    sample_rate: Optional[int] = None,
+    channels: int = 1,
+) -> bytes:
+    """
+    Convierte cualquier audio soportado en un WAV mono de 16 kHz en int16 con
+    el pico normalizado.
+    """
+    return encode_wav(to_int16(load_for_stt(data, sample_rate, channels), normalize=False))
+
+
+def _decode_wav(view: memoryview) -> Tuple[np.ndarray, int]:
+    """
+    Recorre los chunks RIFF sin copiar los datos de audio.
+
+    Tolera tamaños de `data` a 0 o mayores que el fichero (WAV generados en
+    streaming por algunos navegadores).
+    """
+    fmt = None
+    payload = None
+    offset = 12
+    while offset + 8 <= len(view):
+        chunk_id, size = struct.unpack_from("<4sI", view, offset)
+        body = offset + 8
+        if chunk_id == b"fmt ":
+            fmt = struct.unpack_from("<HHIIHH", view, body)
+            if fmt[0] == _WAVE_FORMAT_EXTENSIBLE and size >= 26:
+                # El formato real está en los dos primeros bytes del GUID
+                fmt = (struct.unpack_from("<H", view, body + 24)[0],) + fmt[1:]
+        elif chunk_id == b"data":
+            end = len(view) if size in (0, 0xFFFFFFFF) else min(body + size, len(view))
+            payload = view[body:end]
+            break
+        offset = body + size + (size & 1)
+
+    if fmt is None or payload is None:
+        raise AudioDecodeError("WAV sin chunks fmt/data")
+
+    format_tag, channels, rate, _, _, bits = fmt
+    if channels < 1:
+        raise AudioDecodeError("WAV sin canales")
+    width = bits // 8
+    usable = len(payload) - len(payload) % (width * channels)
+    payload = payload[:usable]
+
+    if format_tag == _WAVE_FORMAT_IEEE_FLOAT and bits in (32, 64):
+        samples = np.frombuffer(payload, dtype=f"<f{width}").astype(np.float32, copy=False)
+    elif format_tag == _WAVE_FORMAT_PCM and bits == 16:
+        samples = np.frombuffer(payload, dtype="<i2").astype(np.float32) / 32768.0
+    elif format_tag == _WAVE_FORMAT_PCM and bits == 8:
+        samples = (np.frombuffer(payload, dtype=np.uint8).astype(np.float32) - 128.0) / 128.0
+    elif format_tag == _WAVE_FORMAT_PCM and bits == 24:
+        raw = np.frombuffer(payload, dtype=np.uint8).reshape(-1, 3).astype(np.int32)
+        values = raw[:, 0] | (raw[:, 1] << 8) | (raw[:, 2] << 16)
+        values = np.where(values & 0x800000, values - 0x1000000, values)
+        samples = values.astype(np.float32) / 8388608.0
+    elif format_tag == _WAVE_FORMAT_PCM and bits == 32:
+        samples = np.frombuffer(payload, dtype="<i4").astype(np.float32) / 2147483648.0
+    else:
+        raise AudioDecodeError(f"WAV no soportado: formato {format_tag}, {bits} bits")
+
+    return samples.reshape(-1, channels), rate
+
+
+def _lowpass(samples: np.ndarray, cutoff: float, taps: int = 63) -> np.ndarray:
+    """Filtro FIR de ventana (Hamming); `cutoff` relativo a la frecuencia de muestreo"""
+    n = np.arange(taps) - (taps - 1) / 2
+    kernel = 2 * cutoff * np.sinc(2 * cutoff * n) * np.hamming(taps)
+    kernel /= kernel.sum()
+    return np.convolve(samples, kernel.astype(np.float32), mode="same")
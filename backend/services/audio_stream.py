@@ -0,0 +1,276 @@
+import io
+import os
+import wave
+import asyncio
+import logging
+import unicodedata
+from typing import Awaitable, Callable, List, Optional
+
+import numpy as np
+
+from services.audio_frames import AudioFrameError, parse_audio_frame
+from services.vad import Endpointer, VoiceActivityDetector
+
+logger = logging.getLogger(__name__)
+
+# Audio retenido por sesión en el buffer circular
+STREAM_BUFFER_SECONDS = float(os.getenv("STREAM_BUFFER_SECONDS", 30.0))
+# Duración de cada ventana que se transcribe mientras el usuario sigue hablando
+STREAM_WINDOW_SECONDS = float(os.getenv("STREAM_WINDOW_SECONDS", 2.0))
+# Audio de la ventana anterior que se repite al principio de cada ventana, para
+# que una palabra cortada en el límite llegue entera a alguna de las dos
+STREAM_WINDOW_OVERLAP_SECONDS = float(os.getenv("STREAM_WINDOW_OVERLAP_SECONDS", 0.5))
+# Palabras del final de una ventana que se buscan al principio de la siguiente
+MERGE_MAX_WORDS = 8
+# Longitud mínima de un trozo de palabra para unirlo con la palabra completa
+MERGE_MIN_FRAGMENT = 3
+
+SAMPLE_WIDTH = 2  # PCM de 16 bits
+
+
+def pcm_to_wav(pcm: bytes, sample_rate: int, channels: int = 1) -> bytes:
+    """Envuelve PCM de 16 bits en un contenedor WAV en memoria"""
+    buffer = io.BytesIO()
+    with wave.open(buffer, "wb") as wf:
+        wf.setnchannels(channels)
+        wf.setsampwidth(SAMPLE_WIDTH)
+        wf.setframerate(sample_rate)
+        wf.writeframes(pcm)
+    return buffer.getvalue()
+
+
+def _normalize_word(word: str) -> str:
+    word = unicodedata.normalize("NFKD", word.lower())
+    return "".join(c for c in word if c.isalnum())
+
+
+def _same_word(previous: str, new: str, first: bool, last: bool) -> bool:
+    """
+    Compara una palabra del final de una ventana con la de la siguiente. En
+    los extremos del solape se admite un trozo de palabra: la ventana anterior
+    puede terminar a mitad de la última y la siguiente empezar a mitad de la primera.
+    """
+    if not previous or not new:
+        return False
+    if previous == new:
+        return True
+    # Un trozo de una o dos letras coincide por azar con demasiadas palabras ("a", "y", "de")
+    if min(len(previous), len(new)) < MERGE_MIN_FRAGMENT:
+        return False
+    return (last and new.startswith(previous)) or (first and previous.endswith(new))
+
+
+def merge_transcripts(previous: str, new: str, max_words: int = MERGE_MAX_WORDS) -> str:
+    """
+    Une el texto de dos ventanas solapadas quitando lo que se transcribió dos veces.
+
+    Busca el mayor número de palabras del final de `previous` que coinciden
+    con el principio de `new` y, en ese tramo, se queda con la versión más
+    larga de cada palabra (la que no quedó cortada). Sin coincidencia, las
+    concatena.
+    """
+    previous_words, new_words = previous.split(), new.split()
+    if not previous_words or not new_words:
+        return " ".join(previous_words + new_words)
+
+    for k in range(min(len(previous_words), len(new_words), max_words), 0, -1):
+        tail = [_normalize_word(w) for w in previous_words[-k:]]
+        head = [_normalize_word(w) for w in new_words[:k]]
+        if all(_same_word(a, b, i == 0, i == k - 1) for i, (a, b) in enumerate(zip(tail, head))):
+            overlap = [
+                a if len(_normalize_word(a)) >= len(_normalize_word(b)) else b
+                for a, b in zip(previous_words[-k:], new_words[:k])
+            ]
+            return " ".join(previous_words[:-k] + overlap + new_words[k:])
+    return " ".join(previous_words + new_words)
+
+
+def is_stream_chunk(data: bytes, stream_id: Optional[str]) -> bool:
+    """
+    Si un mensaje binario recibido tras cerrar un stream (fin de intervención
+    detectado por VAD) es un fragmento rezagado de ese stream o un audio nuevo.
+
+    El cliente sigue enviando fragmentos hasta recibir `audio.endpoint`; esos
+    se descartan. Un mensaje que trae su propio id (cabecera `VA` o metadatos
+    JSON) distinto del stream, o un WAV completo, es un audio nuevo.
+    """
+    try:
+        frame = parse_audio_frame(data)
+    except AudioFrameError:
+        return True
+    if frame.message_id:
+        return frame.message_id == stream_id
+    return not (data[:4] == b"RIFF" and data[8:12] == b"WAVE")
+
+
+class AudioRingBuffer:
+    """
+    Buffer circular de bytes con capacidad fija.
+
+    Las posiciones son absolutas (bytes escritos desde el inicio del stream),
+    de modo que el lector puede pedir cualquier rango que no haya sido
+    sobrescrito todavía.
+    """
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self.total_written = 0
+        self._buffer = np.zeros(capacity, dtype=np.uint8)
+
+    def write(self, data: bytes) -> None:
+        """Añade datos, sobrescribiendo los más antiguos si no caben"""
+        chunk = np.frombuffer(data, dtype=np.uint8)
+        end = self.total_written + len(chunk)
+        if len(chunk) > self.capacity:
+            chunk = chunk[-self.capacity:]
+
+        start = (end - len(chunk)) % self.capacity
+        first = min(len(chunk), self.capacity - start)
+        self._buffer[start:start + first] = chunk[:first]
+        self._buffer[:len(chunk) - first] = chunk[first:]
+        self.total_written = end
+
+    def read(self, start: int, end: int) -> bytes:
+        """Devuelve los bytes del rango absoluto [start, end)"""
+        if start < self.total_written - self.capacity or end > self.total_written or start > end:
+            raise ValueError(f"Rango fuera del buffer: [{start}, {end})")
+
+        begin = start % self.capacity
+        length = end - start
+        if begin + length <= self.capacity:
+            return self._buffer[begin:begin + length].tobytes()
+        first = self.capacity - begin
+        return self._buffer[begin:].tobytes() + self._buffer[:length - first].tobytes()
+
+
+class StreamingTranscriber:
+    """
+    Ingesta de audio por fragmentos con transcripción incremental.
+
+    El cliente envía `audio.start`, fragmentos PCM pequeños y `audio.end`.
+    Cada vez que se completa una ventana de audio se lanza su transcripción
+    sin esperar al resto, y el texto acumulado se notifica como parcial. Al
+    terminar solo queda por transcribir la última ventana, así que el texto
+    final está listo casi en cuanto el usuario deja de hablar.
+
+    Cada ventana empieza `overlap_seconds` antes del final de la anterior: una
+    palabra cortada en el límite llega entera a una de las dos, y el texto
+    repetido se elimina al unirlas (`merge_transcripts`).
+
+    Un detector de actividad de voz vigila el audio entrante para detectar
+    el final de la intervención aunque el cliente no envíe `audio.end`.
+    """
+
+    def __init__(
+        self,
+        stt_service,
+        sample_rate: int = 16000,
+        channels: int = 1,
+        window_seconds: float = STREAM_WINDOW_SECONDS,
+        buffer_seconds: float = STREAM_BUFFER_SECONDS,
+        on_partial: Optional[Callable[[str], Awaitable[None]]] = None,
+        overlap_seconds: float = STREAM_WINDOW_OVERLAP_SECONDS,
+    ):
+        self.stt_service = stt_service
+        self.sample_rate = sample_rate
+        self.channels = channels
+        self.on_partial = on_partial
+
+        frame_bytes = SAMPLE_WIDTH * channels
+        bytes_per_second = sample_rate * frame_bytes
+        # Las ventanas se cortan siempre en un límite de muestra
+        self.window_bytes = int(window_seconds * sample_rate) * frame_bytes
+        # El solape siempre es menor que la ventana, así que cada una aporta audio nuevo
+        overlap_bytes = int(max(overlap_seconds, 0.0) * sample_rate) * frame_bytes
+        self.overlap_bytes = min(overlap_bytes, self.window_bytes // 2 // frame_bytes * frame_bytes)
+        self.buffer = AudioRingBuffer(max(int(buffer_seconds * bytes_per_second), 2 * self.window_bytes))
+
+        self.endpointer = Endpointer(VoiceActivityDetector(sample_rate=sample_rate))
+        self._frame_bytes = frame_bytes
+        self._committed = 0
+        self._windows: List[asyncio.Task] = []
+        self._texts: List[Optional[str]] = []
+        self._closed = False
+
+    @property
+    def closed(self) -> bool:
+        return self._closed
+
+    def write(self, chunk: bytes) -> bool:
+        """
+        Añade un fragmento PCM y lanza la transcripción de cada ventana completa.
+
+        Returns:
+            bool: True si el detector de voz considera terminada la intervención
+        """
+        if self._closed:
+            logger.debug("Fragmento de audio recibido tras el cierre del stream, se ignora")
+            return False
+        self.buffer.write(chunk)
+        while self.buffer.total_written - self._committed >= self.window_bytes:
+            self._cut_window(self._committed + self.window_bytes)
+
+        usable = len(chunk) - len(chunk) % self._frame_bytes
+        samples = np.frombuffer(chunk[:usable], dtype=np.int16)
+        if self.channels > 1:
+            samples = samples.reshape(-1, self.channels).mean(axis=1) / 32768.0
+        return self.endpointer.process(samples)
+
+    def close(self) -> None:
+        """Marca el fin del audio y lanza la transcripción de lo que quede"""
+        if self._closed:
+            return
+        self._closed = True
+        # Se descarta un posible byte suelto de una muestra incompleta
+        end = self.buffer.total_written - (self.buffer.total_written - self._committed) % (SAMPLE_WIDTH * self.channels)
+        if end > self._committed:
+            self._cut_window(end)
+
+    async def finish(self) -> Optional[str]:
+        """Cierra el stream y devuelve la transcripción completa"""
+        self.close()
+        await asyncio.gather(*self._windows, return_exceptions=True)
+        return self._merged(self._texts) or None
+
+    def cancel(self) -> None:
+        """Cancela las transcripciones pendientes"""
+        self._closed = True
+        for task in self._windows:
+            task.cancel()
+
+    @staticmethod
+    def _merged(texts: List[Optional[str]]) -> str:
+        merged = ""
+        for text in texts:
+            if text:
+                merged = merge_transcripts(merged, text)
+        return merged.strip()
+
+    def _cut_window(self, end: int) -> None:
+        start = self._committed - self.overlap_bytes if self._windows else self._committed
+        start = max(start, self.buffer.total_written - self.buffer.capacity, 0)
+        pcm = self.buffer.read(start, end)
+        self._committed = end
+        index = len(self._windows)
+        self._texts.append(None)
+        self._windows.append(asyncio.create_task(self._transcribe_window(index, pcm)))
+
+    async def _transcribe_window(self, index: int, pcm: bytes) -> None:
+        try:
+            wav = pcm_to_wav(pcm, self.sample_rate, self.channels)
+            self._texts[index] = await self.stt_service.transcribe_audio(wav)
+        except Exception as e:
+            logger.error(f"Error transcribiendo la ventana {index}: {e}", exc_info=True)
+            return
+
+        if self.on_partial and self._texts[index]:
+            # Solo se publica el prefijo contiguo ya transcrito, para mantener el orden
+            done = []
+            for task, text in zip(self._windows, self._texts):
+                if not task.done() and task is not asyncio.current_task():
+                    break
+                done.append(text)
+            try:
+                await self.on_partial(self._merged(done))
+            except Exception as e:
+                logger.warning(f"No se pudo enviar la transcripción parcial: {e}")
@@ -0,0 +1,146 @@
+import os
+import time
+import asyncio
+from collections import deque
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, Optional
+
+# Ventana de latencias recientes usada para los percentiles
+LLM_STATS_WINDOW = int(os.getenv("LLM_STATS_WINDOW", 100))
+# Peso de cada muestra nueva en las medias móviles exponenciales
+LLM_STATS_ALPHA = float(os.getenv("LLM_STATS_ALPHA", 0.2))
+
+
+class BackendStats:
+    """
+    Estadísticas en vivo de un backend: latencia media exponencial (EWMA),
+    percentiles sobre una ventana de peticiones recientes, tasa de errores y
+    peticiones en curso.
+
+    Todo se actualiza desde el event loop, sin locks.
+    """
+
+    def __init__(self, name: str, window: int = LLM_STATS_WINDOW, alpha: float = LLM_STATS_ALPHA):
+        self.name = name
+        self.alpha = alpha
+        self.ewma_ms: Optional[float] = None
+        self.error_rate = 0.0
+        self.in_flight = 0
+        self.requests = 0
+        self.errors = 0
+        self.cancelled = 0
+        self.last_sample: Optional[float] = None
+        self._latencies: deque = deque(maxlen=window)
+        self._sorted: Optional[list] = None
+
+    @contextmanager
+    def track(self) -> Iterator[None]:
+        """
+        Mide una petición; una excepción cuenta como error. Una cancelación
+        (p. ej. el perdedor de una petición duplicada) no cuenta como muestra.
+        """
+        start = time.perf_counter()
+        self.in_flight += 1
+        ok = False
+        try:
+            yield
+            ok = True
+        except asyncio.CancelledError:
+            self.cancelled += 1
+            ok = None
+            raise
+        finally:
+            self.in_flight -= 1
+            if ok is not None:
+                self.record((time.perf_counter() - start) * 1000, ok)
+
+    def record(self, latency_ms: float, ok: bool = True) -> None:
+        """Registra una petición terminada"""
+        self.requests += 1
+        self.last_sample = time.monotonic()
+        self.error_rate += self.alpha * ((0.0 if ok else 1.0) - self.error_rate)
+        if not ok:
+            self.errors += 1
+            return
+        self.ewma_ms = latency_ms if self.ewma_ms is None else self.ewma_ms + self.alpha * (latency_ms - self.ewma_ms)
+        self._latencies.append(latency_ms)
+        self._sorted = None
+
+    def percentile(self, q: float) -> Optional[float]:
+        """Percentil `q` (0-100) de las latencias de la ventana, o None sin muestras"""
+        if not self._latencies:
+            return None
+        if self._sorted is None:
+            self._sorted = sorted(self._latencies)
+        index = min(len(self._sorted) - 1, int(round(q / 100 * (len(self._sorted) - 1))))
+        return self._sorted[index]
+
+    @property
+    def p95_ms(self) -> Optional[float]:
+        return self.percentile(95)
+
+    def idle_for(self) -> float:
+        """Segundos desde la última muestra (infinito si nunca se ha usado)"""
+        if self.last_sample is None:
+            return float("inf")
+        return time.monotonic() - self.last_sample
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "requests": self.requests,
+            "errors": self.errors,
+            "cancelled": self.cancelled,
+            "error_rate": round(self.error_rate, 4),
+            "in_flight": self.in_flight,
+            "ewma_ms": None if self.ewma_ms is None else round(self.ewma_ms, 1),
+            "p50_ms": _round(self.percentile(50)),
+            "p95_ms": _round(self.p95_ms),
+            "p99_ms": _round(self.percentile(99)),
+        }
+
+
+def _round(value: Optional[float]) -> Optional[float]:
+    return None if value is None else round(value, 1)
+
+
+class HedgeBudget:
+    """
+    Presupuesto de peticiones duplicadas (hedging).
+
+    Cada petición normal aporta `max_rate` fichas, hasta un máximo de `burst`,
+    y cada duplicado consume una. Así, a largo plazo, nunca se duplica más de
+    esa fracción del tráfico, aunque el backend primario se degrade del todo.
+
+    El cubo empieza vacío: tras un arranque en frío el primer duplicado llega
+    después de 1/max_rate consultas, no en las `burst` primeras.
+    """
+
+    def __init__(self, max_rate: float, burst: float = 10.0):
+        self.max_rate = max_rate
+        self.burst = burst
+        self.tokens = 0.0
+        self.requests = 0
+        self.hedged = 0
+        self.denied = 0
+        self.wins = 0  # Duplicados que respondieron antes que el primario
+
+    def on_request(self) -> None:
+        self.requests += 1
+        self.tokens = min(self.burst, self.tokens + self.max_rate)
+
+    def try_acquire(self) -> bool:
+        if self.tokens >= 1.0 - 1e-9:  # 10 × 0.1 no suma exactamente 1.0
+            self.tokens -= 1.0
+            self.hedged += 1
+            return True
+        self.denied += 1
+        return False
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "requests": self.requests,
+            "hedged": self.hedged,
+            "denied": self.denied,
+            "wins": self.wins,
+            "hedge_rate": round(self.hedged / self.requests, 4) if self.requests else 0.0,
+        }
@@ -0,0 +1,225 @@
+"""
+Respuestas predefinidas con búsqueda aproximada.
+
+Las frases más habituales ("hola", "¿qué hora es?", "gracias") se responden
+sin llamar a ningún LLM. El texto del usuario se normaliza (acentos,
+puntuación, muletillas), se busca primero de forma exacta en un dict y, si
+no aparece, se preseleccionan candidatos con un índice invertido de
+trigramas y se verifican con una distancia de edición acotada. El coste de
+una consulta depende de la longitud de la frase, no del tamaño de la tabla.
+"""
+
+import os
+import json
+import logging
+import unicodedata
+from collections import defaultdict
+from dataclasses import dataclass
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Fichero con los intents y sus respuestas
+CANNED_RESPONSES_PATH = os.getenv(
+    "CANNED_RESPONSES_PATH",
+    str(Path(__file__).resolve().parent.parent / "data" / "canned_responses.json"),
+)
+# Confianza mínima para servir una respuesta predefinida
+CANNED_MIN_CONFIDENCE = float(os.getenv("CANNED_MIN_CONFIDENCE", 0.85))
+
+# Muletillas que no cambian la intención de la frase
+FILLER_WORDS = frozenset({
+    "eh", "em", "emm", "mm", "mmm", "hmm", "ah", "oye", "pues", "porfa", "porfavor", "vale", "bueno",
+})
+
+# Frases más largas que esto se consideran preguntas reales para el LLM
+MAX_QUERY_CHARS = 60
+# Diferencia de edición máxima relativa a la longitud de la frase
+MAX_EDIT_RATIO = 0.2
+# Trigramas presentes en más patrones que esto no discriminan y se ignoran
+MAX_POSTINGS = 256
+# Candidatos que se verifican con la distancia de edición
+MAX_CANDIDATES = 8
+
+
+def normalize(text: str) -> str:
+    """
+    Forma canónica de una frase: sin acentos ni puntuación, en minúsculas,
+    sin muletillas y con los espacios colapsados.
+    """
+    decomposed = unicodedata.normalize("NFKD", text.casefold())
+    chars = []
+    for ch in decomposed:
+        if unicodedata.combining(ch):
+            continue
+        chars.append(ch if ch.isalnum() else " ")
+    words = "".join(chars).split()
+    kept = [w for w in words if w not in FILLER_WORDS]
+    # Si la frase solo tiene muletillas ("vale", "bueno") se conservan
+    return " ".join(kept or words)
+
+
+def trigrams(text: str) -> set:
+    """Trigramas de caracteres con relleno en los extremos"""
+    padded = f"  {text} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def bounded_levenshtein(a: str, b: str, max_distance: int) -> Optional[int]:
+    """
+    Distancia de edición entre `a` y `b` si es <= `max_distance`, o None.
+
+    Solo se calcula la banda diagonal de ancho `max_distance` y se abandona
+    en cuanto una fila entera supera el límite.
+    """
+    if abs(len(a) - len(b)) > max_distance:
+        return None
+    if len(a) > len(b):
+        a, b = b, a
+
+    inf = max_distance + 1
+    previous = list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        low = max(1, i - max_distance)
+        high = min(len(b), i + max_distance)
+        current = [inf] * (len(b) + 1)
+        current[0] = i if i <= max_distance else inf
+        row_min = current[0]
+        ca = a[i - 1]
+        for j in range(low, high + 1):
+            cost = 0 if ca == b[j - 1] else 1
+            value = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + cost)
+            current[j] = value
+            if value < row_min:
+                row_min = value
+        if row_min > max_distance:
+            return None
+        previous = current
+
+    distance = previous[len(b)]
+    return distance if distance <= max_distance else None
+
+
+@dataclass
+class CannedMatch:
+    """Resultado de una búsqueda en el índice"""
+    intent: str
+    response: str
+    confidence: float
+    pattern: str
+
+
+class CannedResponseIndex:
+    """Índice de respuestas predefinidas con búsqueda exacta y aproximada"""
+
+    def __init__(self, min_confidence: float = CANNED_MIN_CONFIDENCE):
+        """
+        :param min_confidence: Confianza mínima (1 - distancia relativa) para aceptar una coincidencia
+        """
+        self.min_confidence = min_confidence
+        self._patterns: List[str] = []
+        self._entries: List[Tuple[str, str]] = []  # (intent, respuesta) por patrón
+        self._exact: Dict[str, int] = {}
+        self._postings: Dict[str, List[int]] = defaultdict(list)
+
+    def __len__(self) -> int:
+        return len(self._patterns)
+
+    def add(self, intent: str, patterns: Iterable[str], response: str) -> None:
+        """Añade un intent con sus frases de ejemplo"""
+        for pattern in patterns:
+            key = normalize(pattern)
+            if not key or key in self._exact:
+                continue
+            index = len(self._patterns)
+            self._patterns.append(key)
+            self._entries.append((intent, response))
+            self._exact[key] = index
+            for gram in trigrams(key):
+                self._postings[gram].append(index)
+
+    def responses(self) -> List[str]:
+        """Respuestas distintas sin plantilla (las que pueden sintetizarse de antemano)"""
+        return list(dict.fromkeys(response for _, response in self._entries if "{" not in response))
+
+    def match(self, text: str) -> Optional[CannedMatch]:
+        """
+        Busca la respuesta predefinida más parecida.
+
+        Returns:
+            La coincidencia si su confianza alcanza `min_confidence`, o None.
+        """
+        query = normalize(text)
+        if not query or len(query) > MAX_QUERY_CHARS:
+            return None
+
+        index = self._exact.get(query)
+        if index is not None:
+            return self._result(index, 1.0)
+
+        max_distance = int(len(query) * MAX_EDIT_RATIO)
+        if max_distance == 0:
+            return None
+
+        # Patrones que comparten trigramas discriminantes con la consulta
+        grams = trigrams(query)
+        overlap: Dict[int, int] = defaultdict(int)
+        skipped = 0
+        for gram in grams:
+            postings = self._postings.get(gram)
+            if postings is None:
+                continue
+            if len(postings) > MAX_POSTINGS:
+                skipped += 1
+                continue
+            for candidate in postings:
+                overlap[candidate] += 1
+
+        # Cada edición destruye como mucho tres trigramas: los patrones con
+        # menos trigramas en común no pueden estar a `max_distance` o menos
+        required = len(grams) - 3 * max_distance - skipped
+        candidates = [c for c, count in overlap.items() if count >= required]
+        if not candidates:
+            return None
+        candidates.sort(key=overlap.__getitem__, reverse=True)
+
+        best: Optional[Tuple[int, int]] = None
+        for candidate in candidates[:MAX_CANDIDATES]:
+            limit = max_distance if best is None else min(max_distance, best[1] - 1)
+            if limit < 0:
+                break
+            distance = bounded_levenshtein(query, self._patterns[candidate], limit)
+            if distance is not None:
+                best = (candidate, distance)
+        if best is None:
+            return None
+
+        candidate, distance = best
+        confidence = 1.0 - distance / max(len(query), len(self._patterns[candidate]))
+        if confidence < self.min_confidence:
+            return None
+        return self._result(candidate, confidence)
+
+    def _result(self, index: int, confidence: float) -> CannedMatch:
+        intent, response = self._entries[index]
+        if "{" in response:
+            response = response.format(hora=datetime.now().strftime("%H:%M"))
+        return CannedMatch(intent, response, confidence, self._patterns[index])
+
+    @classmethod
+    def from_file(cls, path: str = CANNED_RESPONSES_PATH, min_confidence: float = CANNED_MIN_CONFIDENCE) -> "CannedResponseIndex":
+        """Carga el índice desde el fichero JSON de intents"""
+        index = cls(min_confidence)
+        try:
+            with open(path, encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError) as e:
+            logger.warning(f"No se pudieron cargar las respuestas predefinidas de {path}: {e}")
+            return index
+
+        for entry in data.get("intents", []):
+            index.add(entry["intent"], entry["patterns"], entry["response"])
+        logger.info(f"Respuestas predefinidas cargadas: {len(index)} frases")
+        return index
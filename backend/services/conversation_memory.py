@@ -0,0 +1,207 @@
+import os
+import asyncio
+import logging
+from collections import deque
+from dataclasses import dataclass
+from typing import Awaitable, Callable, Deque, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Tokens máximos del prompt completo (instrucciones + historial + mensaje actual)
+CONVERSATION_MAX_TOKENS = int(os.getenv("CONVERSATION_MAX_TOKENS", 1500))
+# Turnos recientes (pregunta + respuesta) que se envían literalmente
+CONVERSATION_WINDOW_TURNS = int(os.getenv("CONVERSATION_WINDOW_TURNS", 6))
+# Longitud máxima del resumen de los turnos antiguos
+CONVERSATION_SUMMARY_TOKENS = int(os.getenv("CONVERSATION_SUMMARY_TOKENS", 200))
+
+# Tokens que añade el formato de chat a cada mensaje (rol y separadores)
+MESSAGE_OVERHEAD_TOKENS = 4
+
+SUMMARY_PREFIX = "Resumen de la conversación hasta ahora: "
+SUMMARY_SYSTEM_PROMPT = (
+    "Resumes conversaciones entre un usuario y un asistente de voz. "
+    "Conserva nombres, datos, preferencias y temas pendientes; omite saludos y relleno. "
+    "Responde solo con el resumen, en español y en pocas frases."
+)
+ROLE_NAMES = {"user": "Usuario", "assistant": "Asistente", "system": "Sistema"}
+
+# (resumen anterior o None, mensajes a incorporar) -> nuevo resumen
+Summarizer = Callable[[Optional[str], List[Dict[str, str]]], Awaitable[str]]
+
+_ENCODING = None
+
+
+def count_tokens(text: str) -> int:
+    """
+    Tokens de un texto. Usa tiktoken si está instalado; si no, una
+    estimación conservadora (un token cada 3 caracteres), suficiente para
+    respetar el presupuesto sin depender del tokenizador exacto.
+    """
+    global _ENCODING
+    if _ENCODING is None:
+        try:
+            import tiktoken  # Dependencia opcional
+            _ENCODING = tiktoken.get_encoding("o200k_base")
+        except Exception:
+            _ENCODING = False
+    if _ENCODING:
+        return len(_ENCODING.encode(text))
+    return len(text) // 3 + 1
+
+
+@dataclass(frozen=True)
+class MemoryMessage:
+    """Mensaje del historial con su coste en tokens ya calculado"""
+    role: str
+    content: str
+    tokens: int
+
+    @classmethod
+    def create(cls, role: str, content: str) -> "MemoryMessage":
+        return cls(role, content, count_tokens(content) + MESSAGE_OVERHEAD_TOKENS)
+
+    def as_dict(self) -> Dict[str, str]:
+        return {"role": self.role, "content": self.content}
+
+
+class ConversationMemory:
+    """
+    Historial de una sesión con coste por turno acotado.
+
+    - Cada mensaje guarda su número de tokens al añadirse, así que montar el
+      historial no vuelve a tokenizar nada.
+    - Solo se envían literalmente los últimos `window_turns` turnos, y solo
+      los que caben en el presupuesto del prompt, empezando por el más reciente.
+    - Los turnos que salen de la ventana se pliegan en segundo plano en un
+      mensaje de resumen, que sustituye a todo lo anterior. Mientras el resumen
+      se calcula, el turno siguiente no espera: usa la ventana y el resumen previo.
+
+    Sin `summarizer`, los turnos que salen de la ventana se descartan.
+    """
+
+    def __init__(
+        self,
+        summarizer: Optional[Summarizer] = None,
+        max_tokens: int = CONVERSATION_MAX_TOKENS,
+        window_turns: int = CONVERSATION_WINDOW_TURNS,
+    ):
+        """
+        :param summarizer: Función asíncrona que condensa los turnos antiguos
+        :param max_tokens: Presupuesto del prompt completo
+        :param window_turns: Turnos recientes que se envían sin resumir
+        """
+        self.summarizer = summarizer
+        self.max_tokens = max_tokens
+        self.window_turns = window_turns
+
+        self._messages: Deque[MemoryMessage] = deque()
+        self._summary: Optional[MemoryMessage] = None
+        self._summary_task: Optional[asyncio.Task] = None
+        self.turns = 0
+        self.summarized_turns = 0
+
+    @property
+    def summary(self) -> Optional[str]:
+        return self._summary.content[len(SUMMARY_PREFIX):] if self._summary else None
+
+    def add_turn(self, user: str, assistant: str) -> None:
+        """Registra un turno completo y, si alguno sale de la ventana, lanza el resumen"""
+        self._messages.append(MemoryMessage.create("user", user))
+        self._messages.append(MemoryMessage.create("assistant", assistant))
+        self.turns += 1
+
+        if self.summarizer is None:
+            while len(self._messages) > 2 * self.window_turns:
+                self._messages.popleft()
+        elif self._overflow() and (self._summary_task is None or self._summary_task.done()):
+            self._summary_task = asyncio.create_task(self._summarize(), name="conversation-summary")
+
+    def messages(self, system_prompt: Optional[str] = None, prompt: str = "") -> List[Dict[str, str]]:
+        """
+        Historial para el siguiente prompt (resumen + turnos recientes) sin
+        superar el presupuesto una vez sumados las instrucciones y el mensaje actual.
+        """
+        budget = self.max_tokens - count_tokens(prompt) - MESSAGE_OVERHEAD_TOKENS
+        if system_prompt:
+            budget -= count_tokens(system_prompt) + MESSAGE_OVERHEAD_TOKENS
+
+        recent: List[MemoryMessage] = []
+        window = list(self._messages)[-2 * self.window_turns:] if self.window_turns > 0 else []
+        # Se añaden turnos completos, del más reciente al más antiguo, mientras quepan
+        for i in range(len(window) - 2, -1, -2):
+            turn_tokens = window[i].tokens + window[i + 1].tokens
+            if turn_tokens > budget:
+                break
+            budget -= turn_tokens
+            recent[:0] = window[i:i + 2]
+
+        history = [m.as_dict() for m in recent]
+        if self._summary is not None and self._summary.tokens <= budget:
+            history.insert(0, self._summary.as_dict())
+        return history
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "turns": self.turns,
+            "summarized_turns": self.summarized_turns,
+            "buffered_messages": len(self._messages),
+            "buffered_tokens": sum(m.tokens for m in self._messages),
+            "summary_tokens": self._summary.tokens if self._summary else 0,
+        }
+
+    async def wait_for_summary(self) -> None:
+        """Espera a que termine el resumen en curso, si lo hay"""
+        if self._summary_task is not None:
+            await asyncio.gather(self._summary_task, return_exceptions=True)
+
+    async def close(self) -> None:
+        """Cancela el resumen pendiente (la sesión ha terminado)"""
+        if self._summary_task is not None and not self._summary_task.done():
+            self._summary_task.cancel()
+            await asyncio.gather(self._summary_task, return_exceptions=True)
+        self._summary_task = None
+
+    def _overflow(self) -> int:
+        """Mensajes que han salido de la ventana y aún no están resumidos"""
+        return max(0, len(self._messages) - 2 * self.window_turns)
+
+    async def _summarize(self) -> None:
+        """Pliega en el resumen los turnos fuera de la ventana hasta que no quede ninguno"""
+        while self._overflow():
+            count = self._overflow()
+            older = [self._messages[i].as_dict() for i in range(count)]
+            try:
+                text = (await self.summarizer(self.summary, older)).strip()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                # Se pierde ese contexto, pero el historial sigue acotado
+                logger.warning(f"No se pudo resumir la conversación, se descartan {count // 2} turnos: {e}")
+                text = None
+
+            for _ in range(count):
+                self._messages.popleft()
+            if text:
+                self._summary = MemoryMessage.create("system", SUMMARY_PREFIX + text)
+                self.summarized_turns += count // 2
+                logger.debug(f"Resumen actualizado ({self._summary.tokens} tokens)")
+
+
+def llm_summarizer(llm_service, max_tokens: int = CONVERSATION_SUMMARY_TOKENS) -> Summarizer:
+    """Resumidor que usa `OpenAIService.generate_response` con temperatura baja"""
+
+    async def summarize(summary: Optional[str], messages: List[Dict[str, str]]) -> str:
+        transcript = "\n".join(f"{ROLE_NAMES.get(m['role'], m['role'])}: {m['content']}" for m in messages)
+        prompt = f"Resumen anterior: {summary}\n\n" if summary else ""
+        prompt += f"Nuevos turnos:\n{transcript}\n\nEscribe el resumen actualizado de toda la conversación."
+        result = await llm_service.generate_response(
+            prompt,
+            system_prompt=SUMMARY_SYSTEM_PROMPT,
+            max_tokens=max_tokens,
+            temperature=0.2,
+        )
+        if not result.get("success"):
+            raise RuntimeError(result.get("error", "Error desconocido al resumir"))
+        return result["response"]
+
+    return summarize
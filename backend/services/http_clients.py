@@ -0,0 +1,185 @@
+import os
+import asyncio
+import logging
+from typing import Optional
+
+import httpx
+from openai import AsyncOpenAI
+
+logger = logging.getLogger(__name__)
+
+# Límites del pool de conexiones compartido con las APIs externas
+HTTP_MAX_CONNECTIONS = int(os.getenv("HTTP_MAX_CONNECTIONS", 100))
+HTTP_MAX_KEEPALIVE = int(os.getenv("HTTP_MAX_KEEPALIVE", 20))
+HTTP_KEEPALIVE_EXPIRY = float(os.getenv("HTTP_KEEPALIVE_EXPIRY", 60.0))
+HTTP_CONNECT_TIMEOUT = float(os.getenv("HTTP_CONNECT_TIMEOUT", 5.0))
+# HTTP/2 multiplexa las peticiones sobre una sola conexión (requiere el paquete h2)
+HTTP2 = os.getenv("HTTP2", "true").lower() in ("1", "true", "yes")
+# Conexiones que se abren al arrancar para que las primeras sesiones no paguen el handshake
+HTTP_WARMUP_CONNECTIONS = int(os.getenv("HTTP_WARMUP_CONNECTIONS", 2))
+HTTP_WARMUP_TIMEOUT = float(os.getenv("HTTP_WARMUP_TIMEOUT", 5.0))
+
+
+def _h2_available() -> bool:
+    try:
+        import h2  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+
+class ClientRegistry:
+    """
+    Clientes de las APIs externas compartidos por todo el proceso.
+
+    Un único pool httpx (keep-alive y, si está disponible, HTTP/2) y un
+    cliente de OpenAI montado sobre él. Los servicios piden el cliente al
+    registro en cada llamada en lugar de crear el suyo, así que todas las
+    sesiones reutilizan las mismas conexiones TLS ya abiertas.
+    """
+
+    def __init__(
+        self,
+        api_key: Optional[str] = None,
+        base_url: Optional[str] = None,
+        max_connections: int = HTTP_MAX_CONNECTIONS,
+        max_keepalive: int = HTTP_MAX_KEEPALIVE,
+        keepalive_expiry: float = HTTP_KEEPALIVE_EXPIRY,
+        connect_timeout: float = HTTP_CONNECT_TIMEOUT,
+        http2: bool = HTTP2,
+    ):
+        """
+        :param api_key: Clave de OpenAI (por defecto, OPENAI_API_KEY)
+        :param base_url: URL base de la API de OpenAI (por defecto, la del SDK)
+        :param max_connections: Conexiones simultáneas como máximo
+        :param max_keepalive: Conexiones inactivas que se mantienen abiertas
+        :param keepalive_expiry: Segundos que se conserva una conexión inactiva
+        :param connect_timeout: Tiempo máximo para establecer una conexión
+        :param http2: Usar HTTP/2 si el paquete h2 está instalado
+        """
+        self.api_key = api_key or os.getenv("OPENAI_API_KEY")
+        self.base_url = base_url or os.getenv("OPENAI_BASE_URL")
+        self.limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive,
+            keepalive_expiry=keepalive_expiry,
+        )
+        self.connect_timeout = connect_timeout
+        self.http2 = http2 and _h2_available()
+        if http2 and not self.http2:
+            logger.info("Paquete h2 no instalado, el pool HTTP usará HTTP/1.1")
+
+        self._http: Optional[httpx.AsyncClient] = None
+        self._openai: Optional[AsyncOpenAI] = None
+        self._closed = False
+
+    @property
+    def is_closed(self) -> bool:
+        return self._closed
+
+    @property
+    def http(self) -> httpx.AsyncClient:
+        """Pool HTTP compartido"""
+        if self._http is None:
+            self._http = httpx.AsyncClient(
+                limits=self.limits,
+                timeout=httpx.Timeout(60.0, connect=self.connect_timeout),
+                http2=self.http2,
+            )
+            logger.info(f"Pool HTTP compartido creado ({'HTTP/2' if self.http2 else 'HTTP/1.1'})")
+        return self._http
+
+    @property
+    def openai(self) -> AsyncOpenAI:
+        """Cliente de OpenAI sobre el pool compartido"""
+        if self._openai is None:
+            self._openai = AsyncOpenAI(api_key=self.api_key, base_url=self.base_url, http_client=self.http)
+        return self._openai
+
+    async def warm_up(self, connections: int = HTTP_WARMUP_CONNECTIONS, timeout: float = HTTP_WARMUP_TIMEOUT) -> int:
+        """
+        Abre conexiones con la API de OpenAI para dejarlas en el pool.
+
+        Basta con cualquier respuesta (incluso un 401): lo que se paga aquí es
+        el DNS y el handshake TLS. Con HTTP/2 una conexión sirve para todas las
+        peticiones, así que solo se abre una.
+
+        :return: Conexiones abiertas con éxito
+        """
+        if connections <= 0:
+            return 0
+        if self.http2:
+            connections = 1
+        url = str(self.openai.base_url).rstrip("/") + "/models"
+        headers = {"Authorization": f"Bearer {self.api_key}"} if self.api_key else {}
+
+        async def probe() -> bool:
+            try:
+                await self.http.get(url, headers=headers, timeout=timeout)
+                return True
+            except httpx.HTTPError as e:
+                logger.warning(f"No se pudo precalentar la conexión con {url}: {e}")
+                return False
+
+        results = await asyncio.gather(*(probe() for _ in range(connections)))
+        opened = sum(results)
+        logger.info(f"Pool HTTP precalentado: {opened}/{connections} conexiones con {url}")
+        return opened
+
+    async def aclose(self) -> None:
+        """Cierra el pool; las conexiones abiertas se liberan"""
+        self._closed = True
+        if self._openai is not None:
+            await self._openai.close()
+        if self._http is not None and not self._http.is_closed:
+            await self._http.aclose()
+        self._openai = None
+        self._http = None
+
+
+_registry: Optional[ClientRegistry] = None
+
+
+def get_client_registry() -> ClientRegistry:
+    """
+    Registro de clientes del proceso. Normalmente lo crea el arranque de la
+    aplicación (`open_client_registry`); si no, se crea al primer uso.
+    """
+    global _registry
+    if _registry is None or _registry.is_closed:
+        _registry = ClientRegistry()
+    return _registry
+
+
+async def open_client_registry(warm_up: bool = True, **kwargs) -> ClientRegistry:
+    """Crea el registro del proceso (sustituyendo al anterior) y precalienta sus conexiones"""
+    global _registry
+    if _registry is not None and not _registry.is_closed:
+        await _registry.aclose()
+    _registry = ClientRegistry(**kwargs)
+    if warm_up:
+        await _registry.warm_up()
+    return _registry
+
+
+def get_http_client() -> httpx.AsyncClient:
+    """
+    Devuelve el cliente HTTP asíncrono compartido por el proceso.
+
+    Mantiene las conexiones vivas entre peticiones, de modo que las llamadas
+    a la API no pagan un handshake TLS cada vez.
+    """
+    return get_client_registry().http
+
+
+def get_openai_client() -> AsyncOpenAI:
+    """Cliente de OpenAI compartido por el proceso"""
+    return get_client_registry().openai
+
+
+async def close_http_client() -> None:
+    """Cierra los clientes compartidos"""
+    global _registry
+    if _registry is not None:
+        await _registry.aclose()
+    _registry = None
@@ -1,75 +1,278 @@
 from enum import Enum, auto
-from bus import nats_conn
-import openai, logging
-from typing import Optional
+import os, asyncio, logging
+from typing import Any, Dict, Optional
+
+from services.backend_stats import BackendStats, HedgeBudget
+from services.canned_responses import CannedMatch, CannedResponseIndex
+from services.local_llm import LocalLLMError, get_local_llm
 
 logger = logging.getLogger(__name__)
 
+# Latencia p95 máxima aceptable por backend antes de desviar el tráfico
+LLM_LATENCY_BUDGET_MS = float(os.getenv("LLM_LATENCY_BUDGET_MS", 2500))
+# Tasa de errores (media móvil) a partir de la cual se evita un backend
+LLM_MAX_ERROR_RATE = float(os.getenv("LLM_MAX_ERROR_RATE", 0.5))
+# Tras este tiempo sin tráfico, un backend degradado vuelve a probarse
+LLM_RECOVERY_SECONDS = float(os.getenv("LLM_RECOVERY_SECONDS", 30))
+# Hedging: duplicar la consulta en el backend alternativo si el primario tarda
+LLM_HEDGE = os.getenv("LLM_HEDGE", "false").lower() in ("1", "true", "yes")
+# Percentil de latencia del primario tras el cual se lanza el duplicado
+LLM_HEDGE_PERCENTILE = float(os.getenv("LLM_HEDGE_PERCENTILE", 95))
+# Espera mínima antes de duplicar, aunque el percentil sea menor
+LLM_HEDGE_MIN_DELAY_MS = float(os.getenv("LLM_HEDGE_MIN_DELAY_MS", 50))
+# Fracción máxima de consultas que pueden duplicarse
+LLM_HEDGE_MAX_RATE = float(os.getenv("LLM_HEDGE_MAX_RATE", 0.1))
+
+_UNSET = object()
+
 class LLMType(Enum):
     FAST_LOCAL = auto()  # Llama.cpp
     CLOUD = auto()       # Gemini/OpenAI
     FALLBACK = auto()    # Respuestas predefinidas
 
+# Backend alternativo al que se desvía el tráfico si uno está degradado
+ALTERNATIVES = {
+    LLMType.FAST_LOCAL: LLMType.CLOUD,
+    LLMType.CLOUD: LLMType.FAST_LOCAL,
+}
+
 class LLMOrchestrator:
-    def __init__(self):
+    def __init__(
+        self,
+        latency_budget_ms: float = LLM_LATENCY_BUDGET_MS,
+        max_error_rate: float = LLM_MAX_ERROR_RATE,
+        recovery_seconds: float = LLM_RECOVERY_SECONDS,
+        hedge: bool = LLM_HEDGE,
+        hedge_percentile: float = LLM_HEDGE_PERCENTILE,
+        hedge_min_delay_ms: float = LLM_HEDGE_MIN_DELAY_MS
+    ):
+        """
+        :param latency_budget_ms: p95 máximo tolerado por backend
+        :param max_error_rate: Tasa de errores máxima tolerada por backend
+        :param recovery_seconds: Tiempo tras el cual se vuelve a probar un backend degradado
+        :param hedge: Si se duplican por defecto las consultas lentas
+        :param hedge_percentile: Percentil de latencia del primario que dispara el duplicado
+        :param hedge_min_delay_ms: Espera mínima antes de duplicar
+        """
         self.strategies = {
             LLMType.FAST_LOCAL: self._local_llm,
             LLMType.CLOUD: self._cloud_llm,
             LLMType.FALLBACK: self._fallback_llm
         }
-        self.fallback_responses = {
-            "hola": "¡Hola! ¿En qué puedo ayudarte?",
-            "gracias": "De nada, ¡estoy aquí para ayudar!"
-        }
-    
-    async def route_query(self, text: str) -> str:
+        # Respuestas predefinidas (data/canned_responses.json) con búsqueda aproximada
+        self.canned_responses = get_canned_index()
+        # Estadísticas compartidas por todos los orquestadores del proceso
+        self.stats = _backend_stats()
+        self.latency_budget_ms = latency_budget_ms
+        self.max_error_rate = max_error_rate
+        self.recovery_seconds = recovery_seconds
+        self.hedge = hedge
+        self.hedge_percentile = hedge_percentile
+        self.hedge_min_delay_ms = hedge_min_delay_ms
+        self.hedge_budget = _hedge_budget()
+
+    async def route_query(self, text: str, hedge: Optional[bool] = None) -> str:
         """
         Procesa la consulta con el modelo más adecuado
         :param text: Texto de entrada del usuario
+        :param hedge: Duplicar la consulta si el primario tarda (por defecto, según LLM_HEDGE)
         :return: Respuesta generada
         """
         try:
-            llm_type = self._select_llm(text)
-            response = await self.strategies[llm_type](text)
-            await nats_conn.publish("llm.response", response.encode())
+            # El índice se consulta una sola vez: la misma coincidencia decide y responde
+            canned = self.canned_responses.match(text)
+            llm_type = self._select_llm(text, canned)
+            hedge = self.hedge if hedge is None else hedge
+            if llm_type in ALTERNATIVES:
+                self.hedge_budget.on_request()
+            if llm_type == LLMType.FALLBACK:
+                response = await self._fallback_llm(text, canned)
+            elif hedge and llm_type in ALTERNATIVES:
+                response = await self._hedged_call(llm_type, text)
+            else:
+                try:
+                    response = await self._call(llm_type, text)
+                except Exception as e:
+                    alternative = ALTERNATIVES.get(llm_type)
+                    if alternative is None or not self._available(alternative):
+                        raise
+                    logger.warning(f"Fallo en {llm_type.name}, se reintenta con {alternative.name}: {e}")
+                    response = await self._call(alternative, text)
+            await self._publish(response)
             return response
         except Exception as e:
             logger.error(f"Error en LLM: {e}")
             return "Lo siento, ocurrió un error. Por favor intenta nuevamente."
-    
-    def _select_llm(self, text: str) -> LLMType:
-        """Heurística para selección de modelo"""
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Estado de cada backend para introspección (latencias, errores, en curso)"""
+        return {
+            "latency_budget_ms": self.latency_budget_ms,
+            "max_error_rate": self.max_error_rate,
+            "backends": {
+                llm_type.name: {**stats.snapshot(), "healthy": self._is_healthy(llm_type)}
+                for llm_type, stats in self.stats.items()
+            },
+            "hedging": self.hedge_budget.snapshot()
+        }
+
+    def _select_llm(self, text: str, canned: Optional[CannedMatch] = _UNSET) -> LLMType:
+        """
+        Heurística para selección de modelo, corregida con la latencia observada
+        :param canned: Resultado ya calculado de `canned_responses.match(text)`
+        """
         text_lower = text.lower().strip()
-        
-        # 1. Check fallback
-        if text_lower in self.fallback_responses:
+
+        # 1. Check fallback (coincidencia exacta o aproximada tras normalizar)
+        if canned is _UNSET:
+            canned = self.canned_responses.match(text)
+        if canned is not None:
             return LLMType.FALLBACK
-            
+
         # 2. Check complexity
         word_count = len(text_lower.split())
-        if word_count < 5 or len(text_lower) < 20:
-            return LLMType.FAST_LOCAL
-            
-        return LLMType.CLOUD
-    
-    async def _local_llm(self, text: str) -> str:
-        """Llama.cpp local (mock por ahora)"""
-        # TODO: Integrar con Llama.cpp
-        return f"[LOCAL] Respuesta para: {text}"
-    
-    async def _cloud_llm(self, text: str) -> str:
-        """Cloud LLM con retry logic"""
+        # Sin modelo local configurado todo va a la nube (no cuenta como error del local)
+        if (word_count < 5 or len(text_lower) < 20) and get_local_llm().configured:
+            preferred = LLMType.FAST_LOCAL
+        else:
+            preferred = LLMType.CLOUD
+
+        # 3. Check salud: si el preferido está fuera de presupuesto y el otro no, se desvía
+        alternative = ALTERNATIVES[preferred]
+        if not self._is_healthy(preferred) and self._available(alternative) and self._is_healthy(alternative):
+            logger.info(f"{preferred.name} degradado ({self.stats[preferred].snapshot()}), se usa {alternative.name}")
+            return alternative
+        return preferred
+
+    def _available(self, llm_type: LLMType) -> bool:
+        """El LLM local solo está disponible si hay un modelo configurado"""
+        return llm_type != LLMType.FAST_LOCAL or get_local_llm().configured
+
+    def _is_healthy(self, llm_type: LLMType) -> bool:
+        """Un backend está sano si su p95 y su tasa de errores están dentro del presupuesto"""
+        stats = self.stats.get(llm_type)
+        if stats is None or stats.requests == 0:
+            return True
+        # Sin tráfico reciente se le da otra oportunidad para actualizar sus estadísticas
+        if stats.in_flight == 0 and stats.idle_for() > self.recovery_seconds:
+            return True
+        if stats.error_rate > self.max_error_rate:
+            return False
+        p95 = stats.p95_ms
+        return p95 is None or p95 <= self.latency_budget_ms
+
+    async def _call(self, llm_type: LLMType, text: str) -> str:
+        """Ejecuta una estrategia registrando su latencia y sus errores"""
+        stats = self.stats.get(llm_type)
+        if stats is None:
+            return await self.strategies[llm_type](text)
+        with stats.track():
+            return await self.strategies[llm_type](text)
+
+    def _hedge_delay(self, llm_type: LLMType) -> float:
+        """Espera (en segundos) antes de duplicar: el percentil configurado del primario"""
+        observed = self.stats[llm_type].percentile(self.hedge_percentile)
+        delay_ms = self.latency_budget_ms if observed is None else observed
+        return max(delay_ms, self.hedge_min_delay_ms) / 1000
+
+    async def _hedged_call(self, primary: LLMType, text: str) -> str:
+        """
+        Lanza la consulta en el primario y, si no ha respondido tras el
+        percentil de latencia configurado, la duplica en el alternativo.
+        Gana la primera respuesta correcta y la otra petición se cancela.
+        Solo se duplica si el alternativo está disponible y sano.
+        """
+        secondary = ALTERNATIVES[primary]
+        if not self._available(secondary):
+            return await self._call(primary, text)
+        primary_task = asyncio.create_task(self._call(primary, text))
+        pending = {primary_task}
         try:
-            response = openai.ChatCompletion.create(
-                model="gpt-3.5-turbo",
-                messages=[{"role": "user", "content": text}]
-            )
-            return response.choices[0].message.content
+            done, pending = await asyncio.wait(pending, timeout=self._hedge_delay(primary))
+            if done:
+                if primary_task.exception() is None:
+                    return primary_task.result()
+                logger.warning(f"Fallo en {primary.name}, se reintenta con {secondary.name}: {primary_task.exception()}")
+                return await self._call(secondary, text)
+
+            if not self._is_healthy(secondary) or not self.hedge_budget.try_acquire():
+                # Alternativo degradado o sin presupuesto para duplicar: se espera al primario
+                return await primary_task
+
+            logger.info(f"{primary.name} no responde tras el p{self.hedge_percentile:g}, se duplica en {secondary.name}")
+            hedge_task = asyncio.create_task(self._call(secondary, text))
+            pending = {primary_task, hedge_task}
+            error: Optional[BaseException] = None
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is hedge_task:
+                            self.hedge_budget.wins += 1
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            # El perdedor (o todo, si se cancela la consulta) no sigue consumiendo
+            for task in pending:
+                task.cancel()
+            if pending:
+                await asyncio.gather(*pending, return_exceptions=True)
+
+    async def _publish(self, response: str) -> None:
+        """Publica la respuesta en el bus; un fallo del bus no invalida la respuesta"""
+        try:
+            from bus import nats_conn  # Import diferido: bus importa este módulo
+            await nats_conn.publish("llm.response", response.encode())
         except Exception as e:
-            logger.warning(f"Fallando a local LLM: {e}")
-            return await self._local_llm(text)
-    
-    async def _fallback_llm(self, text: str) -> str:
-        """Respuestas predefinidas sin costo"""
-        return self.fallback_responses[text.lower().strip()]
+            logger.warning(f"No se pudo publicar la respuesta en NATS: {e}")
+
+    async def _local_llm(self, text: str) -> str:
+        """LLM local residente (llama.cpp en un proceso aparte)"""
+        client = get_local_llm()
+        if not client.configured:
+            raise LocalLLMError("LLM local no configurado (LOCAL_LLM_MODEL_PATH)")
+        return await client.generate(text)
+
+    async def _cloud_llm(self, text: str) -> str:
+        """Cloud LLM (OpenAI) con el cliente asíncrono compartido"""
+        from services.llm_service import llm_service  # Requiere OPENAI_API_KEY
+
+        result = await llm_service.generate_response(text)
+        if not result.get("success"):
+            raise RuntimeError(result.get("error", "Error desconocido del LLM en la nube"))
+        return result["response"]
+
+    async def _fallback_llm(self, text: str, match: Optional[CannedMatch] = None) -> str:
+        """Respuestas predefinidas sin costo (reutiliza la coincidencia si ya se buscó)"""
+        if match is None:
+            match = self.canned_responses.match(text)
+        logger.debug(f"Respuesta predefinida '{match.intent}' (confianza {match.confidence:.2f})")
+        return match.response
+
+
+_CANNED_INDEX: Optional[CannedResponseIndex] = None
+_BACKEND_STATS: Optional[Dict[LLMType, BackendStats]] = None
+_HEDGE_BUDGET: Optional[HedgeBudget] = None
+
+
+def get_canned_index() -> CannedResponseIndex:
+    """El índice se carga una sola vez por proceso y lo comparten todos los orquestadores"""
+    global _CANNED_INDEX
+    if _CANNED_INDEX is None:
+        _CANNED_INDEX = CannedResponseIndex.from_file()
+    return _CANNED_INDEX
+
+
+def _backend_stats() -> Dict[LLMType, BackendStats]:
+    global _BACKEND_STATS
+    if _BACKEND_STATS is None:
+        _BACKEND_STATS = {llm_type: BackendStats(llm_type.name) for llm_type in ALTERNATIVES}
+    return _BACKEND_STATS
+
 
+def _hedge_budget() -> HedgeBudget:
+    global _HEDGE_BUDGET
+    if _HEDGE_BUDGET is None:
+        _HEDGE_BUDGET = HedgeBudget(LLM_HEDGE_MAX_RATE)
+    return _HEDGE_BUDGET
@@ -1,19 +1,45 @@
 import os
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, AsyncIterator
 import openai
 from openai import AsyncOpenAI
 import logging
 from dotenv import load_dotenv
 
-# Configurar logging
-logging.basicConfig(level=logging.INFO)
+from services.http_clients import get_openai_client
+from services.response_cache import LLM_CACHE_MAX_TEMPERATURE, TTLCache, completion_key
+
 logger = logging.getLogger(__name__)
 
 # Cargar variables de entorno
 load_dotenv()
 
+FALLBACK_RESPONSE = "Lo siento, tuve un problema al procesar tu solicitud. ¿Puedes intentarlo de nuevo?"
+
+
+class FailedDelta(str):
+    """
+    Último fragmento de un stream que ha fallado. Lleva la disculpa si el
+    error llega antes del primer fragmento, o está vacío si ya se había
+    emitido parte de la respuesta. `failed` permite detectarlo sin importar
+    este módulo (que exige OPENAI_API_KEY).
+    """
+    failed = True
+
+
 class OpenAIService:
-    def __init__(self):
+    def __init__(
+        self,
+        cache: Optional[TTLCache] = None,
+        cache_max_temperature: float = LLM_CACHE_MAX_TEMPERATURE,
+        client: Optional[AsyncOpenAI] = None
+    ):
+        """
+        :param cache: Caché de respuestas (por defecto, uno con CACHE_TTL y LLM_CACHE_SIZE)
+        :param cache_max_temperature: Temperatura máxima a la que se usa el caché
+        :param client: Cliente de OpenAI (por defecto, el del registro compartido del proceso)
+        """
+        self.cache = cache if cache is not None else TTLCache()
+        self.cache_max_temperature = cache_max_temperature
         self.api_key = os.getenv("OPENAI_API_KEY")
         self.model = os.getenv("OPENAI_MODEL", "gpt-4.1-nano")
         self.temperature = float(os.getenv("OPENAI_TEMPERATURE", 0.7))
@@ -23,7 +49,15 @@ class OpenAIService:
             logger.error("OPENAI_API_KEY no encontrada en las variables de entorno")
             raise ValueError("OPENAI_API_KEY no configurada")
             
-        self.client = AsyncOpenAI(api_key=self.api_key)
+        self._client = client
+
+    @property
+    def client(self) -> AsyncOpenAI:
+        """
+        Cliente de OpenAI. Se resuelve en cada uso para tomar el pool que abre
+        el arranque de la aplicación, aunque el servicio se cree antes.
+        """
+        return self._client or get_openai_client()
 
     async def generate_response(
         self, 
@@ -55,6 +89,24 @@ class OpenAIService:
             
             logger.debug(f"Usando max_tokens: {response_max_tokens}, temperature: {response_temperature}")
             
+            cache_key = self._cache_key(
+                prompt, system_prompt, conversation_history, response_temperature, response_max_tokens
+            )
+            if cache_key is not None:
+                cached = self.cache.get(cache_key)
+                if cached is not None:
+                    logger.debug("Respuesta servida desde el caché")
+                    return {
+                        "success": True,
+                        "response": cached,
+                        "usage": {
+                            "prompt_tokens": 0,
+                            "completion_tokens": 0,
+                            "total_tokens": 0,
+                            "cached": True
+                        }
+                    }
+            
             response = await self.client.chat.completions.create(
                 model=self.model,
                 messages=messages,
@@ -69,17 +121,21 @@ class OpenAIService:
             response_text = response.choices[0].message.content.strip()
             
             # Limpiar la respuesta
-            response_text = self._clean_response(response_text)
+            response_text = self.clean_response(response_text)
             
             logger.debug(f"Respuesta de OpenAI: {response_text}")
             
+            if cache_key is not None:
+                self.cache.put(cache_key, response_text)
+            
             return {
                 "success": True,
                 "response": response_text,
                 "usage": {
                     "prompt_tokens": response.usage.prompt_tokens,
                     "completion_tokens": response.usage.completion_tokens,
-                    "total_tokens": response.usage.total_tokens
+                    "total_tokens": response.usage.total_tokens,
+                    "cached": False
                 }
             }
         except Exception as e:
@@ -87,9 +143,86 @@ class OpenAIService:
             return {
                 "success": False,
                 "error": str(e),
-                "response": "Lo siento, tuve un problema al procesar tu solicitud. ¿Puedes intentarlo de nuevo?"
+                "response": FALLBACK_RESPONSE
             }
     
+    async def stream_response(
+        self,
+        prompt: str,
+        system_prompt: Optional[str] = None,
+        conversation_history: Optional[list] = None,
+        max_tokens: Optional[int] = None,
+        temperature: Optional[float] = None
+    ) -> AsyncIterator[str]:
+        """
+        Genera una respuesta en modo streaming, emitiendo los fragmentos de texto
+        a medida que llegan del modelo.
+        
+        Los fragmentos se emiten sin limpiar; el llamador debe aplicar
+        `clean_response` al texto completo una vez terminado el stream. Si la
+        respuesta está en el caché se emite completa en un único fragmento.
+        
+        Args:
+            prompt: El texto de entrada del usuario
+            system_prompt: Instrucciones del sistema opcionales
+            conversation_history: Historial de la conversación (lista de mensajes)
+            max_tokens: Máximo número de tokens para la respuesta
+            temperature: Controla la creatividad de la respuesta (0 a 1)
+        
+        Si la petición falla, el último fragmento es un `FailedDelta` (la
+        disculpa, o vacío si ya se había emitido parte de la respuesta), igual
+        que `success: False` en `generate_response`.
+        
+        Yields:
+            str: Fragmentos (deltas) de la respuesta
+        """
+        emitted = False
+        try:
+            messages = await self.build_messages(prompt, system_prompt, conversation_history)
+            
+            response_max_tokens = max_tokens if max_tokens is not None else self.max_tokens
+            response_temperature = temperature if temperature is not None else self.temperature
+            
+            logger.debug(f"Streaming con max_tokens: {response_max_tokens}, temperature: {response_temperature}")
+            
+            cache_key = self._cache_key(
+                prompt, system_prompt, conversation_history, response_temperature, response_max_tokens
+            )
+            if cache_key is not None:
+                cached = self.cache.get(cache_key)
+                if cached is not None:
+                    logger.debug("Respuesta servida desde el caché")
+                    emitted = True
+                    yield cached
+                    return
+            
+            parts = []
+            stream = await self.client.chat.completions.create(
+                model=self.model,
+                messages=messages,
+                temperature=response_temperature,
+                max_tokens=response_max_tokens,
+                top_p=0.9,
+                frequency_penalty=0.5,
+                presence_penalty=0.5,
+                stream=True,
+            )
+            
+            async for chunk in stream:
+                if not chunk.choices:
+                    continue
+                delta = chunk.choices[0].delta.content
+                if delta:
+                    emitted = True
+                    parts.append(delta)
+                    yield delta
+            
+            if cache_key is not None and parts:
+                self.cache.put(cache_key, self.clean_response("".join(parts).strip()))
+        except Exception as e:
+            logger.error(f"Error en el streaming de la respuesta: {str(e)}", exc_info=True)
+            yield FailedDelta("" if emitted else FALLBACK_RESPONSE)
+    
     async def build_messages(self, prompt: str, system_prompt: Optional[str] = None, conversation_history: Optional[list] = None) -> list:
         messages = []
         # Añadir mensaje del sistema si se proporciona o usar uno por defecto
@@ -108,7 +241,20 @@ class OpenAIService:
         messages.append({"role": "user", "content": prompt})
         return messages
     
-    def _clean_response(self, text: str) -> str:
+    def _cache_key(
+        self,
+        prompt: str,
+        system_prompt: Optional[str],
+        conversation_history: Optional[list],
+        temperature: float,
+        max_tokens: int
+    ) -> Optional[str]:
+        """Clave de caché de la petición, o None si no se debe cachear"""
+        if not self.cache.enabled or temperature > self.cache_max_temperature:
+            return None
+        return completion_key(prompt, system_prompt, conversation_history, self.model, temperature, max_tokens)
+    
+    def clean_response(self, text: str) -> str:
         """Limpia y formatea la respuesta para que suene más natural"""
         if not text:
             return "No estoy seguro de cómo responder a eso. ¿Podrías reformularlo?"
@@ -0,0 +1,246 @@
+import os
+import sys
+import json
+import asyncio
+import logging
+import itertools
+from pathlib import Path
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Modelo GGUF para llama.cpp ("echo" arranca el modelo de prueba); vacío = sin LLM local
+LOCAL_LLM_MODEL_PATH = os.getenv("LOCAL_LLM_MODEL_PATH", "")
+LOCAL_LLM_CTX = int(os.getenv("LOCAL_LLM_CTX", 2048))
+LOCAL_LLM_THREADS = int(os.getenv("LOCAL_LLM_THREADS", os.cpu_count() or 1))
+LOCAL_LLM_MAX_TOKENS = int(os.getenv("LOCAL_LLM_MAX_TOKENS", 128))
+# Peticiones en cola como máximo; por encima se rechaza para que el orquestador use otro backend
+LOCAL_LLM_QUEUE_SIZE = int(os.getenv("LOCAL_LLM_QUEUE_SIZE", 16))
+# Tiempo máximo para cargar el modelo al arrancar el proceso
+LOCAL_LLM_START_TIMEOUT = float(os.getenv("LOCAL_LLM_START_TIMEOUT", 120))
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+
+SYSTEM_PROMPT = "Eres un asistente de voz. Responde en español, de forma breve y natural."
+
+
+class LocalLLMError(RuntimeError):
+    """El LLM local no está disponible o falló la generación"""
+
+
+class LocalLLMBusy(LocalLLMError):
+    """La cola del LLM local está llena"""
+
+
+class LocalLLMClient:
+    """
+    Cliente asíncrono del proceso residente del LLM local
+    (`services.local_llm_worker`).
+
+    El proceso se arranca una vez y mantiene el modelo cargado; las
+    peticiones viajan como JSON por líneas sobre stdin/stdout. Un lector
+    reparte cada mensaje a la cola de su petición, de modo que varias
+    corrutinas pueden esperar a la vez mientras el proceso genera en orden.
+    """
+
+    def __init__(
+        self,
+        model_path: str = LOCAL_LLM_MODEL_PATH,
+        n_ctx: int = LOCAL_LLM_CTX,
+        n_threads: int = LOCAL_LLM_THREADS,
+        max_queue: int = LOCAL_LLM_QUEUE_SIZE,
+        start_timeout: float = LOCAL_LLM_START_TIMEOUT,
+    ):
+        """
+        :param model_path: Ruta al modelo GGUF, o "echo" para el modelo de prueba
+        :param n_ctx: Tamaño de contexto del modelo
+        :param n_threads: Hilos de CPU para la inferencia
+        :param max_queue: Peticiones pendientes como máximo
+        :param start_timeout: Tiempo máximo de carga del modelo
+        """
+        self.model_path = model_path
+        self.n_ctx = n_ctx
+        self.n_threads = n_threads
+        self.max_queue = max_queue
+        self.start_timeout = start_timeout
+
+        self._process: Optional[asyncio.subprocess.Process] = None
+        self._reader: Optional[asyncio.Task] = None
+        self._pending: Dict[int, asyncio.Queue] = {}
+        self._ids = itertools.count(1)
+        self._start_lock = asyncio.Lock()
+        self._write_lock = asyncio.Lock()
+
+    @property
+    def configured(self) -> bool:
+        return bool(self.model_path)
+
+    @property
+    def running(self) -> bool:
+        return self._process is not None and self._process.returncode is None
+
+    async def start(self) -> None:
+        """Arranca el proceso y espera a que el modelo esté cargado"""
+        async with self._start_lock:
+            if self.running:
+                return
+            if not self.configured:
+                raise LocalLLMError("LLM local no configurado (LOCAL_LLM_MODEL_PATH)")
+
+            logger.info(f"Arrancando LLM local con el modelo {self.model_path}...")
+            self._process = await asyncio.create_subprocess_exec(
+                sys.executable, "-m", "services.local_llm_worker",
+                "--model", self.model_path, "--ctx", str(self.n_ctx), "--threads", str(self.n_threads),
+                stdin=asyncio.subprocess.PIPE,
+                stdout=asyncio.subprocess.PIPE,
+                cwd=str(BACKEND_DIR),
+            )
+            try:
+                ready = await asyncio.wait_for(self._read_message(), self.start_timeout)
+            except (asyncio.TimeoutError, LocalLLMError) as e:
+                await self._kill()
+                raise LocalLLMError(f"El LLM local no arrancó: {e}") from e
+            if ready.get("type") != "ready":
+                await self._kill()
+                raise LocalLLMError(f"Respuesta inesperada del LLM local al arrancar: {ready}")
+
+            self._reader = asyncio.create_task(self._read_loop(), name="local-llm-reader")
+            logger.info(f"LLM local listo: {ready.get('model')}")
+
+    async def generate_stream(
+        self,
+        prompt: str,
+        system_prompt: Optional[str] = None,
+        conversation_history: Optional[List[Dict[str, str]]] = None,
+        max_tokens: int = LOCAL_LLM_MAX_TOKENS,
+        temperature: float = 0.7,
+    ) -> AsyncIterator[str]:
+        """
+        Genera una respuesta emitiendo los tokens a medida que llegan.
+
+        Raises:
+            LocalLLMBusy: Si la cola está llena
+            LocalLLMError: Si el proceso falla
+        """
+        if len(self._pending) >= self.max_queue:
+            raise LocalLLMBusy(f"Cola del LLM local llena ({self.max_queue} peticiones)")
+        await self.start()
+
+        messages = [{"role": "system", "content": system_prompt or SYSTEM_PROMPT}]
+        messages.extend(conversation_history or [])
+        messages.append({"role": "user", "content": prompt})
+
+        request_id = next(self._ids)
+        replies: asyncio.Queue = asyncio.Queue()
+        self._pending[request_id] = replies
+        finished = False
+        try:
+            await self._write({
+                "id": request_id,
+                "type": "generate",
+                "messages": messages,
+                "max_tokens": max_tokens,
+                "temperature": temperature,
+            })
+            while True:
+                message = await replies.get()
+                kind = message.get("type")
+                if kind == "token":
+                    yield message["text"]
+                elif kind == "done":
+                    finished = True
+                    return
+                else:
+                    finished = True
+                    raise LocalLLMError(message.get("message", f"Generación interrumpida: {kind}"))
+        finally:
+            self._pending.pop(request_id, None)
+            if not finished and self.running:
+                # El consumidor abandonó el stream: se libera el modelo para la siguiente petición
+                try:
+                    await self._write({"id": request_id, "type": "cancel"})
+                except Exception:
+                    pass
+
+    async def generate(self, prompt: str, **kwargs) -> str:
+        """Genera la respuesta completa"""
+        return "".join([token async for token in self.generate_stream(prompt, **kwargs)]).strip()
+
+    async def health(self, timeout: float = 2.0) -> Dict[str, Any]:
+        """Comprueba que el proceso responde; no arranca el proceso si está parado"""
+        if not self.configured:
+            return {"status": "disabled"}
+        if not self.running:
+            return {"status": "stopped"}
+
+        request_id = next(self._ids)
+        replies: asyncio.Queue = asyncio.Queue()
+        self._pending[request_id] = replies
+        try:
+            await self._write({"id": request_id, "type": "ping"})
+            pong = await asyncio.wait_for(replies.get(), timeout)
+            return {"status": "ok", "pending": len(self._pending) - 1, **pong}
+        except (asyncio.TimeoutError, LocalLLMError, OSError) as e:
+            return {"status": "unresponsive", "error": str(e) or type(e).__name__}
+        finally:
+            self._pending.pop(request_id, None)
+
+    async def close(self, timeout: float = 5.0) -> None:
+        """Detiene el proceso de forma ordenada (o lo mata si no responde)"""
+        if self._process is None:
+            return
+        if self.running:
+            try:
+                await self._write({"type": "shutdown"})
+                await asyncio.wait_for(self._process.wait(), timeout)
+            except (asyncio.TimeoutError, LocalLLMError, OSError):
+                pass
+        await self._kill()
+
+    async def _write(self, message: Dict[str, Any]) -> None:
+        if not self.running:
+            raise LocalLLMError("El proceso del LLM local no está en ejecución")
+        data = (json.dumps(message, ensure_ascii=False) + "\n").encode("utf-8")
+        async with self._write_lock:
+            self._process.stdin.write(data)
+            await self._process.stdin.drain()
+
+    async def _read_message(self) -> Dict[str, Any]:
+        line = await self._process.stdout.readline()
+        if not line:
+            raise LocalLLMError("El proceso del LLM local terminó")
+        return json.loads(line)
+
+    async def _read_loop(self) -> None:
+        """Reparte los mensajes del proceso a las peticiones que los esperan"""
+        try:
+            while True:
+                message = await self._read_message()
+                replies = self._pending.get(message.get("id"))
+                if replies is not None:
+                    replies.put_nowait(message)
+        except (LocalLLMError, ValueError, OSError) as e:
+            logger.error(f"Conexión con el LLM local perdida: {e}")
+        finally:
+            for replies in self._pending.values():
+                replies.put_nowait({"type": "error", "message": "El proceso del LLM local terminó"})
+
+    async def _kill(self) -> None:
+        if self._reader is not None:
+            self._reader.cancel()
+            self._reader = None
+        if self._process is not None and self._process.returncode is None:
+            self._process.kill()
+            await self._process.wait()
+        self._process = None
+
+
+_LOCAL_LLM: Optional[LocalLLMClient] = None
+
+
+def get_local_llm() -> LocalLLMClient:
+    """Cliente del LLM local compartido por todo el proceso"""
+    global _LOCAL_LLM
+    if _LOCAL_LLM is None:
+        _LOCAL_LLM = LocalLLMClient()
+    return _LOCAL_LLM
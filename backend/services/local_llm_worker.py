@@ -0,0 +1,189 @@
+"""
+Proceso residente del LLM local.
+
+Carga el modelo una sola vez y atiende peticiones por stdin/stdout con un
+mensaje JSON por línea:
+
+    → {"id": 1, "type": "generate", "messages": [...], "max_tokens": 128, "temperature": 0.7}
+    ← {"id": 1, "type": "token", "text": "Hola"}
+    ← {"id": 1, "type": "done", "text": "Hola, ¿qué tal?", "tokens": 5}
+
+    → {"id": 2, "type": "ping"}            ← {"id": 2, "type": "pong", ...}
+    → {"id": 1, "type": "cancel"}          (detiene la generación; se ignora si ya terminó)
+    → {"type": "shutdown"}
+
+Al arrancar emite `{"type": "ready", "model": ...}` cuando el modelo está
+cargado. Un hilo lector atiende stdin mientras el hilo principal genera, así
+que los ping y las cancelaciones no esperan a que termine la generación.
+
+Con `--model echo` se usa un modelo de prueba diminuto sin dependencias.
+
+Uso:
+    python -m services.local_llm_worker --model /ruta/modelo.gguf [--ctx 2048] [--threads 4]
+"""
+
+import os
+import sys
+import json
+import time
+import queue
+import argparse
+import threading
+from typing import Any, Dict, Iterator, List
+
+ECHO_MODEL = "echo"
+
+# Canal del protocolo; `main` lo separa de la salida estándar real para que
+# ningún print de una librería corrompa los mensajes
+_out = sys.stdout
+
+
+class EchoModel:
+    """Modelo de prueba: responde repitiendo el último mensaje del usuario palabra a palabra"""
+
+    name = ECHO_MODEL
+
+    def stream(self, messages: List[Dict[str, str]], max_tokens: int, temperature: float) -> Iterator[str]:
+        prompt = next((m["content"] for m in reversed(messages) if m.get("role") == "user"), "")
+        words = f"Has dicho: {prompt}".split()
+        for i, word in enumerate(words[:max_tokens]):
+            yield word if i == 0 else " " + word
+
+
+class LlamaCppModel:
+    """Modelo GGUF servido con llama-cpp-python"""
+
+    def __init__(self, model_path: str, n_ctx: int, n_threads: int):
+        from llama_cpp import Llama  # Dependencia opcional: solo en el proceso trabajador
+
+        self.name = model_path
+        self.llm = Llama(model_path=model_path, n_ctx=n_ctx, n_threads=n_threads, verbose=False)
+
+    def stream(self, messages: List[Dict[str, str]], max_tokens: int, temperature: float) -> Iterator[str]:
+        for chunk in self.llm.create_chat_completion(
+            messages=messages, max_tokens=max_tokens, temperature=temperature, stream=True
+        ):
+            text = chunk["choices"][0].get("delta", {}).get("content")
+            if text:
+                yield text
+
+
+def _send(message: Dict[str, Any], lock: threading.Lock) -> None:
+    line = json.dumps(message, ensure_ascii=False)
+    with lock:
+        _out.write(line + "\n")
+        _out.flush()
+
+
+def serve(model) -> None:
+    """Bucle principal: genera en este hilo y lee stdin en otro"""
+    out_lock = threading.Lock()
+    requests: "queue.Queue" = queue.Queue()
+    # Peticiones en cola o en curso; solo estas admiten cancelación, así que un
+    # cancel tardío (petición ya terminada) o desconocido no se queda en `cancelled`
+    active = set()
+    cancelled = set()
+    state_lock = threading.Lock()
+    started = time.monotonic()
+    served = [0]
+
+    def reader() -> None:
+        for line in sys.stdin:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                message = json.loads(line)
+            except ValueError:
+                continue
+            kind = message.get("type")
+            if kind == "ping":
+                _send({
+                    "id": message.get("id"),
+                    "type": "pong",
+                    "model": model.name,
+                    "queued": requests.qsize(),
+                    "served": served[0],
+                    "cancelling": len(cancelled),
+                    "uptime": round(time.monotonic() - started, 1),
+                }, out_lock)
+            elif kind == "cancel":
+                with state_lock:
+                    if message.get("id") in active:
+                        cancelled.add(message.get("id"))
+            else:
+                if kind != "shutdown":
+                    with state_lock:
+                        active.add(message.get("id"))
+                requests.put(message)
+                if kind == "shutdown":
+                    return
+        requests.put({"type": "shutdown"})
+
+    threading.Thread(target=reader, name="llm-stdin", daemon=True).start()
+    _send({"type": "ready", "model": model.name}, out_lock)
+
+    while True:
+        message = requests.get()
+        if message.get("type") == "shutdown":
+            return
+        request_id = message.get("id")
+        reply = None
+        try:
+            # Cancelada mientras esperaba en la cola: ni se genera ni se responde
+            if request_id not in cancelled:
+                reply = _generate(model, message, cancelled, out_lock)
+        finally:
+            with state_lock:
+                active.discard(request_id)
+                cancelled.discard(request_id)
+        # La respuesta final sale después de olvidar la petición: un cancel que
+        # llegue a partir de aquí ya se ignora
+        if reply is not None:
+            _send(reply, out_lock)
+            served[0] += 1
+
+
+def _generate(model, message: Dict[str, Any], cancelled: set, out_lock: threading.Lock) -> Dict[str, Any]:
+    """Genera una petición enviando los tokens a medida que salen; devuelve el mensaje final"""
+    request_id = message.get("id")
+    parts = []
+    try:
+        for token in model.stream(
+            message.get("messages", []),
+            int(message.get("max_tokens", 128)),
+            float(message.get("temperature", 0.7)),
+        ):
+            if request_id in cancelled:
+                break
+            parts.append(token)
+            if message.get("stream", True):
+                _send({"id": request_id, "type": "token", "text": token}, out_lock)
+        if request_id in cancelled:
+            return {"id": request_id, "type": "cancelled"}
+        return {"id": request_id, "type": "done", "text": "".join(parts), "tokens": len(parts)}
+    except Exception as e:
+        return {"id": request_id, "type": "error", "message": str(e)}
+
+
+def main() -> None:
+    global _out
+    sys.stdin.reconfigure(encoding="utf-8")
+    _out = os.fdopen(os.dup(sys.stdout.fileno()), "w", encoding="utf-8")
+    os.dup2(sys.stderr.fileno(), sys.stdout.fileno())
+
+    parser = argparse.ArgumentParser(description="Proceso residente del LLM local")
+    parser.add_argument("--model", required=True, help=f"Ruta a un modelo GGUF o '{ECHO_MODEL}'")
+    parser.add_argument("--ctx", type=int, default=2048)
+    parser.add_argument("--threads", type=int, default=None)
+    args = parser.parse_args()
+
+    if args.model == ECHO_MODEL:
+        model = EchoModel()
+    else:
+        model = LlamaCppModel(args.model, args.ctx, args.threads)
+    serve(model)
+
+
+if __name__ == "__main__":
+    main()
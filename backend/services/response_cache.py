@@ -0,0 +1,92 @@
+import os
+import json
+import time
+import hashlib
+import unicodedata
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional
+
+# Vida de cada respuesta en caché, en segundos. Con app/ el registro de
+# servicios construye el caché con settings.CACHE_TTL (y LLM_CACHE_*)
+CACHE_TTL = float(os.getenv("CACHE_TTL", 300))
+# Número máximo de respuestas guardadas
+LLM_CACHE_SIZE = int(os.getenv("LLM_CACHE_SIZE", 512))
+# Solo se cachea por debajo de esta temperatura: con más, se espera variedad
+LLM_CACHE_MAX_TEMPERATURE = float(os.getenv("LLM_CACHE_MAX_TEMPERATURE", 0.3))
+
+
+class TTLCache:
+    """
+    Caché en memoria con caducidad por entrada y expulsión LRU.
+
+    Pensado para el event loop: sin locks ni hilos; las entradas caducadas se
+    descartan al consultarlas o al hacer sitio.
+    """
+
+    def __init__(self, maxsize: int = LLM_CACHE_SIZE, ttl: float = CACHE_TTL):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.maxsize > 0 and self.ttl > 0
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        entry = self._entries.get(key)
+        if entry is not None:
+            expires, value = entry
+            if expires > time.monotonic():
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return value
+            del self._entries[key]
+        self.misses += 1
+        return None
+
+    def put(self, key: Hashable, value: Any) -> None:
+        if not self.enabled:
+            return
+        self._entries[key] = (time.monotonic() + self.ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def stats(self) -> Dict[str, Any]:
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+            "entries": len(self._entries),
+        }
+
+
+def normalize_prompt(text: str) -> str:
+    """Normaliza mayúsculas, Unicode y espacios para que variantes triviales compartan entrada"""
+    return " ".join(unicodedata.normalize("NFC", text).casefold().split())
+
+
+def completion_key(
+    prompt: str,
+    system_prompt: Optional[str],
+    conversation_history: Optional[list],
+    model: str,
+    temperature: float,
+    max_tokens: int,
+) -> str:
+    """Clave de una petición de completado con todos los parámetros que afectan al resultado"""
+    material = json.dumps(
+        [normalize_prompt(prompt), system_prompt, conversation_history or [], model, temperature, max_tokens],
+        ensure_ascii=False,
+        sort_keys=True,
+    )
+    return hashlib.sha256(material.encode("utf-8")).hexdigest()
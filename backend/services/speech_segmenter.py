@@ -0,0 +1,80 @@
+import re
+from typing import List, Optional
+
+# Fin de oración: signos de cierre seguidos de espacio (evita cortar "3.5" o "www.x.com")
+_SENTENCE_END = re.compile(r'[.!?…]+["\'»)\]]*\s+')
+# Fin de cláusula: solo se usa cuando el fragmento acumulado ya es largo
+_CLAUSE_END = re.compile(r'[,;:]\s+')
+
+# Abreviaturas frecuentes que no terminan una oración
+ABBREVIATIONS = {
+    "sr", "sra", "srta", "dr", "dra", "ud", "uds", "etc", "ej", "p.ej",
+    "aprox", "av", "núm", "pág", "tel", "vs",
+}
+
+
+class SentenceSegmenter:
+    """
+    Divide texto recibido por fragmentos en oraciones o cláusulas completas.
+
+    Está pensado para alimentar el TTS mientras el LLM todavía está generando:
+    cada vez que se completa una oración se puede sintetizar sin esperar al
+    resto de la respuesta.
+    """
+
+    def __init__(self, min_chars: int = 12, max_clause_chars: int = 80):
+        """
+        :param min_chars: Longitud mínima de un segmento; los más cortos se unen al siguiente
+        :param max_clause_chars: A partir de esta longitud también se corta en , ; :
+        """
+        self.min_chars = min_chars
+        self.max_clause_chars = max_clause_chars
+        self._buffer = ""
+
+    def feed(self, delta: str) -> List[str]:
+        """
+        Añade un fragmento de texto y devuelve los segmentos que quedaron completos.
+        """
+        self._buffer += delta
+        segments = []
+
+        while True:
+            cut = self._find_cut()
+            if cut is None:
+                break
+            segment = self._buffer[:cut].strip()
+            self._buffer = self._buffer[cut:]
+            if segment:
+                segments.append(segment)
+
+        return segments
+
+    def flush(self) -> Optional[str]:
+        """Devuelve el texto pendiente al terminar el stream."""
+        segment = self._buffer.strip()
+        self._buffer = ""
+        return segment or None
+
+    def _find_cut(self) -> Optional[int]:
+        """Posición donde cortar el buffer, o None si aún no hay un segmento completo."""
+        for match in _SENTENCE_END.finditer(self._buffer):
+            if match.end() < self.min_chars:
+                continue
+            if self._is_abbreviation(match.start()):
+                continue
+            return match.end()
+
+        if len(self._buffer) >= self.max_clause_chars:
+            for match in _CLAUSE_END.finditer(self._buffer):
+                if match.end() >= self.min_chars:
+                    return match.end()
+
+        return None
+
+    def _is_abbreviation(self, dot_index: int) -> bool:
+        """Comprueba si el punto en `dot_index` pertenece a una abreviatura."""
+        if self._buffer[dot_index] != ".":
+            return False
+        words = self._buffer[:dot_index].split()
+        return bool(words) and words[-1].lower().lstrip("¿¡(\"'") in ABBREVIATIONS
+
@@ -0,0 +1,375 @@
+import os
+import asyncio
+import logging
+import subprocess
+from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional, Union
+
+import numpy as np
+from openai import AsyncOpenAI
+
+from services.http_clients import get_openai_client
+from services.audio_preprocessing import TARGET_SAMPLE_RATE, encode_wav, to_int16
+
+logger = logging.getLogger(__name__)
+
+# Tiempo máximo por llamada a la API de Whisper
+STT_TIMEOUT = float(os.getenv("STT_TIMEOUT", 15.0))
+# Transcripciones simultáneas permitidas por proceso
+STT_MAX_CONCURRENCY = int(os.getenv("STT_MAX_CONCURRENCY", 8))
+# Dispositivo para el modelo local de Whisper ("cpu" o "cuda")
+WHISPER_DEVICE = os.getenv("WHISPER_DEVICE", "cpu")
+# Clips que se decodifican juntos como máximo con Whisper local (1 = sin lotes)
+STT_BATCH_SIZE = int(os.getenv("STT_BATCH_SIZE", 8))
+# Espera máxima para completar un lote antes de lanzarlo
+STT_BATCH_WAIT_MS = float(os.getenv("STT_BATCH_WAIT_MS", 10.0))
+
+# Modelos que se sirven desde la API de OpenAI; cualquier otro nombre
+# (tiny, base, small, medium, large-v3, turbo...) se carga en local
+CLOUD_MODELS = {"whisper-1", "gpt-4o-transcribe", "gpt-4o-mini-transcribe"}
+
+# Ventana de audio que Whisper procesa de una vez (30 s a 16 kHz)
+WHISPER_WINDOW_SAMPLES = 30 * TARGET_SAMPLE_RATE
+
+LANGUAGE = "es"  # Forzar idioma español
+PROMPT = "Transcribe el siguiente audio con puntuación correcta."
+
+# Decodificación con Whisper local, igual con y sin lotes (valores por defecto
+# de whisper.transcribe): si el resultado es repetitivo o poco fiable se
+# repite con la siguiente temperatura, y un clip que parece silencio se descarta
+WHISPER_TEMPERATURES = (0.0, 0.2, 0.4, 0.6, 0.8, 1.0)
+WHISPER_COMPRESSION_RATIO_THRESHOLD = 2.4
+WHISPER_LOGPROB_THRESHOLD = -1.0
+WHISPER_NO_SPEECH_THRESHOLD = 0.6
+
+# Firmas de los formatos que el navegador puede enviar sin decodificar
+_AUDIO_SIGNATURES = {
+    b"RIFF": "audio.wav",
+    b"\x1aE\xdf\xa3": "audio.webm",
+    b"OggS": "audio.ogg",
+    b"fLaC": "audio.flac",
+    b"ID3": "audio.mp3",
+}
+
+# Audio ya normalizado (mono, 16 kHz, float32) o bytes sin decodificar
+AudioInput = Union[np.ndarray, bytes]
+
+
+class STTBackend(ABC):
+    """Interfaz común de los motores de transcripción"""
+
+    name: str = "base"
+
+    async def load(self) -> None:
+        """Precarga los recursos del motor (modelos, conexiones)"""
+
+    def prepare(self, samples: np.ndarray) -> AudioInput:
+        """
+        Adapta el audio normalizado al formato de entrada del motor.
+
+        Se ejecuta fuera del event loop, junto con el resto del preprocesado.
+        """
+        return samples
+
+    @abstractmethod
+    async def transcribe(self, audio: AudioInput) -> Optional[str]:
+        """
+        Transcribe un clip.
+
+        :param audio: Muestras mono float32 a 16 kHz, o bytes en el formato
+                      original si no se pudieron decodificar localmente
+        :return: Texto transcrito (sin limpiar) o None
+        """
+
+    async def close(self) -> None:
+        """Libera los recursos del motor"""
+
+
+class OpenAIWhisperBackend(STTBackend):
+    """Transcripción con la API de Whisper de OpenAI"""
+
+    name = "openai"
+
+    def __init__(
+        self,
+        model: str = "whisper-1",
+        client: Optional[AsyncOpenAI] = None,
+        timeout: float = STT_TIMEOUT,
+        max_concurrency: int = STT_MAX_CONCURRENCY,
+    ):
+        """
+        :param model: Modelo de la API
+        :param client: Cliente asíncrono de OpenAI (por defecto, el del registro compartido del proceso)
+        :param timeout: Tiempo máximo por transcripción en segundos
+        :param max_concurrency: Número máximo de transcripciones simultáneas
+        """
+        self.model = model
+        self._client = client
+        self.timeout = timeout
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+
+    @property
+    def client(self) -> AsyncOpenAI:
+        return self._client or get_openai_client()
+
+    def prepare(self, samples: np.ndarray) -> bytes:
+        # load_for_stt ya ha normalizado el pico
+        return encode_wav(to_int16(samples, normalize=False))
+
+    async def transcribe(self, audio: AudioInput) -> Optional[str]:
+        if isinstance(audio, np.ndarray):
+            audio = self.prepare(audio)
+
+        # El audio se sube directamente desde memoria
+        async with self._semaphore:
+            response = await self.client.audio.transcriptions.create(
+                model=self.model,
+                file=(_filename(audio), audio),
+                language=LANGUAGE,
+                temperature=0.2,  # Más determinista
+                prompt=PROMPT,
+                timeout=self.timeout,
+            )
+        return response.text
+
+
+class LocalWhisperBackend(STTBackend):
+    """
+    Transcripción con un modelo de Whisper residente en el proceso.
+
+    El modelo se carga una sola vez (idealmente al arrancar, con `load`) y
+    la inferencia se ejecuta en un executor dedicado de un hilo, para que la
+    CPU ocupada por el modelo no bloquee el event loop.
+    """
+
+    name = "local"
+
+    def __init__(self, model_name: str = "base", device: str = WHISPER_DEVICE):
+        """
+        :param model_name: Nombre del modelo de openai-whisper (tiny, base, small...)
+        :param device: Dispositivo de inferencia
+        """
+        self.model_name = model_name
+        self.device = device
+        self.model = None
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="whisper")
+        self._load_lock = asyncio.Lock()
+
+    async def load(self) -> None:
+        async with self._load_lock:
+            if self.model is None:
+                loop = asyncio.get_running_loop()
+                self.model = await loop.run_in_executor(self._executor, self._load_model)
+
+    def _load_model(self):
+        import whisper  # Dependencia pesada: solo se importa si se usa el motor local
+
+        logger.info(f"Cargando modelo local de Whisper '{self.model_name}' en {self.device}...")
+        model = whisper.load_model(self.model_name, device=self.device)
+        logger.info("Modelo local de Whisper cargado")
+        return model
+
+    async def transcribe(self, audio: AudioInput) -> Optional[str]:
+        await self.load()
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, self._transcribe_sync, audio)
+
+    def _transcribe_sync(self, audio: AudioInput) -> Optional[str]:
+        if not isinstance(audio, np.ndarray):
+            audio = _ffmpeg_decode(audio)
+        result = self.model.transcribe(
+            audio.astype(np.float32, copy=False),
+            language=LANGUAGE,
+            temperature=WHISPER_TEMPERATURES,
+            compression_ratio_threshold=WHISPER_COMPRESSION_RATIO_THRESHOLD,
+            logprob_threshold=WHISPER_LOGPROB_THRESHOLD,
+            no_speech_threshold=WHISPER_NO_SPEECH_THRESHOLD,
+            initial_prompt=PROMPT,
+            fp16=self.device != "cpu",
+        )
+        return result.get("text")
+
+    async def close(self) -> None:
+        self._executor.shutdown(wait=False)
+        self.model = None
+
+
+class BatchingWhisperBackend(LocalWhisperBackend):
+    """
+    Whisper local con micro-lotes entre conexiones.
+
+    Las peticiones de todas las sesiones se acumulan durante unos pocos
+    milisegundos (o hasta `max_batch_size` clips), se rellenan a la ventana
+    de 30 s de Whisper y se decodifican con una sola llamada al modelo. Cada
+    resultado se devuelve a la corrutina que lo pidió. Mientras un lote se
+    decodifica, los clips nuevos esperan en la cola y forman el siguiente.
+
+    Los clips más largos que la ventana del modelo se transcriben por
+    separado con `model.transcribe`, que sabe trocearlos.
+
+    Cada clip del lote pasa por las mismas comprobaciones que
+    `model.transcribe`: los que salen repetitivos o con poca confianza se
+    vuelven a decodificar juntos con la siguiente temperatura, y los que
+    parecen silencio devuelven texto vacío.
+    """
+
+    name = "local-batch"
+
+    def __init__(
+        self,
+        model_name: str = "base",
+        device: str = WHISPER_DEVICE,
+        max_batch_size: int = STT_BATCH_SIZE,
+        max_wait_ms: float = STT_BATCH_WAIT_MS,
+    ):
+        """
+        :param max_batch_size: Clips por lote como máximo
+        :param max_wait_ms: Tiempo máximo que el primer clip espera a que se llene el lote
+        """
+        super().__init__(model_name, device)
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max_wait_ms / 1000
+        self._pending: Optional[asyncio.Queue] = None
+        self._collector: Optional[asyncio.Task] = None
+
+    async def transcribe(self, audio: AudioInput) -> Optional[str]:
+        await self.load()
+        if not isinstance(audio, np.ndarray):
+            audio = await asyncio.to_thread(_ffmpeg_decode, audio)
+        if len(audio) > WHISPER_WINDOW_SAMPLES:
+            return await super().transcribe(audio)
+
+        if self._collector is None or self._collector.done():
+            self._pending = asyncio.Queue()
+            self._collector = asyncio.create_task(self._collect(), name="whisper-batcher")
+
+        future = asyncio.get_running_loop().create_future()
+        await self._pending.put((audio, future))
+        return await future
+
+    async def _collect(self) -> None:
+        """Forma lotes con los clips pendientes y los decodifica de uno en uno"""
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._pending.get()]
+            deadline = loop.time() + self.max_wait
+            while len(batch) < self.max_batch_size:
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._pending.get(), remaining))
+                except asyncio.TimeoutError:
+                    break
+
+            # Las peticiones canceladas mientras esperaban no ocupan sitio en el lote
+            batch = [(audio, future) for audio, future in batch if not future.done()]
+            if not batch:
+                continue
+
+            try:
+                texts = await loop.run_in_executor(
+                    self._executor, self._decode_batch, [audio for audio, _ in batch]
+                )
+            except Exception as e:
+                logger.error(f"Error al decodificar un lote de {len(batch)} clips: {e}", exc_info=True)
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+
+            logger.debug(f"Lote de Whisper decodificado: {len(batch)} clips")
+            for (_, future), text in zip(batch, texts):
+                if not future.done():
+                    future.set_result(text)
+
+    def _decode_batch(self, clips: List[np.ndarray]) -> List[str]:
+        import torch
+        import whisper
+
+        # El espectrograma se normaliza por clip, así que se calcula uno a uno
+        n_mels = self.model.dims.n_mels
+        mels = torch.stack([
+            whisper.log_mel_spectrogram(whisper.pad_or_trim(clip.astype(np.float32, copy=False)), n_mels=n_mels)
+            for clip in clips
+        ]).to(self.model.device)
+
+        results = [None] * len(clips)
+        pending = list(range(len(clips)))
+        for temperature in WHISPER_TEMPERATURES:
+            options = whisper.DecodingOptions(
+                language=LANGUAGE,
+                temperature=temperature,
+                prompt=PROMPT,
+                without_timestamps=True,
+                fp16=self.device != "cpu",
+            )
+            batch = mels if len(pending) == len(clips) else mels[pending]
+            retry = []
+            for index, result in zip(pending, self.model.decode(batch, options)):
+                results[index] = result
+                if _needs_fallback(result):
+                    retry.append(index)
+            if not retry:
+                break
+            pending = retry
+        return ["" if _is_silence(result) else result.text for result in results]
+
+    async def close(self) -> None:
+        if self._collector is not None:
+            self._collector.cancel()
+            self._collector = None
+        await super().close()
+
+
+def create_stt_backend(model: str, device: str = WHISPER_DEVICE) -> STTBackend:
+    """
+    Crea el motor de STT correspondiente a `WHISPER_MODEL`.
+
+    Los modelos de la API (p. ej. whisper-1) usan OpenAI; el resto se
+    interpreta como un modelo local de openai-whisper, con micro-lotes salvo
+    que `STT_BATCH_SIZE` sea 1.
+
+    :param device: Dispositivo del modelo local (`WHISPER_DEVICE`)
+    """
+    if model in CLOUD_MODELS:
+        return OpenAIWhisperBackend(model)
+    if STT_BATCH_SIZE > 1:
+        return BatchingWhisperBackend(model, device)
+    return LocalWhisperBackend(model, device)
+
+
+def _needs_fallback(result) -> bool:
+    """Mismo criterio que whisper.transcribe para repetir con más temperatura"""
+    if result.no_speech_prob > WHISPER_NO_SPEECH_THRESHOLD:
+        return False  # Silencio: otra temperatura no lo arregla
+    return (
+        result.compression_ratio > WHISPER_COMPRESSION_RATIO_THRESHOLD
+        or result.avg_logprob < WHISPER_LOGPROB_THRESHOLD
+    )
+
+
+def _is_silence(result) -> bool:
+    """Mismo criterio que whisper.transcribe para descartar un segmento sin voz"""
+    return result.no_speech_prob > WHISPER_NO_SPEECH_THRESHOLD and result.avg_logprob <= WHISPER_LOGPROB_THRESHOLD
+
+
+def _filename(audio_data: bytes) -> str:
+    """Nombre de fichero con la extensión que la API usa para detectar el formato"""
+    for signature, filename in _AUDIO_SIGNATURES.items():
+        if audio_data.startswith(signature):
+            return filename
+    return "audio.wav"
+
+
+def _ffmpeg_decode(audio_data: bytes) -> np.ndarray:
+    """Decodifica cualquier formato con ffmpeg a mono float32 de 16 kHz, sin ficheros temporales"""
+    result = subprocess.run(
+        ["ffmpeg", "-nostdin", "-loglevel", "error", "-i", "pipe:0",
+         "-f", "s16le", "-ac", "1", "-ar", str(TARGET_SAMPLE_RATE), "pipe:1"],
+        input=audio_data,
+        capture_output=True,
+        check=True,
+    )
+    return np.frombuffer(result.stdout, dtype=np.int16).astype(np.float32) / 32768.0
@@ -1,30 +1,69 @@
 import os
-import base64
+import asyncio
 import logging
-import tempfile
-from typing import Optional
-import numpy as np
-import openai
-from openai import OpenAI
+from typing import Optional, Union
+from openai import AsyncOpenAI
+
+from services.vad import VoiceActivityDetector
+from services.stt_backends import (
+    AudioInput, OpenAIWhisperBackend, STTBackend, STT_MAX_CONCURRENCY, STT_TIMEOUT, WHISPER_DEVICE,
+    create_stt_backend
+)
+from services.audio_preprocessing import AudioDecodeError, TARGET_SAMPLE_RATE, load_for_stt
 
 logger = logging.getLogger(__name__)
 
+# Modelo de Whisper: "whisper-1" usa la API de OpenAI; tiny, base, small... un modelo local
+WHISPER_MODEL = os.getenv("WHISPER_MODEL", "whisper-1")
+
 class STTService:
-    def __init__(self, model: str = "whisper-1"):
+    def __init__(
+        self,
+        model: str = WHISPER_MODEL,
+        client: Optional[AsyncOpenAI] = None,
+        timeout: float = STT_TIMEOUT,
+        max_concurrency: int = STT_MAX_CONCURRENCY,
+        backend: Optional[STTBackend] = None,
+        device: str = WHISPER_DEVICE
+    ):
         """
-        Inicializa el servicio STT con la API de Whisper de OpenAI
-        :param model: Modelo de Whisper a utilizar (por defecto: whisper-1)
+        Inicializa el servicio STT con el motor correspondiente al modelo
+        :param model: Modelo de Whisper a utilizar (por defecto: WHISPER_MODEL)
+        :param client: Cliente asíncrono de OpenAI; si se indica, se usa la API
+        :param timeout: Tiempo máximo por transcripción en la API, en segundos
+        :param max_concurrency: Número máximo de transcripciones simultáneas en la API
+        :param backend: Motor de transcripción ya construido (tiene prioridad)
+        :param device: Dispositivo del modelo local (por defecto: WHISPER_DEVICE)
         """
         self.model = model
-        self.client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
-        logger.info("Servicio STT inicializado con la API de OpenAI")
+        if backend is None and client is not None:
+            backend = OpenAIWhisperBackend(model, client, timeout, max_concurrency)
+        elif backend is None:
+            backend = create_stt_backend(model, device)
+        self.backend = backend
+        logger.info(f"Servicio STT inicializado con el motor '{self.backend.name}' ({model})")
+
+    async def load(self) -> None:
+        """Precarga el motor (en local, el modelo de Whisper); llamar al arrancar"""
+        await self.backend.load()
 
-    async def transcribe_audio(self, audio_data: bytes) -> Optional[str]:
+    async def close(self) -> None:
+        await self.backend.close()
+
+    async def transcribe_audio(
+        self,
+        audio_data: Union[bytes, memoryview],
+        sample_rate: Optional[int] = None,
+        channels: int = 1
+    ) -> Optional[str]:
         """
-        Transcribe audio a texto usando la API de Whisper
+        Transcribe audio a texto usando el motor de Whisper configurado
         
         Args:
-            audio_data: Bytes de audio en formato WAV/PCM
+            audio_data: Audio en un contenedor (WAV, webm...) o PCM de 16 bits
+                sin cabecera; puede ser una vista sobre el mensaje recibido
+            sample_rate: Frecuencia del PCM sin cabecera
+            channels: Canales del PCM sin cabecera
             
         Returns:
             str: Texto transcrito
@@ -35,48 +74,54 @@ class STTService:
             return None
             
         try:
-            logger.info(f"Procesando audio de {len(audio_data)} bytes")
-            # Crear un archivo temporal para el audio
-            with tempfile.NamedTemporaryFile(delete=False, suffix=".wav") as temp_audio:
-                temp_audio.write(audio_data)
-                temp_audio_path = temp_audio.name
+            # Normalizar, recortar silencios y descartar audio sin voz antes de
+            # transcribir (trabajo de CPU, fuera del event loop)
+            audio_data = await asyncio.to_thread(self._prepare_audio, audio_data, sample_rate, channels)
+            if audio_data is None:
+                logger.info("No se detectó voz en el audio, se omite la transcripción")
+                return None
             
-            try:
-                logger.debug("Enviando audio a Whisper para transcripción...")
-                
-                # Usar la API de Whisper para transcribir
-                with open(temp_audio_path, "rb") as audio_file:
-                    response = self.client.audio.transcriptions.create(
-                        model=self.model,
-                        file=audio_file,
-                        language="es",  # Forzar idioma español
-                        temperature=0.2,  # Más determinista
-                        prompt="Transcribe el siguiente audio con puntuación correcta."
-                    )
-                
-                transcription = response.text.strip()
-                
-                if not transcription or len(transcription) < 2:  # Muy corta para ser válida
-                    logger.warning("Transcripción vacía o demasiado corta")
-                    return None
-                    
-                logger.info(f"Transcripción exitosa: {transcription[:100]}...")
-                return transcription
-                
-            except Exception as e:
-                logger.error(f"Error en la API de Whisper: {str(e)}", exc_info=True)
-                logger.error(f"Detalles del error de Whisper API: {repr(e)}")
+            logger.debug(f"Enviando audio al motor '{self.backend.name}' para transcripción...")
+            text = await self.backend.transcribe(audio_data)
+            transcription = (text or "").strip()
+            
+            if not transcription or len(transcription) < 2:  # Muy corta para ser válida
+                logger.warning("Transcripción vacía o demasiado corta")
                 return None
                 
-            finally:
-                # Asegurarse de eliminar el archivo temporal
-                try:
-                    os.unlink(temp_audio_path)
-                except Exception as e:
-                    logger.warning(f"No se pudo eliminar el archivo temporal: {str(e)}")
-                    
+            logger.info(f"Transcripción exitosa: {transcription[:100]}...")
+            return transcription
+            
         except Exception as e:
-            logger.error(f"Error al procesar el audio: {str(e)}", exc_info=True)
-            logger.error(f"Detalles del error de procesamiento de audio: {repr(e)}")
+            logger.error(f"Error en la transcripción con Whisper: {str(e)}", exc_info=True)
+            logger.error(f"Detalles del error de Whisper: {repr(e)}")
             return None
 
+    def _prepare_audio(
+        self,
+        audio_data: Union[bytes, memoryview],
+        sample_rate: Optional[int] = None,
+        channels: int = 1
+    ) -> Optional[AudioInput]:
+        """
+        Normaliza el audio a mono de 16 kHz, recorta los silencios y lo adapta
+        a la entrada del motor (WAV int16 para la API, muestras para el local).
+        
+        Returns:
+            El audio listo para el motor, o el original si no se puede
+            decodificar localmente (p. ej. webm/opus del navegador)
+            None: Si el audio no contiene voz
+        """
+        try:
+            samples = load_for_stt(audio_data, sample_rate, channels)
+        except AudioDecodeError:
+            # Los motores reciben el fichero tal cual: aquí sí hace falta una copia
+            return bytes(audio_data)
+        
+        bounds = VoiceActivityDetector(sample_rate=TARGET_SAMPLE_RATE).speech_bounds(samples)
+        if bounds is None:
+            return None
+        
+        start, end = bounds
+        logger.debug(f"Audio normalizado: {len(samples)} → {end - start} muestras")
+        return self.backend.prepare(samples[start:end])
@@ -0,0 +1,185 @@
+import os
+import hashlib
+import logging
+import threading
+import unicodedata
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+# Directorio del caché en disco; queda fuera de static/ para que no se sirva públicamente
+TTS_CACHE_DIR = os.getenv("TTS_CACHE_DIR", str(Path(__file__).resolve().parent.parent / "cache" / "tts"))
+# Presupuesto del nivel en memoria y del nivel en disco
+TTS_CACHE_MEMORY_BYTES = int(os.getenv("TTS_CACHE_MEMORY_BYTES", 32 * 1024 * 1024))
+TTS_CACHE_DISK_BYTES = int(os.getenv("TTS_CACHE_DISK_BYTES", 512 * 1024 * 1024))
+
+
+def normalize_text(text: str) -> str:
+    """Forma canónica del texto: Unicode NFC y espacios colapsados"""
+    return " ".join(unicodedata.normalize("NFC", text).split())
+
+
+class TTSCache:
+    """
+    Caché de audio sintetizado direccionado por contenido.
+
+    La clave es el SHA-256 del texto normalizado y los parámetros de voz, así
+    que la misma frase con la misma voz siempre reutiliza el mismo audio.
+    Tiene dos niveles:
+
+    - memoria: LRU acotado por bytes, una consulta es una búsqueda en un dict;
+    - disco: un fichero por clave bajo `TTS_CACHE_DIR`, que sobrevive a
+      reinicios; al superar el presupuesto se borran los menos usados (mtime).
+
+    Los métodos son síncronos y seguros entre hilos; las operaciones de disco
+    deben llamarse fuera del event loop.
+    """
+
+    def __init__(
+        self,
+        directory: Optional[str] = TTS_CACHE_DIR,
+        memory_bytes: int = TTS_CACHE_MEMORY_BYTES,
+        disk_bytes: int = TTS_CACHE_DISK_BYTES,
+    ):
+        """
+        :param directory: Directorio del caché en disco (None lo desactiva)
+        :param memory_bytes: Tamaño máximo del nivel en memoria
+        :param disk_bytes: Tamaño máximo del nivel en disco
+        """
+        self.directory = Path(directory) if directory else None
+        self.memory_bytes = memory_bytes
+        self.disk_bytes = disk_bytes
+
+        self._memory: "OrderedDict[str, bytes]" = OrderedDict()
+        self._memory_used = 0
+        self._disk_used: Optional[int] = None  # Se calcula en el primer acceso a disco
+        self._lock = threading.Lock()
+
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def make_key(text: str, voice: Optional[str] = None, rate: Optional[int] = None, volume: Optional[float] = None) -> str:
+        """Clave del audio para un texto y unos parámetros de voz"""
+        volume = None if volume is None else round(float(volume), 3)
+        material = f"{normalize_text(text)}|{voice}|{rate}|{volume}"
+        return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+    def peek(self, key: str) -> Optional[bytes]:
+        """Consulta solo el nivel en memoria; no cuenta los fallos"""
+        with self._lock:
+            audio = self._memory.get(key)
+            if audio is not None:
+                self._memory.move_to_end(key)
+                self.memory_hits += 1
+            return audio
+
+    def get(self, key: str) -> Optional[bytes]:
+        """Busca en memoria y después en disco; un acierto en disco se promociona a memoria"""
+        audio = self.peek(key)
+        if audio is not None:
+            return audio
+
+        path = self._path(key)
+        if path is not None:
+            try:
+                audio = path.read_bytes()
+                os.utime(path)  # Marca de uso para la expulsión LRU en disco
+            except OSError:
+                audio = None
+
+        with self._lock:
+            if audio is None:
+                self.misses += 1
+                return None
+            self.disk_hits += 1
+            self._remember(key, audio)
+        return audio
+
+    def put(self, key: str, audio: bytes) -> None:
+        """Guarda el audio en ambos niveles"""
+        with self._lock:
+            self._remember(key, audio)
+
+        path = self._path(key)
+        if path is None or len(audio) > self.disk_bytes:
+            return
+        try:
+            self.directory.mkdir(parents=True, exist_ok=True)
+            with self._lock:
+                if self._disk_used is None:
+                    self._disk_used = self._scan_disk()
+            existed = path.exists()
+            # Escritura atómica: nunca se lee un fichero a medio escribir
+            tmp = path.with_suffix(f".{threading.get_ident()}.tmp")
+            tmp.write_bytes(audio)
+            os.replace(tmp, path)
+            with self._lock:
+                if not existed:
+                    self._disk_used += len(audio)
+            if self._disk_used > self.disk_bytes:
+                self._evict_disk()
+        except OSError as e:
+            logger.warning(f"No se pudo guardar el audio en el caché de disco: {e}")
+
+    def stats(self) -> Dict[str, Any]:
+        """Contadores de aciertos y ocupación de cada nivel"""
+        with self._lock:
+            hits = self.memory_hits + self.disk_hits
+            total = hits + self.misses
+            return {
+                "memory_hits": self.memory_hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_rate": hits / total if total else 0.0,
+                "memory_entries": len(self._memory),
+                "memory_bytes": self._memory_used,
+                "disk_bytes": self._disk_used or 0,
+            }
+
+    def _remember(self, key: str, audio: bytes) -> None:
+        """Inserta en el LRU de memoria y expulsa lo menos usado (con el lock tomado)"""
+        if len(audio) > self.memory_bytes:
+            return
+        previous = self._memory.pop(key, None)
+        if previous is not None:
+            self._memory_used -= len(previous)
+        self._memory[key] = audio
+        self._memory_used += len(audio)
+        while self._memory_used > self.memory_bytes:
+            _, evicted = self._memory.popitem(last=False)
+            self._memory_used -= len(evicted)
+
+    def _path(self, key: str) -> Optional[Path]:
+        return self.directory / f"{key}.wav" if self.directory else None
+
+    def _scan_disk(self) -> int:
+        return sum(entry.stat().st_size for entry in self.directory.glob("*.wav"))
+
+    def _evict_disk(self) -> None:
+        """Borra los ficheros menos usados hasta volver al 90 % del presupuesto"""
+        entries = []
+        for entry in self.directory.glob("*.wav"):
+            try:
+                stat = entry.stat()
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, entry))
+        entries.sort()
+
+        used = sum(size for _, size, _ in entries)
+        target = int(self.disk_bytes * 0.9)
+        for _, size, entry in entries:
+            if used <= target:
+                break
+            try:
+                entry.unlink()
+                used -= size
+            except OSError:
+                continue
+        with self._lock:
+            self._disk_used = used
+        logger.info(f"Caché TTS en disco recortado a {used} bytes")
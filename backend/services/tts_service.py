@@ -1,35 +1,198 @@
-import pyttsx3
-import json
+import os
 import asyncio
+import logging
+import tempfile
+import multiprocessing
+from concurrent.futures import Executor, ProcessPoolExecutor
+from typing import Any, Dict, List, Optional
+
+from services.tts_cache import TTSCache
+
+logger = logging.getLogger(__name__)
+
+# Procesos de síntesis; cada uno mantiene su propio motor pyttsx3 inicializado
+TTS_WORKERS = int(os.getenv("TTS_WORKERS", min(4, os.cpu_count() or 1)))
+# Idioma preferido para elegir la voz por defecto
+TTS_LANGUAGE = os.getenv("TTS_LANGUAGE", "es")
+
+# Estado de cada proceso trabajador (se inicializa una vez por proceso)
+_engine = None
+_voices: List[Dict[str, Any]] = []
+_output_dir: Optional[str] = None
+# Propiedades del motor tras inicializarlo; se restauran cuando una petición no las indica
+_defaults: Dict[str, Any] = {}
+
+
+def _init_worker(language: str = TTS_LANGUAGE) -> None:
+    """Inicializa el motor y el catálogo de voces del proceso trabajador"""
+    global _engine, _voices, _output_dir, _defaults
+    import pyttsx3
+
+    _engine = pyttsx3.init()
+    _voices = [
+        {
+            "id": voice.id,
+            "name": voice.name,
+            "languages": [str(lang) for lang in (getattr(voice, "languages", None) or [])],
+        }
+        for voice in _engine.getProperty("voices")
+    ]
+    default = _find_voice(_voices, language)
+    if default:
+        _engine.setProperty("voice", default["id"])
+    _defaults = {name: _engine.getProperty(name) for name in ("rate", "volume", "voice")}
+    _output_dir = tempfile.mkdtemp(prefix="tts-")
+
+
+def _find_voice(voices: List[Dict[str, Any]], language: str) -> Optional[Dict[str, Any]]:
+    """Primera voz que coincide con el idioma, o la primera del catálogo"""
+    for voice in voices:
+        haystack = " ".join([voice["id"], voice["name"], *voice["languages"]]).lower()
+        if language in haystack or (language == "es" and "spanish" in haystack):
+            return voice
+    return voices[0] if voices else None
+
+
+def _voice_catalog() -> List[Dict[str, Any]]:
+    return _voices
+
+
+def _synthesize(text: str, rate: Optional[int], volume: Optional[float], voice: Optional[str]) -> bytes:
+    """Sintetiza en el proceso trabajador con un fichero de salida propio por petición"""
+    # El motor conserva las propiedades del trabajo anterior: lo que no se
+    # indica vuelve al valor por defecto, que es lo que supone la clave del caché
+    for name, value in (("rate", rate), ("volume", volume), ("voice", voice)):
+        _engine.setProperty(name, _defaults[name] if value is None else value)
+
+    # pyttsx3 solo sabe escribir en disco: un fichero único por trabajo
+    fd, path = tempfile.mkstemp(suffix=".wav", dir=_output_dir)
+    os.close(fd)
+    try:
+        _engine.save_to_file(text, path)
+        _engine.runAndWait()
+        with open(path, "rb") as f:
+            return f.read()
+    finally:
+        os.remove(path)
+
 
 class TTSservice:
-    def __init__(self):
-        self.engine = pyttsx3.init()
-        
-    async def generate_audio(self, text: str) -> bytes:
+    """
+    Síntesis de voz con un pool de procesos pyttsx3.
+
+    `runAndWait` bloquea y el motor no es seguro entre hilos, así que cada
+    proceso del pool tiene su motor ya inicializado y su catálogo de voces,
+    y el event loop solo espera el resultado. Varias síntesis corren en
+    paralelo en distintos núcleos.
+
+    Las frases repetidas (saludos, mensajes de error, respuestas de reserva)
+    se sirven desde un caché de audio en memoria y disco, y dos peticiones
+    simultáneas de la misma frase comparten una única síntesis.
+    """
+
+    def __init__(
+        self,
+        workers: int = TTS_WORKERS,
+        executor: Optional[Executor] = None,
+        cache: Optional[TTSCache] = None,
+    ):
+        """
+        :param workers: Número de procesos de síntesis
+        :param executor: Executor ya creado (por defecto, un pool de procesos)
+        :param cache: Caché de audio (por defecto, uno bajo TTS_CACHE_DIR)
+        """
+        self.workers = max(1, workers)
+        self._executor = executor
+        self._voices: Optional[List[Dict[str, Any]]] = None
+        self.cache = cache if cache is not None else TTSCache()
+        self._inflight: Dict[str, asyncio.Task] = {}
+
+    @property
+    def executor(self) -> Executor:
+        # El pool se crea al primer uso para no lanzar procesos al importar el módulo
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_worker,
+            )
+        return self._executor
+
+    async def start(self) -> None:
+        """Arranca los procesos y carga los motores antes de la primera petición"""
+        loop = asyncio.get_running_loop()
+        catalogs = await asyncio.gather(
+            *(loop.run_in_executor(self.executor, _voice_catalog) for _ in range(self.workers))
+        )
+        self._voices = catalogs[0]
+        logger.info(f"Pool TTS listo: {self.workers} procesos, {len(self._voices)} voces")
+
+    async def voices(self) -> List[Dict[str, Any]]:
+        """Catálogo de voces disponibles (se consulta una sola vez)"""
+        if self._voices is None:
+            loop = asyncio.get_running_loop()
+            self._voices = await loop.run_in_executor(self.executor, _voice_catalog)
+        return self._voices
+
+    async def generate_audio(
+        self,
+        text: str,
+        rate: Optional[int] = None,
+        volume: Optional[float] = None,
+        voice: Optional[str] = None,
+    ) -> bytes:
         """
         Genera audio a partir de texto usando pyttsx3.
+
+        :param rate: Velocidad en palabras por minuto (opcional)
+        :param volume: Volumen entre 0 y 1 (opcional)
+        :param voice: Identificador de la voz (opcional, por defecto la del idioma configurado)
         """
+        key = self.cache.make_key(text, voice, rate, volume)
+        audio = self.cache.peek(key)
+        if audio is not None:
+            return audio
+
+        # La síntesis es una tarea del servicio, no de quien la pidió primero:
+        # si esa sesión se cancela, las demás que esperan la misma frase siguen
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.create_task(self._produce(key, text, rate, volume, voice))
+            self._inflight[key] = task
+            task.add_done_callback(lambda done: self._release(key, done))
+        return await asyncio.shield(task)
+
+    async def _produce(
+        self,
+        key: str,
+        text: str,
+        rate: Optional[int],
+        volume: Optional[float],
+        voice: Optional[str],
+    ) -> bytes:
+        """Nivel en disco del caché o síntesis en el pool, compartida por todos los que esperan la frase"""
         try:
-            # Crear un archivo temporal para el audio
-            temp_file = "temp_audio.wav"
-            self.engine.save_to_file(text, temp_file)
-            self.engine.runAndWait()
-            
-            # Leer el archivo como bytes
-            with open(temp_file, 'rb') as f:
-                audio_data = f.read()
-            
-            # Eliminar el archivo temporal
-            import os
-            os.remove(temp_file)
-            
-            return audio_data
-            
+            audio = await asyncio.to_thread(self.cache.get, key)
+            if audio is None:
+                loop = asyncio.get_running_loop()
+                audio = await loop.run_in_executor(self.executor, _synthesize, text, rate, volume, voice)
+                await asyncio.to_thread(self.cache.put, key, audio)
+            return audio
         except Exception as e:
-            print(f"Error generando audio: {str(e)}")
+            logger.error(f"Error generando audio: {str(e)}")
             raise
 
+    def _release(self, key: str, task: asyncio.Task) -> None:
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        if not task.cancelled():
+            task.exception()  # Evita el aviso si todos los que esperaban se cancelaron
+
+    def close(self) -> None:
+        """Detiene los procesos de síntesis"""
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
 # Instancia única del servicio TTS
 tts_service = TTSservice()
-
@@ -0,0 +1,212 @@
+import os
+from typing import Optional, Tuple
+
+import numpy as np
+
+# Margen mínimo sobre el ruido de fondo para considerar que hay voz
+VAD_ENERGY_RATIO = float(os.getenv("VAD_ENERGY_RATIO", 3.0))
+# Silencio final necesario para dar por terminada una intervención (streaming)
+VAD_ENDPOINT_MS = int(os.getenv("VAD_ENDPOINT_MS", 700))
+
+# Energía RMS por debajo de la cual nunca hay voz (audio normalizado a [-1, 1])
+ABSOLUTE_FLOOR = 1e-3
+# Ruido de fondo máximo que se asume (unos -46 dBFS); evita que un audio con
+# voz de principio a fin tome la propia voz como ruido
+MAX_NOISE_FLOOR = 5e-3
+
+
+class VoiceActivityDetector:
+    """
+    Detector de actividad de voz basado en energía y cruces por cero.
+
+    Todo el análisis se hace por tramas con operaciones vectorizadas de NumPy.
+    El nivel de ruido de fondo se estima a partir de las tramas más silenciosas
+    del audio y, en modo streaming, se adapta con una media móvil sobre las
+    tramas clasificadas como silencio.
+    """
+
+    def __init__(
+        self,
+        sample_rate: int = 16000,
+        frame_ms: int = 30,
+        energy_ratio: float = VAD_ENERGY_RATIO,
+        max_zcr: float = 0.35,
+        min_speech_ms: int = 120,
+        hangover_ms: int = 240,
+        noise_adaptation: float = 0.05,
+    ):
+        """
+        :param sample_rate: Frecuencia de muestreo del audio
+        :param frame_ms: Duración de cada trama de análisis
+        :param energy_ratio: Factor sobre el ruido de fondo a partir del cual hay voz
+        :param max_zcr: Tasa máxima de cruces por cero para tramas de energía moderada
+        :param min_speech_ms: Ráfagas de voz más cortas se descartan como ruido
+        :param hangover_ms: Tiempo que se mantiene la voz activa tras la última trama con voz
+        :param noise_adaptation: Peso de cada bloque nuevo en la estimación del ruido
+        """
+        self.sample_rate = sample_rate
+        self.frame_size = max(1, sample_rate * frame_ms // 1000)
+        self.frame_ms = frame_ms
+        self.energy_ratio = energy_ratio
+        self.max_zcr = max_zcr
+        self.min_speech_frames = max(1, min_speech_ms // frame_ms)
+        self.hangover_frames = max(0, hangover_ms // frame_ms)
+        self.noise_adaptation = noise_adaptation
+        self.noise_floor: Optional[float] = None
+
+    def frame_features(self, samples: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Calcula la energía RMS y la tasa de cruces por cero de cada trama.
+
+        :param samples: Audio mono en float (rango [-1, 1]) o int16
+        """
+        samples = as_float(samples)
+        n_frames = len(samples) // self.frame_size
+        if n_frames == 0:
+            return np.zeros(0, dtype=np.float32), np.zeros(0, dtype=np.float32)
+
+        frames = samples[:n_frames * self.frame_size].reshape(n_frames, self.frame_size)
+        rms = np.sqrt(np.mean(frames * frames, axis=1))
+        signs = np.signbit(frames)
+        zcr = np.count_nonzero(signs[:, 1:] != signs[:, :-1], axis=1) / self.frame_size
+        return rms, zcr
+
+    def speech_mask(self, samples: np.ndarray, adapt: bool = False, smooth: bool = True) -> np.ndarray:
+        """
+        Devuelve un array booleano con una entrada por trama (True = voz).
+
+        :param adapt: Si es True se usa y actualiza el ruido de fondo acumulado
+                      (modo streaming); si no, se estima solo con este audio
+        :param smooth: Si es False se devuelve la decisión trama a trama, sin
+                       descartar ráfagas cortas ni aplicar hangover
+        """
+        rms, zcr = self.frame_features(samples)
+        if len(rms) == 0:
+            return np.zeros(0, dtype=bool)
+
+        floor = self._estimate_floor(rms, adapt)
+        threshold = max(floor * self.energy_ratio, ABSOLUTE_FLOOR)
+        # Las tramas muy energéticas son voz aunque tengan muchos cruces por cero
+        # (fricativas); con energía moderada, una ZCR alta indica ruido
+        raw = (rms > threshold) & ((zcr < self.max_zcr) | (rms > threshold * 4))
+        mask = self._smooth(raw) if smooth else raw
+
+        if adapt:
+            silence = rms[~mask]
+            if len(silence):
+                level = float(np.median(silence))
+                # El ruido baja de inmediato pero sube despacio, para que la voz
+                # sostenida no acabe considerándose ruido de fondo
+                if level < self.noise_floor:
+                    self.noise_floor = level
+                else:
+                    self.noise_floor += self.noise_adaptation * (level - self.noise_floor)
+                self.noise_floor = min(self.noise_floor, MAX_NOISE_FLOOR)
+        return mask
+
+    def has_speech(self, samples: np.ndarray) -> bool:
+        """Indica si el audio contiene alguna ráfaga de voz"""
+        return bool(self.speech_mask(samples).any())
+
+    def speech_bounds(self, samples: np.ndarray, padding_ms: int = 150) -> Optional[Tuple[int, int]]:
+        """
+        Índices (inicio, fin) del tramo con voz, con un pequeño margen.
+
+        Returns:
+            La tupla de índices de muestra o None si no hay voz.
+        """
+        voiced = np.flatnonzero(self.speech_mask(samples))
+        if len(voiced) == 0:
+            return None
+
+        padding = int(padding_ms * self.sample_rate / 1000)
+        start = max(0, int(voiced[0]) * self.frame_size - padding)
+        end = min(len(samples), (int(voiced[-1]) + 1) * self.frame_size + padding)
+        return start, end
+
+    def trim(self, samples: np.ndarray, padding_ms: int = 150) -> Optional[np.ndarray]:
+        """
+        Recorta el silencio inicial y final.
+
+        Returns:
+            El tramo con voz (más un pequeño margen) o None si no hay voz.
+        """
+        bounds = self.speech_bounds(samples, padding_ms)
+        if bounds is None:
+            return None
+        return samples[bounds[0]:bounds[1]]
+
+    def _estimate_floor(self, rms: np.ndarray, adapt: bool) -> float:
+        # Las tramas más silenciosas del bloque representan el ruido de fondo
+        block_floor = min(max(float(np.percentile(rms, 10)), ABSOLUTE_FLOOR / self.energy_ratio), MAX_NOISE_FLOOR)
+        if not adapt:
+            return block_floor
+        if self.noise_floor is None or block_floor < self.noise_floor:
+            self.noise_floor = block_floor
+        return self.noise_floor
+
+    def _smooth(self, raw: np.ndarray) -> np.ndarray:
+        """Descarta ráfagas cortas y prolonga la voz con un tiempo de hangover"""
+        # Longitud de cada racha de tramas consecutivas con voz
+        padded = np.concatenate(([False], raw, [False]))
+        edges = np.flatnonzero(padded[1:] != padded[:-1])
+        starts, ends = edges[::2], edges[1::2]
+        keep = (ends - starts) >= self.min_speech_frames
+
+        mask = np.zeros(len(raw), dtype=bool)
+        if not keep.any():
+            return mask
+
+        # Cada racha válida se extiende `hangover_frames` tramas hacia delante
+        delta = np.zeros(len(raw) + 1, dtype=np.int32)
+        np.add.at(delta, starts[keep], 1)
+        np.add.at(delta, np.minimum(ends[keep] + self.hangover_frames, len(raw)), -1)
+        return np.cumsum(delta[:-1]) > 0
+
+
+class Endpointer:
+    """
+    Detecta el final de una intervención en audio que llega por fragmentos.
+
+    Se considera terminada cuando, tras al menos `min_speech_ms` de voz, se
+    acumulan `endpoint_ms` de silencio seguido. Las rachas de voz y silencio
+    se cuentan a través de los límites de los fragmentos.
+    """
+
+    def __init__(self, vad: Optional[VoiceActivityDetector] = None, endpoint_ms: int = VAD_ENDPOINT_MS):
+        self.vad = vad or VoiceActivityDetector()
+        self.endpoint_frames = max(1, endpoint_ms // self.vad.frame_ms)
+        self.speech_started = False
+        self.voiced_run = 0
+        self.trailing_silence = 0
+        self._pending = np.zeros(0, dtype=np.float32)
+
+    def process(self, samples: np.ndarray) -> bool:
+        """
+        Analiza un fragmento mono y devuelve True cuando se detecta el final.
+        """
+        samples = np.concatenate((self._pending, as_float(samples)))
+        usable = len(samples) - len(samples) % self.vad.frame_size
+        self._pending = samples[usable:]
+        if usable == 0:
+            return False
+
+        # Hay pocas tramas por fragmento; el análisis pesado ya es vectorizado
+        for voiced in self.vad.speech_mask(samples[:usable], adapt=True, smooth=False):
+            if voiced:
+                self.voiced_run += 1
+                self.trailing_silence = 0
+                if self.voiced_run >= self.vad.min_speech_frames:
+                    self.speech_started = True
+            else:
+                self.voiced_run = 0
+                self.trailing_silence += 1
+
+        return self.speech_started and self.trailing_silence >= self.endpoint_frames
+
+
+def as_float(samples: np.ndarray) -> np.ndarray:
+    """Convierte audio int16 a float32 en [-1, 1]; deja el float tal cual"""
+    if samples.dtype == np.int16:
+        return samples.astype(np.float32) / 32768.0
+    return samples.astype(np.float32, copy=False)
@@ -0,0 +1,393 @@
+import os
+import time
+import asyncio
+import logging
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Dict, Optional, Sequence, Tuple, Union
+
+from services.audio_encoding import OutputFormat, get_audio_encoder, negotiate_format
+from services.audio_frames import split_audio_frames
+from services.speech_segmenter import SentenceSegmenter
+
+logger = logging.getLogger(__name__)
+
+# Tamaño por defecto de cada cola entre etapas (turnos o segmentos pendientes)
+PIPELINE_QUEUE_SIZE = int(os.getenv("PIPELINE_QUEUE_SIZE", 4))
+# Tiempo máximo para generar la respuesta de un turno
+PIPELINE_LLM_TIMEOUT = float(os.getenv("PIPELINE_LLM_TIMEOUT", 30.0))
+
+
+def tts_params(config: Dict[str, Any]) -> Tuple[int, float]:
+    """Velocidad (palabras por minuto) y volumen (0-1) del TTS según la configuración del cliente"""
+    return int(170 * config.get("voiceSpeed", 1.0)), config.get("voiceVolume", 80) / 100
+
+
+def output_format(config: Dict[str, Any]) -> OutputFormat:
+    """Formato del audio de respuesta según la configuración del cliente (`audioCodecs`, `outputSampleRate`)"""
+    return negotiate_format(config.get("audioCodecs"), config.get("outputSampleRate"))
+
+
+class LLMBudget:
+    """Tiempo de espera al LLM que le queda a un turno; solo se consume dentro de `wait`"""
+
+    def __init__(self, seconds: float):
+        self.remaining = seconds
+
+    async def wait(self, awaitable: Awaitable[Any]) -> Any:
+        """
+        Espera al modelo con el tiempo que queda.
+
+        Raises:
+            asyncio.TimeoutError: Si se agota el tiempo del turno
+        """
+        start = time.perf_counter()
+        try:
+            return await asyncio.wait_for(awaitable, max(self.remaining, 0.0))
+        finally:
+            self.remaining -= time.perf_counter() - start
+
+
+@dataclass
+class Turn:
+    """Un turno de conversación que avanza por las etapas del pipeline"""
+    turn_id: int
+    config: Dict[str, Any]
+    audio: Optional[Union[bytes, memoryview]] = None
+    sample_rate: Optional[int] = None  # Solo para PCM sin cabecera
+    channels: int = 1
+    text: Optional[str] = None
+    message_id: Optional[str] = None
+    stream: Optional[Any] = None
+    response: str = ""
+    segments: int = field(default=0)
+
+
+class VoicePipeline:
+    """
+    Pipeline por conexión STT → LLM → TTS.
+
+    Cada etapa corre en su propia tarea asyncio y se comunica con la siguiente
+    mediante colas acotadas, de modo que:
+
+    - el bucle de recepción del WebSocket solo encola trabajo y sigue leyendo
+      (configuración, nuevo audio) mientras se procesa un turno;
+    - el turno N+1 puede transcribirse mientras el turno N se sintetiza;
+    - los turnos salen en el mismo orden en que entraron, porque cada etapa
+      los atiende en orden FIFO;
+    - si una etapa se retrasa, su cola se llena y `submit_audio` espera
+      (backpressure) en lugar de acumular trabajo sin límite.
+    """
+
+    def __init__(
+        self,
+        stt_service,
+        llm_service,
+        tts_service,
+        send_json: Callable[[Dict[str, Any]], Awaitable[None]],
+        send_bytes: Callable[[bytes], Awaitable[None]],
+        queue_size: int = PIPELINE_QUEUE_SIZE,
+        llm_timeout: float = PIPELINE_LLM_TIMEOUT,
+        memory=None,
+        encoder=None,
+    ):
+        """
+        :param memory: `ConversationMemory` de la sesión; sin ella cada turno va sin contexto
+        :param encoder: `AudioEncoder` para el audio de salida (por defecto, el compartido)
+        """
+        self.stt_service = stt_service
+        self.llm_service = llm_service
+        self.tts_service = tts_service
+        self._send_json = send_json
+        self._send_bytes = send_bytes
+        self.llm_timeout = llm_timeout
+        self.memory = memory
+        self.encoder = encoder if encoder is not None else get_audio_encoder()
+
+        self._audio_queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        self._text_queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        self._speech_queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size * 4)
+
+        # Un mensaje JSON de cabecera y su frame binario deben salir juntos
+        self._send_lock = asyncio.Lock()
+        self._tasks = []
+        self._next_turn_id = 0
+
+    def start(self) -> None:
+        """Arranca las tareas de cada etapa"""
+        if self._tasks:
+            return
+        self._tasks = [
+            asyncio.create_task(self._stt_stage(), name="pipeline-stt"),
+            asyncio.create_task(self._llm_stage(), name="pipeline-llm"),
+            asyncio.create_task(self._tts_stage(), name="pipeline-tts"),
+        ]
+
+    async def submit_audio(
+        self,
+        audio: Union[bytes, memoryview],
+        config: Dict[str, Any],
+        message_id: Optional[str] = None,
+        sample_rate: Optional[int] = None,
+        channels: int = 1,
+    ) -> Turn:
+        """
+        Encola un turno de audio. Espera solo si la cola de STT está llena.
+
+        La configuración se copia, así que los cambios posteriores solo afectan
+        a los turnos siguientes. `sample_rate` y `channels` solo hacen falta
+        si el audio es PCM sin cabecera.
+        """
+        turn = Turn(
+            turn_id=self._next_turn_id,
+            config=dict(config),
+            audio=audio,
+            sample_rate=sample_rate,
+            channels=channels,
+            message_id=message_id,
+        )
+        self._next_turn_id += 1
+        await self._audio_queue.put(turn)
+        return turn
+
+    async def submit_stream(self, stream, config: Dict[str, Any], message_id: Optional[str] = None) -> Turn:
+        """
+        Encola un turno cuyo audio llegó por streaming.
+
+        `stream` es un `StreamingTranscriber` ya cerrado; la etapa STT solo
+        espera a que terminen sus ventanas pendientes.
+        """
+        turn = Turn(
+            turn_id=self._next_turn_id,
+            config=dict(config),
+            stream=stream,
+            message_id=message_id,
+        )
+        self._next_turn_id += 1
+        await self._audio_queue.put(turn)
+        return turn
+
+    def queue_depths(self) -> Dict[str, int]:
+        """Profundidad actual de cada cola, útil para detectar la etapa lenta"""
+        return {
+            "stt": self._audio_queue.qsize(),
+            "llm": self._text_queue.qsize(),
+            "tts": self._speech_queue.qsize(),
+        }
+
+    async def close(self, drain: bool = False) -> None:
+        """
+        Detiene el pipeline.
+
+        :param drain: Si es True, termina los turnos pendientes antes de parar
+        """
+        if drain:
+            await self._audio_queue.put(None)
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+        else:
+            for task in self._tasks:
+                task.cancel()
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def send(self, message: Dict[str, Any], frames: Sequence[bytes] = ()) -> None:
+        """
+        Envía un mensaje JSON y, opcionalmente, sus frames binarios asociados.
+
+        Todos los envíos de la conexión deben pasar por aquí para que ningún
+        mensaje se intercale entre una cabecera y su audio.
+        """
+        async with self._send_lock:
+            await self._send_json(message)
+            for frame in frames:
+                await self._send_bytes(frame)
+
+    async def _send_error(self, turn: Turn, error_msg: str) -> None:
+        await self.send({
+            "type": "error",
+            "turn": turn.turn_id,
+            "message": error_msg,
+            "status": "error"
+        })
+
+    async def _stt_stage(self) -> None:
+        """Etapa 1: transcribe el audio de cada turno"""
+        while True:
+            turn = await self._audio_queue.get()
+            if turn is None:
+                await self._text_queue.put(None)
+                return
+
+            try:
+                if turn.stream is not None:
+                    turn.text = await turn.stream.finish()
+                    turn.stream = None
+                elif turn.text is None:
+                    logger.info(f"[turno {turn.turn_id}] Transcribiendo {len(turn.audio or b'')} bytes de audio...")
+                    if turn.sample_rate is None:
+                        turn.text = await self.stt_service.transcribe_audio(turn.audio)
+                    else:
+                        turn.text = await self.stt_service.transcribe_audio(
+                            turn.audio, sample_rate=turn.sample_rate, channels=turn.channels
+                        )
+                    turn.audio = None
+
+                if not turn.text:
+                    await self._send_error(turn, "No se pudo transcribir el audio o el resultado está vacío")
+                    continue
+
+                logger.info(f"[turno {turn.turn_id}] Mensaje transcribido: {turn.text}")
+                await self.send({
+                    "type": "transcription",
+                    "turn": turn.turn_id,
+                    "text": turn.text,
+                    "status": "success"
+                })
+            except Exception as e:
+                logger.error(f"[turno {turn.turn_id}] Error en la transcripción: {e}", exc_info=True)
+                await self._send_error(turn, f"Error al procesar el audio: {str(e)}")
+                continue
+
+            await self._text_queue.put(turn)
+
+    async def _llm_stage(self) -> None:
+        """Etapa 2: genera la respuesta y pasa cada oración completa al TTS"""
+        while True:
+            turn = await self._text_queue.get()
+            if turn is None:
+                await self._speech_queue.put(None)
+                return
+
+            try:
+                await self._generate(turn, LLMBudget(self.llm_timeout))
+            except asyncio.TimeoutError:
+                logger.error(f"[turno {turn.turn_id}] Tiempo de espera agotado al generar la respuesta")
+                await self._send_error(turn, "Tiempo de espera agotado al procesar la solicitud")
+            except Exception as e:
+                logger.error(f"[turno {turn.turn_id}] Error al generar la respuesta: {e}", exc_info=True)
+                await self._send_error(turn, f"Error al generar la respuesta: {str(e)}")
+
+            # Marca de fin de turno para la etapa TTS
+            await self._speech_queue.put((turn, None))
+
+    async def _generate(self, turn: Turn, budget: "LLMBudget") -> None:
+        """
+        Genera la respuesta de un turno.
+
+        En modo streaming (`streamResponse`) reenvía cada fragmento como
+        `response.delta` y cierra con `response.done`, que lleva el texto final
+        ya limpio. Sin streaming envía un único mensaje `response`.
+
+        El tiempo máximo (`budget`) solo cuenta mientras se espera al modelo:
+        la espera en la cola del TTS es backpressure y no debe cortar una
+        respuesta que ya ha llegado.
+        """
+        config = turn.config
+        segmenter = SentenceSegmenter()
+        llm_kwargs = {
+            "system_prompt": config.get("systemPrompt"),
+            "max_tokens": config.get("maxTokens"),
+            "temperature": config.get("temperature"),
+        }
+        if self.memory is not None:
+            # Los turnos se generan en orden, así que el historial ya incluye el anterior
+            llm_kwargs["conversation_history"] = self.memory.messages(config.get("systemPrompt"), turn.text)
+
+        if not config.get("streamResponse", True):
+            result = await budget.wait(self.llm_service.generate_response(turn.text, **llm_kwargs))
+            turn.response = result["response"]
+            succeeded = result.get("success", True)
+            await self.send({
+                "type": "response",
+                "turn": turn.turn_id,
+                "text": turn.response,
+                "status": "success" if succeeded else "error"
+            })
+            for segment in segmenter.feed(turn.response):
+                await self._speech_queue.put((turn, segment))
+        else:
+            parts = []
+            succeeded = True
+            stream = self.llm_service.stream_response(turn.text, **llm_kwargs)
+            try:
+                while True:
+                    try:
+                        delta = await budget.wait(anext(stream))
+                    except StopAsyncIteration:
+                        break
+                    # El stream señala un fallo con un último fragmento marcado (`FailedDelta`)
+                    if getattr(delta, "failed", False):
+                        succeeded = False
+                        if not delta:
+                            continue
+                    parts.append(delta)
+                    await self.send({
+                        "type": "response.delta",
+                        "turn": turn.turn_id,
+                        "delta": delta
+                    })
+                    for segment in segmenter.feed(delta):
+                        await self._speech_queue.put((turn, segment))
+            finally:
+                await stream.aclose()
+
+            turn.response = self.llm_service.clean_response("".join(parts).strip())
+            succeeded = succeeded and bool(parts)
+            await self.send({
+                "type": "response.done",
+                "turn": turn.turn_id,
+                "text": turn.response,
+                "status": "success" if succeeded else "error"
+            })
+
+        tail = segmenter.flush()
+        if tail:
+            await self._speech_queue.put((turn, tail))
+        if self.memory is not None and succeeded:
+            self.memory.add_turn(turn.text, turn.response)
+        logger.info(f"[turno {turn.turn_id}] Respuesta generada: {turn.response}")
+
+    async def _tts_stage(self) -> None:
+        """Etapa 3: sintetiza cada oración en orden y la envía al cliente"""
+        while True:
+            item = await self._speech_queue.get()
+            if item is None:
+                return
+
+            turn, segment = item
+            # Todo el segmento va dentro del try: un fallo al sintetizar,
+            # codificar o enviar se registra y la etapa sigue con el siguiente
+            try:
+                if segment is None:
+                    await self.send({"type": "audio.done", "turn": turn.turn_id, "segments": turn.segments})
+                    logger.info(f"[turno {turn.turn_id}] Audio enviado en {turn.segments} segmentos")
+                    continue
+
+                rate, volume = tts_params(turn.config)
+                start = time.perf_counter()
+                audio_bytes = await self.tts_service.generate_audio(segment, rate=rate, volume=volume)
+                tts_ms = round((time.perf_counter() - start) * 1000, 1)
+
+                # El caché del TTS guarda WAV; se codifica al formato de la sesión al enviarlo
+                start = time.perf_counter()
+                encoded = await self.encoder.encode(audio_bytes, output_format(turn.config))
+                encode_ms = round((time.perf_counter() - start) * 1000, 1)
+
+                # Cabecera JSON pequeña; el audio va en frames binarios con el mismo id
+                audio_id = f"{turn.turn_id}.{turn.segments}"
+                frames = split_audio_frames(
+                    encoded.data, audio_id, encoded.codec, encoded.sample_rate, encoded.channels
+                )
+                await self.send({
+                    "type": "audio.segment",
+                    "turn": turn.turn_id,
+                    "seq": turn.segments,
+                    "text": segment,
+                    "audio_id": audio_id,
+                    "timings": {"tts_ms": tts_ms, "encode_ms": encode_ms},
+                }, frames)
+                turn.segments += 1
+            except Exception as e:
+                logger.error(
+                    f"[turno {turn.turn_id}] Error al generar audio del segmento {turn.segments}: {e}", exc_info=True
+                )
+                continue
@@ -0,0 +1,201 @@
+import os
+import time
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from services.speech_segmenter import SentenceSegmenter
+
+logger = logging.getLogger(__name__)
+
+# Tiempo máximo de cada paso del calentamiento; uno que no termine no bloquea la disponibilidad
+WARMUP_TIMEOUT = float(os.getenv("WARMUP_TIMEOUT", 60.0))
+# Frases de las respuestas predefinidas que se sintetizan al arrancar (0 lo desactiva)
+WARMUP_TTS_PREFILL = int(os.getenv("WARMUP_TTS_PREFILL", 32))
+
+WARMUP_PHRASE = "Hola, ¿en qué puedo ayudarte?"
+
+Step = Callable[[], Awaitable[Any]]
+
+
+class Warmup:
+    """
+    Fase de calentamiento que corre en segundo plano al arrancar.
+
+    Los pasos se ejecutan a la vez, cada uno con su tiempo máximo. Hasta que
+    terminan todos, `ready` es False y el endpoint de disponibilidad responde
+    503, de modo que el balanceador no envía tráfico a un proceso frío. Un paso
+    que falla queda anotado en `status()` pero no impide quedar disponible:
+    el servicio funciona igual, solo que esa primera petición será más lenta.
+    """
+
+    def __init__(self, timeout: float = WARMUP_TIMEOUT):
+        """
+        :param timeout: Tiempo máximo de cada paso en segundos
+        """
+        self.timeout = timeout
+        self.ready = False
+        self._steps: List[Tuple[str, Step]] = []
+        self._results: Dict[str, Dict[str, Any]] = {}
+        self._task: Optional[asyncio.Task] = None
+        self._started: Optional[float] = None
+        self._elapsed: Optional[float] = None
+
+    def add(self, name: str, step: Step) -> "Warmup":
+        """Registra un paso (una corrutina sin argumentos)"""
+        self._steps.append((name, step))
+        self._results[name] = {"status": "pending"}
+        return self
+
+    def start(self) -> asyncio.Task:
+        """Lanza el calentamiento en segundo plano"""
+        if self._task is None:
+            self._task = asyncio.create_task(self.run(), name="warmup")
+        return self._task
+
+    async def run(self) -> None:
+        self._started = time.perf_counter()
+        logger.info(f"Calentamiento iniciado: {', '.join(name for name, _ in self._steps)}")
+        await asyncio.gather(*(self._run_step(name, step) for name, step in self._steps))
+        self._elapsed = time.perf_counter() - self._started
+        self.ready = True
+        failed = [name for name, result in self._results.items() if result["status"] != "ok"]
+        if failed:
+            logger.warning(f"Calentamiento terminado en {self._elapsed:.1f}s con fallos en: {', '.join(failed)}")
+        else:
+            logger.info(f"Calentamiento terminado en {self._elapsed:.1f}s")
+
+    async def wait(self) -> None:
+        """Espera a que termine el calentamiento"""
+        if self._task is not None:
+            await self._task
+
+    async def close(self) -> None:
+        if self._task is not None and not self._task.done():
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+
+    def status(self) -> Dict[str, Any]:
+        elapsed = self._elapsed
+        if elapsed is None and self._started is not None:
+            elapsed = time.perf_counter() - self._started
+        return {
+            "ready": self.ready,
+            "elapsed_s": None if elapsed is None else round(elapsed, 2),
+            "steps": self._results,
+        }
+
+    async def _run_step(self, name: str, step: Step) -> None:
+        self._results[name] = {"status": "running"}
+        start = time.perf_counter()
+        try:
+            detail = await asyncio.wait_for(step(), self.timeout)
+            result: Dict[str, Any] = {"status": "ok"}
+            if isinstance(detail, dict):
+                result.update(detail)
+        except asyncio.TimeoutError:
+            logger.warning(f"Calentamiento de '{name}' sin terminar tras {self.timeout:g}s")
+            result = {"status": "timeout"}
+        except Exception as e:
+            logger.warning(f"Fallo en el calentamiento de '{name}': {e}", exc_info=True)
+            result = {"status": "error", "error": str(e)}
+        result["ms"] = round((time.perf_counter() - start) * 1000, 1)
+        self._results[name] = result
+
+
+def prefill_phrases(responses: List[str], limit: int = WARMUP_TTS_PREFILL) -> List[str]:
+    """
+    Segmentos que el pipeline pedirá al TTS para estas respuestas. Se
+    segmentan igual que en el pipeline para que la clave del caché coincida.
+    """
+    phrases: Dict[str, None] = {}
+    for response in responses:
+        segmenter = SentenceSegmenter()
+        for segment in segmenter.feed(response) + [segmenter.flush()]:
+            if segment:
+                phrases[segment] = None
+        if len(phrases) >= limit:
+            break
+    return list(phrases)[:limit]
+
+
+async def warm_tts(tts_service, phrases: List[str] = ()) -> Dict[str, Any]:
+    """
+    Arranca los procesos TTS (motor y catálogo de voces cargados), hace una
+    síntesis de prueba y deja en el caché de audio las frases indicadas.
+    """
+    from services.voice_pipeline import tts_params
+
+    rate, volume = tts_params({})
+    await tts_service.start()
+    voices = await tts_service.voices()
+    await tts_service.generate_audio(WARMUP_PHRASE, rate=rate, volume=volume)
+    # Las síntesis se reparten entre todos los procesos del pool
+    await asyncio.gather(*(tts_service.generate_audio(phrase, rate=rate, volume=volume) for phrase in phrases))
+    return {"voices": len(voices), "prefilled": len(phrases)}
+
+
+async def warm_stt(stt_service) -> Dict[str, Any]:
+    """
+    Carga el motor STT y transcribe un segundo de silencio para inicializarlo
+    de punta a punta. Con la API de OpenAI no se transcribe (cada llamada se
+    factura); basta con las conexiones que abre `warm_http`.
+    """
+    import numpy as np
+    from services.audio_preprocessing import TARGET_SAMPLE_RATE, resample
+    from services.stt_backends import OpenAIWhisperBackend
+
+    # El remuestreo (scipy.signal) se importa al primer uso; mejor aquí que en el primer turno
+    await asyncio.to_thread(resample, np.zeros(480, dtype=np.float32), 48000)
+    await stt_service.load()
+    if isinstance(stt_service.backend, OpenAIWhisperBackend):
+        return {"backend": stt_service.backend.name}
+    # Directamente al motor: el VAD del servicio descartaría el silencio
+    await stt_service.backend.transcribe(np.zeros(TARGET_SAMPLE_RATE, dtype=np.float32))
+    return {"backend": stt_service.backend.name}
+
+
+async def warm_http() -> Dict[str, Any]:
+    """Abre las conexiones del pool HTTP compartido"""
+    from services.http_clients import get_client_registry
+
+    registry = get_client_registry()
+    return {"connections": await registry.warm_up(), "http2": registry.http2}
+
+
+async def warm_local_llm(client=None) -> Dict[str, Any]:
+    """Arranca el proceso del LLM local (modelo cargado) y comprueba que responde"""
+    from services.local_llm import LocalLLMError, get_local_llm
+
+    client = client or get_local_llm()
+    await client.start()
+    health = await client.health()
+    if health["status"] != "ok":
+        raise LocalLLMError(f"El LLM local no responde: {health.get('error', health['status'])}")
+    return {key: value for key, value in health.items() if key != "status"}
+
+
+def build_warmup(stt_service, tts_service, prefill: int = WARMUP_TTS_PREFILL, timeout: float = WARMUP_TIMEOUT) -> Warmup:
+    """
+    Calentamiento estándar: pool HTTP, STT, TTS y caché de audio de las
+    respuestas predefinidas, más el LLM local si hay un modelo configurado.
+    """
+    from services.local_llm import get_local_llm
+
+    async def tts_step() -> Dict[str, Any]:
+        phrases: List[str] = []
+        if prefill > 0:
+            from services.llm_orchestrator import get_canned_index
+
+            phrases = prefill_phrases(get_canned_index().responses(), prefill)
+        return await warm_tts(tts_service, phrases)
+
+    warmup = (
+        Warmup(timeout)
+        .add("http", warm_http)
+        .add("stt", lambda: warm_stt(stt_service))
+        .add("tts", tts_step)
+    )
+    if get_local_llm().configured:
+        warmup.add("local_llm", warm_local_llm)
+    return warmup
@@ -0,0 +1,61 @@
+import io
+import numpy as np
+import pytest
+import soundfile as sf
+
+from services.audio_encoding import AudioEncoder, OutputFormat, encode_output, negotiate_format
+from services.audio_frames import Codec
+from services.audio_preprocessing import encode_wav, to_int16
+
+
+def _tts_wav(seconds=2.0, rate=22050):
+    """WAV mono de 16 bits como el que genera pyttsx3"""
+    t = np.arange(int(seconds * rate)) / rate
+    voice = 0.3 * np.sin(2 * np.pi * 220 * t) * (1 + np.sin(2 * np.pi * 3 * t)) / 2
+    return encode_wav(to_int16(voice.astype(np.float32), normalize=False), rate)
+
+
+def test_negotiation_picks_first_supported_codec():
+    assert negotiate_format(["mp3", "OGG", "flac"]) == OutputFormat("ogg")
+    assert negotiate_format("flac", 24000) == OutputFormat("flac", 24000)
+    assert negotiate_format(["mp3"]) == OutputFormat("wav")
+    assert negotiate_format(None, 96000).sample_rate == 48000
+    assert negotiate_format().passthrough
+
+
+@pytest.mark.parametrize("codecs, sample_rate", [
+    (5, "abc"),
+    ({"ogg": True}, None),
+    ([None, 3, "mp3"], [16000]),
+    (None, True),
+    ("ogg", -8000),
+])
+def test_negotiation_ignores_invalid_client_values(codecs, sample_rate):
+    output = negotiate_format(codecs, sample_rate)
+    assert output.codec in ("wav", "ogg") and output.sample_rate is None
+
+
+def test_ogg_is_an_order_of_magnitude_smaller():
+    wav = _tts_wav()
+    encoded = encode_output(wav, OutputFormat("ogg", 16000))
+    assert (encoded.codec, encoded.sample_rate) == (Codec.OGG, 16000)
+    assert len(wav) / len(encoded.data) > 10
+
+    samples, rate = sf.read(io.BytesIO(encoded.data))
+    assert rate == 16000 and abs(len(samples) - 32000) < 1000
+
+
+def test_pcm_is_resampled_to_client_rate():
+    encoded = encode_output(_tts_wav(seconds=1.0), OutputFormat("pcm", 8000))
+    assert (encoded.codec, encoded.sample_rate) == (Codec.PCM_S16LE, 8000)
+    assert abs(len(encoded.data) // 2 - 8000) <= 1
+
+
+@pytest.mark.asyncio
+async def test_encoder_falls_back_to_wav_on_error():
+    encoder = AudioEncoder(workers=1)
+    try:
+        encoded = await encoder.encode(b"esto no es audio", OutputFormat("ogg"))
+        assert (encoded.data, encoded.codec) == (b"esto no es audio", Codec.WAV)
+    finally:
+        encoder.close()
@@ -0,0 +1,64 @@
+import json
+import pytest
+
+from services.audio_frames import (
+    AudioFrameError, Codec, encode_audio_frame, is_audio_frame, parse_audio_frame, split_audio_frames
+)
+
+
+def test_v1_round_trip():
+    pcm = bytes(range(256)) * 8
+    data = encode_audio_frame(pcm, "msg-1", Codec.PCM_S16LE, sample_rate=48000, channels=2, sequence=3, final=False)
+
+    frame = parse_audio_frame(data)
+    assert bytes(frame.payload) == pcm
+    assert (frame.message_id, frame.codec, frame.sample_rate, frame.channels) == ("msg-1", Codec.PCM_S16LE, 48000, 2)
+    assert (frame.sequence, frame.final, frame.version) == (3, False, 1)
+    assert frame.raw_pcm
+
+
+def test_payload_is_a_view_over_the_message():
+    """El audio no se copia al separar la cabecera"""
+    data = encode_audio_frame(b"\x01\x02" * 1000, "x")
+    frame = parse_audio_frame(data)
+    assert isinstance(frame.payload, memoryview)
+    assert frame.payload.obj is data
+
+
+def test_rejects_truncated_and_unknown_frames():
+    data = encode_audio_frame(b"audio", "abc")
+    with pytest.raises(AudioFrameError):
+        parse_audio_frame(data[:8])
+    with pytest.raises(AudioFrameError):
+        parse_audio_frame(data[:2] + b"\x09" + data[3:])
+    with pytest.raises(AudioFrameError):
+        parse_audio_frame(encode_audio_frame(b"pcm", codec=Codec.PCM_S16LE))
+
+
+def test_legacy_json_prefix():
+    """Formato antiguo: metadatos JSON seguidos del audio, que puede contener '}'"""
+    audio = b"RIFF}\n}{" + bytes(100)
+    data = json.dumps({"id": "legacy-1", "type": "audio"}).encode() + b"\n" + audio
+
+    frame = parse_audio_frame(data)
+    assert not is_audio_frame(data)
+    assert (frame.message_id, frame.version) == ("legacy-1", 0)
+    assert bytes(frame.payload) == audio
+
+
+def test_legacy_audio_without_metadata():
+    audio = b"RIFF" + b"}" * 10
+    frame = parse_audio_frame(audio)
+    assert frame.message_id is None
+    assert bytes(frame.payload) == audio
+
+
+def test_response_audio_is_split_into_tagged_chunks():
+    audio = bytes(range(256)) * 300
+    frames = [parse_audio_frame(f) for f in split_audio_frames(audio, "resp-1", chunk_size=32 * 1024)]
+
+    assert [(f.message_id, f.sequence, f.final) for f in frames] == [
+        ("resp-1", 0, False), ("resp-1", 1, False), ("resp-1", 2, True)
+    ]
+    assert all(f.codec == Codec.WAV for f in frames)
+    assert b"".join(bytes(f.payload) for f in frames) == audio
@@ -0,0 +1,97 @@
+import io
+import wave
+import struct
+import numpy as np
+import pytest
+
+from services.audio_preprocessing import (
+    AudioDecodeError, TARGET_PEAK, decode_audio, load_for_stt, normalize_for_stt, resample
+)
+
+
+def _float_wav(samples, sample_rate):
+    """WAV IEEE float32 (formato 3), como los que generan algunos navegadores"""
+    channels = samples.shape[1]
+    payload = samples.astype("<f4").tobytes()
+    header = struct.pack(
+        "<4sI4s4sIHHIIHH4sI",
+        b"RIFF", 36 + len(payload), b"WAVE",
+        b"fmt ", 16, 3, channels, sample_rate, sample_rate * channels * 4, channels * 4, 32,
+        b"data", len(payload),
+    )
+    return header + payload
+
+
+def test_normalizes_48k_stereo_float_to_16k_mono_int16():
+    """Un WAV de 48 kHz estéreo en float32 sale como WAV mono de 16 kHz en int16"""
+    t = np.arange(48000) / 48000
+    tone = 0.2 * np.sin(2 * np.pi * 440 * t)
+    data = _float_wav(np.stack([tone, tone], axis=1), 48000)
+
+    out = normalize_for_stt(data)
+    with wave.open(io.BytesIO(out)) as wf:
+        assert (wf.getnchannels(), wf.getsampwidth(), wf.getframerate()) == (1, 2, 16000)
+        pcm = np.frombuffer(wf.readframes(wf.getnframes()), dtype=np.int16)
+    assert abs(len(pcm) - 16000) <= 1
+    # Pico normalizado a ~0.9 de la escala completa
+    assert 0.85 * 32767 < np.abs(pcm).max() <= 0.91 * 32767
+    assert len(data) / len(out) > 11
+
+
+def test_load_for_stt_normalizes_peak_for_local_whisper():
+    """El float32 que recibe el Whisper local ya sale con el pico normalizado"""
+    t = np.arange(16000) / 16000
+    quiet = 0.05 * np.sin(2 * np.pi * 440 * t)
+    data = _float_wav(quiet.reshape(-1, 1), 16000)
+
+    samples = load_for_stt(data)
+    assert samples.dtype == np.float32
+    assert np.abs(samples).max() == pytest.approx(TARGET_PEAK, rel=1e-3)
+    raw = load_for_stt(data, normalize=False)
+    assert np.abs(raw).max() == pytest.approx(0.05, rel=1e-3)
+    # El silencio no se amplifica
+    assert not load_for_stt(_float_wav(np.zeros((1600, 1)), 16000)).any()
+
+
+def test_decodes_24bit_pcm_and_tolerates_streaming_sizes():
+    """PCM de 24 bits con tamaño de data a 0 (WAV en streaming)"""
+    values = np.array([0, 8388607, -8388608, -1], dtype=np.int32)
+    payload = b"".join(int(v & 0xFFFFFF).to_bytes(3, "little") for v in values)
+    header = struct.pack(
+        "<4sI4s4sIHHIIHH4sI",
+        b"RIFF", 0, b"WAVE", b"fmt ", 16, 1, 1, 8000, 24000, 3, 24, b"data", 0,
+    )
+    samples, rate = decode_audio(header + payload)
+    assert rate == 8000
+    np.testing.assert_allclose(samples[:, 0], values / 8388608.0, atol=1e-6)
+
+
+def test_raw_pcm_requires_sample_rate():
+    """El PCM sin cabecera solo se acepta si se indica la frecuencia de muestreo"""
+    pcm = np.array([0, 16384, -16384], dtype="<i2").tobytes()
+    samples, rate = decode_audio(pcm, sample_rate=16000)
+    assert rate == 16000
+    np.testing.assert_allclose(samples[:, 0], [0.0, 0.5, -0.5])
+    with pytest.raises(AudioDecodeError):
+        decode_audio(b"\x1aE\xdf\xa3 webm sin decodificar")
+
+
+def test_resample_keeps_tone_frequency():
+    """El remuestreo conserva la frecuencia del tono"""
+    t = np.arange(44100) / 44100
+    out = resample(np.sin(2 * np.pi * 300 * t).astype(np.float32), 44100, 16000)
+    assert len(out) == 16000
+    spectrum = np.abs(np.fft.rfft(out))
+    assert abs(np.argmax(spectrum) - 300) <= 1
+
+
+def test_import_defers_scipy_and_soundfile():
+    """scipy.signal y soundfile solo se cargan al remuestrear o decodificar"""
+    import subprocess
+    import sys
+    from pathlib import Path
+
+    code = "import sys, services.audio_preprocessing; print('scipy.signal' in sys.modules, 'soundfile' in sys.modules)"
+    result = subprocess.run([sys.executable, "-c", code], cwd=Path(__file__).resolve().parent.parent,
+                            capture_output=True, text=True, check=True)
+    assert result.stdout.strip() == "False False"
@@ -0,0 +1,88 @@
+import io
+import wave
+import asyncio
+import pytest
+
+import json
+
+from services.audio_frames import Codec, encode_audio_frame
+from services.audio_stream import AudioRingBuffer, StreamingTranscriber, is_stream_chunk, merge_transcripts
+
+
+def test_ring_buffer_wraps_around():
+    """Las lecturas usan posiciones absolutas aunque el buffer haya dado la vuelta"""
+    ring = AudioRingBuffer(8)
+    ring.write(b"abcdef")
+    ring.write(b"ghij")
+    assert ring.total_written == 10
+    assert ring.read(4, 10) == b"efghij"
+    with pytest.raises(ValueError):
+        ring.read(0, 4)
+
+
+class FakeSTT:
+    def __init__(self):
+        self.calls = 0
+
+    async def transcribe_audio(self, wav):
+        self.calls += 1
+        call = self.calls
+        with wave.open(io.BytesIO(wav)) as wf:
+            frames = wf.getnframes()
+        # La primera ventana tarda más para comprobar que el orden se respeta
+        await asyncio.sleep(0.02 if call == 1 else 0)
+        return f"v{call}:{frames}"
+
+
+@pytest.mark.asyncio
+async def test_windows_are_transcribed_while_streaming():
+    """Las ventanas completas se transcriben antes de audio.end y el texto final respeta el orden"""
+    stt = FakeSTT()
+    partials = []
+
+    async def on_partial(text):
+        partials.append(text)
+
+    stream = StreamingTranscriber(stt, sample_rate=100, window_seconds=1.0, on_partial=on_partial,
+                                  overlap_seconds=0.0)
+    for _ in range(25):
+        stream.write(b"\x00\x00" * 10)
+    assert stt.calls == 0
+    await asyncio.sleep(0)
+    assert stt.calls == 2
+
+    text = await stream.finish()
+    assert text == "v1:100 v2:100 v3:50"
+    assert partials[-1].startswith("v1:100 v2:100")
+
+
+@pytest.mark.asyncio
+async def test_windows_overlap_the_previous_one():
+    """Cada ventana repite el final de la anterior; la primera no tiene nada que repetir"""
+    stt = FakeSTT()
+    stream = StreamingTranscriber(stt, sample_rate=100, window_seconds=1.0, overlap_seconds=0.25)
+    for _ in range(25):
+        stream.write(b"\x00\x00" * 10)
+    assert await stream.finish() == "v1:100 v2:125 v3:75"
+
+
+@pytest.mark.parametrize("previous, new, merged", [
+    ("quería saber cómo", "cómo funciona la", "quería saber cómo funciona la"),
+    ("explícame la fotosín", "la fotosíntesis en", "explícame la fotosíntesis en"),
+    ("hola qué tal", "tal estás", "hola qué tal estás"),
+    ("vamos a casa", "a cenar", "vamos a casa a cenar"),
+    ("buenos días", "¿qué tiempo hace?", "buenos días ¿qué tiempo hace?"),
+    ("", "hola", "hola"),
+])
+def test_merge_transcripts_drops_repeated_words(previous, new, merged):
+    assert merge_transcripts(previous, new) == merged
+
+
+def test_trailing_chunks_after_endpoint_belong_to_the_stream():
+    pcm = b"\x01\x00" * 160
+    assert is_stream_chunk(pcm, "msg-1")
+    assert is_stream_chunk(encode_audio_frame(pcm, "msg-1", Codec.PCM_S16LE, sample_rate=16000), "msg-1")
+    # Un audio nuevo, con su propio id o como WAV completo, no se descarta
+    assert not is_stream_chunk(encode_audio_frame(b"RIFF", "msg-2"), "msg-1")
+    assert not is_stream_chunk(json.dumps({"id": "msg-2"}).encode() + b"\n" + pcm, "msg-1")
+    assert not is_stream_chunk(b"RIFF\x00\x00\x00\x00WAVEfmt " + pcm, "msg-1")
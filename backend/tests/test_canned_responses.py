@@ -0,0 +1,47 @@
+import pytest
+
+from services.canned_responses import CannedResponseIndex, bounded_levenshtein, normalize
+
+
+@pytest.fixture(scope="module")
+def index():
+    return CannedResponseIndex.from_file()
+
+
+def test_normalize_strips_accents_punctuation_and_fillers():
+    assert normalize("¿Qué  hora es?") == "que hora es"
+    assert normalize("Eh... ¡Muchísimas GRACIAS!") == "muchisimas gracias"
+    # Una frase hecha solo de muletillas no se queda vacía
+    assert normalize("¡Vale!") == "vale"
+
+
+def test_bounded_levenshtein():
+    assert bounded_levenshtein("gracias", "gracias", 2) == 0
+    assert bounded_levenshtein("grasias", "gracias", 2) == 1
+    assert bounded_levenshtein("hola", "adios", 2) is None
+    assert bounded_levenshtein("a" * 10, "a" * 20, 3) is None
+
+
+def test_exact_and_fuzzy_matches(index):
+    exact = index.match("¿Qué hora es?")
+    assert exact.intent == "hora" and exact.confidence == 1.0
+    assert exact.response.startswith("Son las ")
+
+    # Errores típicos de transcripción
+    fuzzy = index.match("muchas grasias")
+    assert fuzzy.intent == "gracias" and 0.85 <= fuzzy.confidence < 1.0
+    assert index.match("buenos dia").intent == "buenos_dias"
+
+
+def test_real_questions_are_not_matched(index):
+    assert index.match("¿Cuál es la capital de Francia?") is None
+    assert index.match("hora") is None
+    assert index.match("") is None
+
+
+def test_lookup_ignores_unrelated_growth():
+    index = CannedResponseIndex()
+    index.add("gracias", ["muchas gracias"], "De nada")
+    for i in range(5000):
+        index.add("ruido", [f"frase de relleno numero {i}"], "-")
+    assert index.match("muchas grasias").intent == "gracias"
@@ -0,0 +1,159 @@
+import asyncio
+import pytest
+
+from services import conversation_memory
+from services.conversation_memory import ConversationMemory, MemoryMessage, count_tokens, llm_summarizer
+from services.voice_pipeline import VoicePipeline
+
+
+def _fill(memory, turns, prefix="pregunta"):
+    for i in range(turns):
+        memory.add_turn(f"{prefix} {i}", f"respuesta {i}")
+
+
+def test_token_count_is_cached_per_message(monkeypatch):
+    """Cada mensaje se tokeniza una sola vez, al añadirse"""
+    calls = []
+    original = conversation_memory.count_tokens
+    monkeypatch.setattr(conversation_memory, "count_tokens", lambda text: calls.append(text) or original(text))
+
+    memory = ConversationMemory(window_turns=4)
+    _fill(memory, 3)
+    assert len(calls) == 6
+    for _ in range(5):
+        memory.messages()
+    # Solo se tokeniza el mensaje actual de cada llamada
+    assert len(calls) == 6 + 5
+
+
+def test_only_recent_window_is_sent():
+    memory = ConversationMemory(window_turns=2)
+    _fill(memory, 5)
+    history = memory.messages(prompt="nueva")
+    assert [m["content"] for m in history] == ["pregunta 3", "respuesta 3", "pregunta 4", "respuesta 4"]
+    assert memory.stats()["buffered_messages"] == 4
+
+
+def test_history_respects_token_budget():
+    """Con un presupuesto pequeño se envían solo los turnos completos más recientes que caben"""
+    memory = ConversationMemory(window_turns=10)
+    memory.add_turn("x" * 300, "y" * 300)
+    memory.add_turn("hola", "buenas")
+    turn = MemoryMessage.create("user", "hola").tokens + MemoryMessage.create("assistant", "buenas").tokens
+    prompt_cost = count_tokens("¿qué tal?") + conversation_memory.MESSAGE_OVERHEAD_TOKENS
+    memory.max_tokens = prompt_cost + turn + 10
+
+    history = memory.messages(prompt="¿qué tal?")
+    assert history == [{"role": "user", "content": "hola"}, {"role": "assistant", "content": "buenas"}]
+
+    memory.max_tokens = prompt_cost
+    assert memory.messages(prompt="¿qué tal?") == []
+
+
+@pytest.mark.asyncio
+async def test_older_turns_are_folded_into_summary():
+    seen = []
+
+    async def summarizer(summary, messages):
+        seen.append((summary, [m["content"] for m in messages]))
+        return f"resumen de {len(messages) // 2} turnos"
+
+    memory = ConversationMemory(summarizer=summarizer, window_turns=2)
+    _fill(memory, 3)
+    await memory.wait_for_summary()
+
+    assert seen == [(None, ["pregunta 0", "respuesta 0"])]
+    history = memory.messages()
+    assert history[0]["role"] == "system"
+    assert history[0]["content"].endswith("resumen de 1 turnos")
+    assert [m["content"] for m in history[1:]] == ["pregunta 1", "respuesta 1", "pregunta 2", "respuesta 2"]
+
+    memory.add_turn("pregunta 3", "respuesta 3")
+    await memory.wait_for_summary()
+    # El resumen anterior se pasa para que el nuevo lo incorpore
+    assert seen[-1] == ("resumen de 1 turnos", ["pregunta 1", "respuesta 1"])
+    assert memory.stats()["summarized_turns"] == 2
+
+
+@pytest.mark.asyncio
+async def test_turns_are_not_blocked_by_summarization():
+    """Mientras se resume, los turnos nuevos se siguen añadiendo y la ventana se mantiene"""
+    release = asyncio.Event()
+
+    async def slow_summarizer(summary, messages):
+        await release.wait()
+        return "resumen"
+
+    memory = ConversationMemory(summarizer=slow_summarizer, window_turns=1)
+    _fill(memory, 2)
+    memory.add_turn("pregunta 2", "respuesta 2")
+    assert [m["content"] for m in memory.messages()] == ["pregunta 2", "respuesta 2"]
+
+    release.set()
+    await memory.wait_for_summary()
+    assert memory.stats()["buffered_messages"] == 2
+    assert memory.stats()["summarized_turns"] == 2
+    await memory.close()
+
+
+@pytest.mark.asyncio
+async def test_failed_summary_drops_old_turns():
+    async def failing(summary, messages):
+        raise RuntimeError("sin conexión")
+
+    memory = ConversationMemory(summarizer=failing, window_turns=1)
+    _fill(memory, 3)
+    await memory.wait_for_summary()
+    assert memory.summary is None
+    assert memory.stats()["buffered_messages"] == 2
+
+
+@pytest.mark.asyncio
+async def test_llm_summarizer_uses_generate_response():
+    class FakeLLM:
+        async def generate_response(self, prompt, **kwargs):
+            self.prompt, self.kwargs = prompt, kwargs
+            return {"success": True, "response": "Hablaron del tiempo."}
+
+    llm = FakeLLM()
+    text = await llm_summarizer(llm, max_tokens=50)("Saludo.", [{"role": "user", "content": "¿Llueve?"}])
+    assert text == "Hablaron del tiempo."
+    assert "Saludo." in llm.prompt and "Usuario: ¿Llueve?" in llm.prompt
+    assert llm.kwargs["max_tokens"] == 50
+
+
+@pytest.mark.asyncio
+async def test_pipeline_sends_and_records_history():
+    class RecordingLLM:
+        def __init__(self):
+            self.histories = []
+
+        async def stream_response(self, prompt, conversation_history=None, **kwargs):
+            self.histories.append(conversation_history)
+            yield f"Eco {prompt}."
+
+        def clean_response(self, text):
+            return text
+
+    class FakeSTT:
+        async def transcribe_audio(self, audio):
+            return audio.decode()
+
+    class FakeTTS:
+        async def generate_audio(self, text, rate=None, volume=None):
+            return b""
+
+    async def send(_):
+        pass
+
+    llm = RecordingLLM()
+    memory = ConversationMemory()
+    pipeline = VoicePipeline(FakeSTT(), llm, FakeTTS(), send_json=send, send_bytes=send, memory=memory)
+    pipeline.start()
+    await pipeline.submit_audio(b"hola", {})
+    await pipeline.submit_audio(b"adios", {})
+    await pipeline.close(drain=True)
+
+    assert llm.histories[0] == []
+    assert llm.histories[1] == [{"role": "user", "content": "hola"}, {"role": "assistant", "content": "Eco hola."}]
+    assert memory.turns == 2
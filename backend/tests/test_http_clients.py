@@ -0,0 +1,66 @@
+import os
+import httpx
+import pytest
+
+os.environ.setdefault("OPENAI_API_KEY", "test-key")
+
+from services import http_clients
+from services.http_clients import ClientRegistry
+
+
+def _registry(handler, **kwargs):
+    registry = ClientRegistry(api_key="test-key", base_url="https://api.test/v1", http2=False, **kwargs)
+    # Se sustituye el transporte para no salir a la red
+    registry._http = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    return registry
+
+
+@pytest.mark.asyncio
+async def test_openai_client_shares_the_pool():
+    registry = _registry(lambda request: httpx.Response(200))
+    assert registry.openai is registry.openai
+    assert registry.openai._client is registry.http
+    await registry.aclose()
+    assert registry.is_closed
+
+
+@pytest.mark.asyncio
+async def test_warm_up_probes_the_api():
+    requests = []
+
+    def handler(request):
+        requests.append(request)
+        return httpx.Response(401)
+
+    registry = _registry(handler)
+    assert await registry.warm_up(connections=2) == 2
+    assert [str(r.url) for r in requests] == ["https://api.test/v1/models"] * 2
+    assert requests[0].headers["Authorization"] == "Bearer test-key"
+    await registry.aclose()
+
+
+@pytest.mark.asyncio
+async def test_warm_up_failure_is_not_fatal():
+    def handler(request):
+        raise httpx.ConnectError("sin red", request=request)
+
+    registry = _registry(handler)
+    assert await registry.warm_up(connections=1) == 0
+    await registry.aclose()
+
+
+@pytest.mark.asyncio
+async def test_services_use_the_process_registry(monkeypatch):
+    from services.llm_service import OpenAIService
+    from services.stt_backends import OpenAIWhisperBackend
+
+    monkeypatch.setattr(http_clients, "_registry", None)
+    registry = await http_clients.open_client_registry(warm_up=False, http2=False)
+    try:
+        assert OpenAIService().client is registry.openai
+        assert OpenAIWhisperBackend().client is registry.openai
+        assert http_clients.get_http_client() is registry.http
+    finally:
+        await http_clients.close_http_client()
+    # Tras cerrar, el siguiente uso crea un registro nuevo
+    assert http_clients.get_client_registry() is not registry
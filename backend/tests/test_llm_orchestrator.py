@@ -0,0 +1,188 @@
+import asyncio
+import pytest
+from unittest.mock import AsyncMock, MagicMock
+
+from services import llm_orchestrator
+from services.local_llm import get_local_llm
+from services.backend_stats import BackendStats, HedgeBudget
+from services.llm_orchestrator import LLMOrchestrator, LLMType
+
+SHORT = "cuéntame algo"
+LONG = "explícame con detalle cómo funciona la fotosíntesis en las plantas"
+
+
+@pytest.fixture
+def orchestrator(monkeypatch):
+    monkeypatch.setattr(llm_orchestrator, "_BACKEND_STATS", None)
+    monkeypatch.setattr(llm_orchestrator, "_HEDGE_BUDGET", None)
+    # Modelo local configurado (las estrategias se sustituyen en cada test)
+    monkeypatch.setattr(get_local_llm(), "model_path", "echo")
+    orch = LLMOrchestrator(latency_budget_ms=100, recovery_seconds=60)
+    monkeypatch.setattr(orch, "_publish", AsyncMock())
+    return orch
+
+
+@pytest.mark.asyncio
+async def test_canned_index_is_matched_once_per_query(orchestrator, monkeypatch):
+    expected = orchestrator.canned_responses.match("gracias").response
+    match = MagicMock(wraps=orchestrator.canned_responses.match)
+    monkeypatch.setattr(orchestrator.canned_responses, "match", match)
+    cloud = AsyncMock(return_value="nube")
+    monkeypatch.setitem(orchestrator.strategies, LLMType.CLOUD, cloud)
+
+    assert await orchestrator.route_query("gracias") == expected
+    assert match.call_count == 1
+    assert not cloud.called
+
+
+def test_backend_stats_percentiles_and_ewma():
+    stats = BackendStats("x", window=100, alpha=0.5)
+    for latency in range(1, 101):
+        stats.record(float(latency))
+    assert stats.p95_ms == 95.0
+    assert stats.percentile(50) == 51.0
+    assert 98 < stats.ewma_ms <= 100
+    stats.record(0.0, ok=False)
+    assert stats.errors == 1 and stats.error_rate == 0.5
+
+
+def test_heuristic_routing_when_all_healthy(orchestrator):
+    assert orchestrator._select_llm("gracias") == LLMType.FALLBACK
+    assert orchestrator._select_llm(SHORT) == LLMType.FAST_LOCAL
+    assert orchestrator._select_llm(LONG) == LLMType.CLOUD
+
+
+def test_slow_cloud_shifts_traffic_to_local(orchestrator):
+    for _ in range(20):
+        orchestrator.stats[LLMType.CLOUD].record(800.0)
+    assert orchestrator._select_llm(LONG) == LLMType.FAST_LOCAL
+
+    stats = orchestrator.get_stats()["backends"]
+    assert stats["CLOUD"]["healthy"] is False and stats["CLOUD"]["p95_ms"] == 800.0
+    assert stats["FAST_LOCAL"]["healthy"] is True
+
+    # Sin tráfico durante el periodo de recuperación se vuelve a probar
+    orchestrator.recovery_seconds = 0
+    assert orchestrator._select_llm(LONG) == LLMType.CLOUD
+
+
+def test_unconfigured_local_llm_is_never_selected(orchestrator, monkeypatch):
+    monkeypatch.setattr(get_local_llm(), "model_path", "")
+    assert orchestrator._select_llm(SHORT) == LLMType.CLOUD
+    for _ in range(20):
+        orchestrator.stats[LLMType.CLOUD].record(800.0)
+    assert orchestrator._select_llm(LONG) == LLMType.CLOUD
+    assert orchestrator.stats[LLMType.FAST_LOCAL].requests == 0
+
+
+def test_errors_make_a_backend_unhealthy(orchestrator):
+    for _ in range(5):
+        orchestrator.stats[LLMType.FAST_LOCAL].record(5.0, ok=False)
+    assert orchestrator._select_llm(SHORT) == LLMType.CLOUD
+
+
+@pytest.mark.asyncio
+async def test_route_query_tracks_latency_and_falls_back(orchestrator, monkeypatch):
+    async def slow_cloud(text):
+        await asyncio.sleep(0.01)
+        raise RuntimeError("timeout")
+
+    monkeypatch.setitem(orchestrator.strategies, LLMType.CLOUD, slow_cloud)
+    monkeypatch.setitem(orchestrator.strategies, LLMType.FAST_LOCAL, AsyncMock(return_value="local"))
+
+    assert await orchestrator.route_query(LONG) == "local"
+    cloud = orchestrator.stats[LLMType.CLOUD]
+    local = orchestrator.stats[LLMType.FAST_LOCAL]
+    assert (cloud.requests, cloud.errors, cloud.in_flight) == (1, 1, 0)
+    assert (local.requests, local.errors) == (1, 0) and local.ewma_ms is not None
+    orchestrator._publish.assert_awaited_once_with("local")
+
+
+def _backend(delay, answer, calls=None):
+    async def run(text):
+        try:
+            await asyncio.sleep(delay)
+        except asyncio.CancelledError:
+            if calls is not None:
+                calls.append(f"{answer} cancelado")
+            raise
+        return answer
+    return run
+
+
+@pytest.mark.asyncio
+async def test_slow_primary_is_hedged_and_loser_cancelled(orchestrator, monkeypatch):
+    calls = []
+    monkeypatch.setitem(orchestrator.strategies, LLMType.CLOUD, _backend(1.0, "nube", calls))
+    monkeypatch.setitem(orchestrator.strategies, LLMType.FAST_LOCAL, _backend(0.0, "local", calls))
+    monkeypatch.setattr(orchestrator, "hedge_budget", HedgeBudget(max_rate=1.0))
+    orchestrator.hedge_min_delay_ms = 10
+    for _ in range(20):
+        orchestrator.stats[LLMType.CLOUD].record(20.0)
+
+    assert await asyncio.wait_for(orchestrator.route_query(LONG, hedge=True), 0.5) == "local"
+    assert calls == ["nube cancelado"]
+    cloud = orchestrator.stats[LLMType.CLOUD]
+    assert cloud.in_flight == 0 and cloud.cancelled == 1 and cloud.errors == 0
+    assert orchestrator.get_stats()["hedging"]["wins"] == 1
+
+
+@pytest.mark.asyncio
+async def test_fast_primary_is_not_hedged(orchestrator, monkeypatch):
+    local = AsyncMock(return_value="local")
+    monkeypatch.setitem(orchestrator.strategies, LLMType.CLOUD, _backend(0.0, "nube"))
+    monkeypatch.setitem(orchestrator.strategies, LLMType.FAST_LOCAL, local)
+    assert await orchestrator.route_query(LONG, hedge=True) == "nube"
+    local.assert_not_awaited()
+    assert orchestrator.get_stats()["hedging"]["hedged"] == 0
+
+
+@pytest.mark.asyncio
+async def test_no_hedge_onto_unavailable_or_unhealthy_backend(orchestrator, monkeypatch):
+    local = AsyncMock(return_value="local")
+    monkeypatch.setitem(orchestrator.strategies, LLMType.CLOUD, _backend(0.05, "nube"))
+    monkeypatch.setitem(orchestrator.strategies, LLMType.FAST_LOCAL, local)
+    monkeypatch.setattr(orchestrator, "_hedge_delay", lambda llm_type: 0.001)
+
+    # Alternativo degradado
+    for _ in range(5):
+        orchestrator.stats[LLMType.FAST_LOCAL].record(5.0, ok=False)
+    assert await orchestrator.route_query(LONG, hedge=True) == "nube"
+
+    # Alternativo sin modelo configurado
+    monkeypatch.setattr(get_local_llm(), "model_path", "")
+    monkeypatch.setitem(orchestrator.stats, LLMType.FAST_LOCAL, BackendStats("FAST_LOCAL"))
+    assert await orchestrator.route_query(LONG, hedge=True) == "nube"
+    local.assert_not_awaited()
+    assert orchestrator.get_stats()["hedging"]["hedged"] == 0
+
+
+@pytest.mark.asyncio
+async def test_hedge_rate_is_capped(orchestrator, monkeypatch):
+    monkeypatch.setattr(orchestrator, "hedge_budget", HedgeBudget(max_rate=0.25, burst=1))
+    monkeypatch.setattr(orchestrator, "_hedge_delay", lambda llm_type: 0.001)
+    monkeypatch.setitem(orchestrator.strategies, LLMType.CLOUD, _backend(0.03, "nube"))
+    monkeypatch.setitem(orchestrator.strategies, LLMType.FAST_LOCAL, _backend(0.0, "local"))
+
+    answers = [await orchestrator.route_query(LONG, hedge=True) for _ in range(10)]
+    # Con un primario siempre lento, solo se duplica una de cada cuatro consultas
+    assert [i for i, answer in enumerate(answers) if answer == "local"] == [3, 7]
+    assert orchestrator.hedge_budget.denied == 8
+
+
+def test_hedge_budget_accrues_per_request():
+    budget = HedgeBudget(max_rate=0.5, burst=1)
+    assert not budget.try_acquire()
+    budget.on_request()
+    budget.on_request()
+    assert budget.try_acquire() and not budget.try_acquire()
+
+
+def test_hedge_budget_does_not_burst_on_cold_start():
+    """Con el cubo recién creado no se duplican de golpe las primeras consultas"""
+    budget = HedgeBudget(max_rate=0.1)
+    granted = []
+    for _ in range(20):
+        budget.on_request()
+        granted.append(budget.try_acquire())
+    assert granted.count(True) == 2 and granted.index(True) == 9
@@ -0,0 +1,110 @@
+import os
+import asyncio
+import pytest
+from types import SimpleNamespace
+from unittest.mock import AsyncMock
+
+os.environ.setdefault("OPENAI_API_KEY", "test-key")
+
+from services.llm_service import OpenAIService
+
+
+def _chunk(content):
+    return SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=content))])
+
+
+class _FakeStream:
+    def __init__(self, chunks):
+        self._chunks = chunks
+
+    def __aiter__(self):
+        return self._gen()
+
+    async def _gen(self):
+        for chunk in self._chunks:
+            yield chunk
+
+
+@pytest.mark.asyncio
+async def test_stream_response_yields_deltas():
+    """Los fragmentos se emiten en orden y sin limpiar"""
+    service = OpenAIService()
+    service.client.chat.completions.create = AsyncMock(
+        return_value=_FakeStream([_chunk("hola"), _chunk(None), _chunk(" mundo")])
+    )
+    deltas = [d async for d in service.stream_response("hola")]
+    assert deltas == ["hola", " mundo"]
+    assert service.clean_response("".join(deltas)) == "Hola mundo."
+    assert service.client.chat.completions.create.call_args.kwargs["stream"] is True
+
+
+@pytest.mark.asyncio
+async def test_stream_response_error_yields_fallback():
+    """Un error antes del primer fragmento produce el mensaje de disculpa"""
+    service = OpenAIService()
+    service.client.chat.completions.create = AsyncMock(side_effect=RuntimeError("boom"))
+    deltas = [d async for d in service.stream_response("hola")]
+    assert len(deltas) == 1
+    assert deltas[0].startswith("Lo siento") and deltas[0].failed
+
+
+def _completion(text):
+    return SimpleNamespace(
+        choices=[SimpleNamespace(message=SimpleNamespace(content=text))],
+        usage=SimpleNamespace(prompt_tokens=10, completion_tokens=5, total_tokens=15),
+    )
+
+
+@pytest.mark.asyncio
+async def test_low_temperature_responses_are_cached():
+    """Una pregunta repetida no vuelve a llamar al modelo y se marca como cacheada"""
+    service = OpenAIService()
+    service.client.chat.completions.create = AsyncMock(return_value=_completion("son las tres"))
+
+    first = await service.generate_response("¿Qué hora es?", temperature=0.0)
+    second = await service.generate_response("  ¿qué  hora es? ", temperature=0.0)
+    assert first["usage"]["cached"] is False
+    assert second["usage"]["cached"] is True and second["usage"]["total_tokens"] == 0
+    assert second["response"] == first["response"] == "Son las tres."
+    assert service.client.chat.completions.create.await_count == 1
+
+    # Cualquier parámetro distinto es otra petición
+    await service.generate_response("¿Qué hora es?", temperature=0.0, max_tokens=50)
+    await service.generate_response("¿Qué hora es?", system_prompt="Otro", temperature=0.0)
+    assert service.client.chat.completions.create.await_count == 3
+
+
+@pytest.mark.asyncio
+async def test_high_temperature_and_errors_are_not_cached():
+    service = OpenAIService()
+    service.client.chat.completions.create = AsyncMock(return_value=_completion("hola"))
+    await service.generate_response("hola", temperature=0.9)
+    await service.generate_response("hola", temperature=0.9)
+    assert service.client.chat.completions.create.await_count == 2
+
+    service.client.chat.completions.create = AsyncMock(side_effect=RuntimeError("boom"))
+    assert (await service.generate_response("adiós", temperature=0.0))["success"] is False
+    assert len(service.cache) == 0
+
+
+@pytest.mark.asyncio
+async def test_cache_entries_expire_after_ttl():
+    service = OpenAIService()
+    service.cache.ttl = 0.01
+    service.client.chat.completions.create = AsyncMock(return_value=_completion("hola"))
+    await service.generate_response("hola", temperature=0.0)
+    await asyncio.sleep(0.02)
+    assert (await service.generate_response("hola", temperature=0.0))["usage"]["cached"] is False
+    assert service.client.chat.completions.create.await_count == 2
+
+
+@pytest.mark.asyncio
+async def test_stream_response_shares_the_cache():
+    service = OpenAIService()
+    service.client.chat.completions.create = AsyncMock(
+        return_value=_FakeStream([_chunk("buenos"), _chunk(" días")])
+    )
+    assert [d async for d in service.stream_response("hola", temperature=0.0)] == ["buenos", " días"]
+    assert [d async for d in service.stream_response("hola", temperature=0.0)] == ["Buenos días."]
+    assert (await service.generate_response("hola", temperature=0.0))["response"] == "Buenos días."
+    assert service.client.chat.completions.create.await_count == 1
@@ -0,0 +1,80 @@
+import asyncio
+import pytest
+import pytest_asyncio
+
+from services.local_llm import LocalLLMBusy, LocalLLMClient, LocalLLMError
+
+
+@pytest_asyncio.fixture
+async def client():
+    client = LocalLLMClient(model_path="echo", start_timeout=30)
+    yield client
+    await client.close()
+
+
+@pytest.mark.asyncio
+async def test_streams_tokens_from_resident_process(client):
+    tokens = [t async for t in client.generate_stream("hola mundo")]
+    assert tokens == ["Has", " dicho:", " hola", " mundo"]
+    pid = client._process.pid
+
+    # El proceso sigue vivo entre peticiones
+    assert await client.generate("otra vez") == "Has dicho: otra vez"
+    assert client._process.pid == pid
+
+
+@pytest.mark.asyncio
+async def test_concurrent_requests_are_queued_and_routed(client):
+    prompts = [f"frase {i}" for i in range(5)]
+    answers = await asyncio.gather(*(client.generate(p) for p in prompts))
+    assert answers == [f"Has dicho: {p}" for p in prompts]
+
+
+@pytest.mark.asyncio
+async def test_health_check(client):
+    assert (await client.health())["status"] == "stopped"
+    await client.start()
+    health = await client.health()
+    assert health["status"] == "ok" and health["model"] == "echo"
+
+
+@pytest.mark.asyncio
+async def test_full_queue_is_rejected(client):
+    client.max_queue = 0
+    with pytest.raises(LocalLLMBusy):
+        await client.generate("hola")
+
+
+@pytest.mark.asyncio
+async def test_crashed_process_is_restarted(client):
+    await client.start()
+    client._process.kill()
+    await client._process.wait()
+    assert await client.generate("sigo aquí") == "Has dicho: sigo aquí"
+
+
+@pytest.mark.asyncio
+async def test_unconfigured_client_fails_fast():
+    client = LocalLLMClient(model_path="")
+    assert (await client.health())["status"] == "disabled"
+    with pytest.raises(LocalLLMError):
+        await client.generate("hola")
+
+
+@pytest.mark.asyncio
+async def test_abandoned_stream_is_cancelled(client):
+    stream = client.generate_stream("una frase bastante larga para cortar")
+    assert await stream.__anext__() == "Has"
+    await stream.aclose()
+    assert client._pending == {}
+    assert await client.generate("después") == "Has dicho: después"
+
+
+@pytest.mark.asyncio
+async def test_late_cancels_are_not_kept_by_the_worker(client):
+    """Cancelar una petición ya terminada (o desconocida) no deja rastro en el proceso"""
+    assert await client.generate("hola") == "Has dicho: hola"
+    for request_id in (*range(1, 5), 999):
+        await client._write({"id": request_id, "type": "cancel"})
+    health = await client.health()
+    assert health["status"] == "ok" and health["cancelling"] == 0
@@ -0,0 +1,73 @@
+import json
+import pytest
+
+from app.models.websocket import (
+    AuthMessage, ConfigModel, MessageType, PingMessage, ResponseMessage, TextMessage
+)
+from app.services.message_codec import MSGPACK, MessageDecodeError, get_codec
+from services.audio_frames import encode_audio_frame
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+
+def test_decode_picks_model_by_type():
+    codec = get_codec()
+    assert codec.decode('{"type": "auth", "token": "abc"}') == AuthMessage(token="abc")
+    assert codec.decode(b'{"type": "text", "text": "hola"}') == TextMessage(text="hola")
+    assert isinstance(codec.decode('{"type": "ping", "timestamp": 1.5}'), PingMessage)
+
+
+@pytest.mark.parametrize("raw", ['{"type": "AUTH", "token": "abc"}', '{"type": "Auth", "token": "abc"}'])
+def test_type_is_case_insensitive(raw):
+    assert get_codec().decode(raw) == AuthMessage(token="abc")
+    assert get_codec().decode(raw.encode()) == AuthMessage(token="abc")
+    assert AuthMessage(type="AUTH", token="abc").type == MessageType.AUTH
+
+
+@pytest.mark.parametrize("raw, error", [
+    ("{", "Formato JSON inválido"),
+    ('{"type": "pong", "timestamp": 1}', "Tipo de mensaje no soportado: pong"),
+    ('{"type": "PONG", "timestamp": 1}', "Tipo de mensaje no soportado: pong"),
+    ('{"text": "hola"}', "Mensaje sin campo 'type'"),
+    ('{"type": "text"}', "Mensaje inválido: text"),
+])
+def test_decode_errors_are_reported_to_the_client(raw, error):
+    with pytest.raises(MessageDecodeError, match=error):
+        get_codec().decode(raw)
+
+
+def test_encode_omits_empty_fields():
+    encoded = get_codec().encode(ResponseMessage(text="Hola", audio_id="a1"))
+    assert json.loads(encoded) == {"type": "response", "text": "Hola", "audio_id": "a1"}
+
+
+def test_config_update_returns_only_changes():
+    config = ConfigModel()
+    assert config.update({"temperature": 0.7, "max_tokens": 300, "desconocido": 1}) == {"max_tokens": 300}
+    assert config.max_tokens == 300
+
+
+@pytest.mark.skipif(msgpack is None, reason="msgpack no está instalado")
+def test_msgpack_round_trip():
+    codec = get_codec(MSGPACK)
+    assert codec.binary
+    assert msgpack.unpackb(codec.encode(ResponseMessage(text="Hola"))) == {"type": "response", "text": "Hola"}
+    frame = msgpack.packb({"type": "ping", "timestamp": 2.0})
+    assert codec.is_control_frame(frame) and codec.decode(frame).type == MessageType.PING
+    # En modo msgpack el audio tiene que llevar la cabecera VA; lo demás es control
+    assert not codec.is_control_frame(encode_audio_frame(b"\x80\x81audio", "a1"))
+    assert codec.is_control_frame(b"\x81\x00audio sin cabecera")
+
+
+def test_json_mode_sends_every_binary_frame_to_audio():
+    codec = get_codec()
+    assert not codec.is_control_frame(b"\x81\xa4type") and not codec.is_control_frame(b"RIFF")
+
+
+@pytest.mark.skipif(msgpack is not None, reason="msgpack está instalado")
+def test_msgpack_falls_back_to_json_when_missing():
+    codec = get_codec(MSGPACK)
+    assert (codec.encoding, codec.binary) == ("json", False)
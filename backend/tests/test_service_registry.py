@@ -0,0 +1,129 @@
+import json
+import pytest
+from types import SimpleNamespace
+
+from app.models.websocket import ResponseMessage
+from app.services.registry import ServiceRegistry, get_service_registry
+
+
+class FakeWebSocket:
+    def __init__(self, fail=False):
+        self.accepted = False
+        self.sent = []
+        self.fail = fail
+
+    async def accept(self):
+        self.accepted = True
+
+    async def send_text(self, data):
+        if self.fail:
+            raise RuntimeError("conexión cerrada")
+        self.sent.append(json.loads(data))
+
+
+class FakeSTT:
+    backend = SimpleNamespace(name="fake")
+
+    def __init__(self):
+        self.closed = False
+
+    async def close(self):
+        self.closed = True
+
+
+class FakeTTS:
+    def __init__(self):
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+
+def _registry():
+    return ServiceRegistry(FakeSTT(), object(), FakeTTS())
+
+
+@pytest.mark.asyncio
+async def test_connections_share_one_table():
+    registry = _registry()
+    first, second = FakeWebSocket(), FakeWebSocket()
+    await registry.connections.connect(first, "a")
+    await registry.connections.connect(second, "b")
+    registry.connections.set_user("a", "admin")
+
+    stats = registry.stats()
+    assert stats["connections"] == 2
+    assert {s["id"]: s["user"] for s in stats["sessions"]} == {"a": "admin", "b": None}
+    assert {s["encoding"] for s in stats["sessions"]} == {"json"}
+
+    registry.connections.disconnect("a")
+    assert [s["id"] for s in registry.connections.sessions()] == ["b"]
+
+
+@pytest.mark.asyncio
+async def test_broadcast_drops_broken_connections():
+    registry = _registry()
+    healthy, broken = FakeWebSocket(), FakeWebSocket(fail=True)
+    await registry.connections.connect(healthy, "a")
+    await registry.connections.connect(broken, "b")
+
+    delivered = await registry.connections.broadcast(ResponseMessage(text="Mantenimiento en 5 minutos"))
+    assert delivered == 1
+    assert healthy.sent == [{"type": "response", "text": "Mantenimiento en 5 minutos"}]
+    assert len(registry.connections) == 1
+
+
+@pytest.mark.asyncio
+async def test_close_releases_services():
+    registry = _registry()
+    await registry.close()
+    assert registry.stt.closed and registry.tts.closed
+
+
+def test_dependency_returns_app_registry():
+    registry = _registry()
+    websocket = SimpleNamespace(app=SimpleNamespace(state=SimpleNamespace(services=registry)))
+    assert get_service_registry(websocket) is registry
+
+
+def test_response_message_has_no_inline_audio():
+    """El frame de control solo anuncia el audio; los bytes van en frames binarios"""
+    message = ResponseMessage(text="Hola", audio_id="abc", timings={"llm_ms": 120.5})
+    assert message.model_dump(mode="json", exclude_none=True) == {
+        "type": "response", "text": "Hola", "audio_id": "abc", "timings": {"llm_ms": 120.5}
+    }
+
+
+def _settings(**overrides):
+    """Subconjunto de `Settings` que usa `ServiceRegistry.create`"""
+    values = dict(
+        CACHE_TTL=300, LLM_CACHE_SIZE=512, LLM_CACHE_MAX_TEMPERATURE=0.3,
+        WHISPER_MODEL="whisper-1", WHISPER_DEVICE="cpu",
+        TTS_CACHE_DIR=None, TTS_CACHE_MEMORY_BYTES=1024, TTS_CACHE_DISK_BYTES=4096,
+    )
+    values.update(overrides)
+    return SimpleNamespace(**values)
+
+
+def test_create_builds_llm_cache_from_settings(monkeypatch):
+    monkeypatch.setenv("OPENAI_API_KEY", "test-key")
+    registry = ServiceRegistry.create(_settings(CACHE_TTL=42, LLM_CACHE_SIZE=7, LLM_CACHE_MAX_TEMPERATURE=0.1))
+    assert (registry.llm.cache.ttl, registry.llm.cache.maxsize) == (42, 7)
+    assert registry.llm.cache_max_temperature == 0.1
+
+
+def test_create_picks_stt_backend_from_settings(monkeypatch):
+    monkeypatch.setenv("OPENAI_API_KEY", "test-key")
+    stt = ServiceRegistry.create(_settings(WHISPER_MODEL="tiny", WHISPER_DEVICE="cuda")).stt
+    assert (stt.model, stt.backend.name, stt.backend.model_name, stt.backend.device) == (
+        "tiny", "local-batch", "tiny", "cuda"
+    )
+
+
+def test_create_keeps_tts_cache_outside_static(monkeypatch, tmp_path):
+    """El caché de TTS usa settings.TTS_CACHE_DIR, no el directorio servido en /static"""
+    monkeypatch.setenv("OPENAI_API_KEY", "test-key")
+    cache = ServiceRegistry.create(_settings(TTS_CACHE_DIR=tmp_path / "tts")).tts.cache
+    assert (cache.directory, cache.memory_bytes, cache.disk_bytes) == (tmp_path / "tts", 1024, 4096)
+    cache.put("clave", b"RIFF audio")
+    assert (tmp_path / "tts" / "clave.wav").exists()
@@ -0,0 +1,34 @@
+from services.speech_segmenter import SentenceSegmenter
+
+
+def _segment(deltas, **kwargs):
+    segmenter = SentenceSegmenter(**kwargs)
+    segments = []
+    for delta in deltas:
+        segments.extend(segmenter.feed(delta))
+    tail = segmenter.flush()
+    if tail:
+        segments.append(tail)
+    return segments
+
+
+def test_splits_sentences_as_they_complete():
+    """Cada oración se emite en cuanto llega el espacio que la cierra"""
+    segmenter = SentenceSegmenter()
+    assert segmenter.feed("¡Hola! Claro que puedo ayudarte") == []
+    assert segmenter.feed(". Dime ") == ["¡Hola! Claro que puedo ayudarte."]
+    assert segmenter.flush() == "Dime"
+
+
+def test_does_not_split_decimals_or_abbreviations():
+    """Los números decimales y las abreviaturas no cortan la oración"""
+    text = "El Sr. García pagó 3.5 euros por el café. Luego se fue."
+    assert _segment([text]) == ["El Sr. García pagó 3.5 euros por el café.", "Luego se fue."]
+
+
+def test_splits_long_sentences_on_clauses():
+    """Las oraciones largas se cortan en comas para empezar a hablar antes"""
+    text = "Primero tienes que abrir la aplicación de configuración del teléfono, luego buscar la sección de red"
+    segments = _segment([word + " " for word in text.split(" ")], max_clause_chars=60)
+    assert segments[0].endswith("teléfono,")
+    assert len(segments) == 2
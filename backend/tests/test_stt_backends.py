@@ -0,0 +1,194 @@
+import io
+import os
+import sys
+import wave
+import asyncio
+import threading
+import numpy as np
+import pytest
+from types import SimpleNamespace
+from unittest.mock import MagicMock, patch
+
+os.environ.setdefault("OPENAI_API_KEY", "test-key")
+
+from services.stt_backends import (
+    BatchingWhisperBackend, LocalWhisperBackend, OpenAIWhisperBackend, create_stt_backend
+)
+from services.stt_service import STTService
+
+
+def _speech_wav(seconds=1.0, sample_rate=16000):
+    t = np.arange(int(seconds * sample_rate)) / sample_rate
+    pcm = (0.3 * np.sin(2 * np.pi * 200 * t) * 32767).astype(np.int16)
+    buffer = io.BytesIO()
+    with wave.open(buffer, "wb") as wf:
+        wf.setnchannels(1)
+        wf.setsampwidth(2)
+        wf.setframerate(sample_rate)
+        wf.writeframes(pcm.tobytes())
+    return buffer.getvalue()
+
+
+@pytest.fixture
+def fake_whisper():
+    """Módulo `whisper` simulado que registra el hilo de cada inferencia"""
+    threads = []
+
+    def transcribe(audio, **kwargs):
+        threads.append(threading.current_thread().name)
+        assert audio.dtype == np.float32
+        return {"text": " hola desde local "}
+
+    model = MagicMock()
+    model.transcribe.side_effect = transcribe
+    module = MagicMock()
+    module.load_model.return_value = model
+    with patch.dict(sys.modules, {"whisper": module}):
+        yield module, threads
+
+
+def test_backend_selection_by_model_name():
+    assert isinstance(create_stt_backend("whisper-1"), OpenAIWhisperBackend)
+    assert isinstance(create_stt_backend("base"), BatchingWhisperBackend)
+
+
+@pytest.mark.asyncio
+async def test_local_model_is_loaded_once_and_runs_off_loop(fake_whisper):
+    """El modelo se carga una vez al arrancar y la inferencia va en su propio hilo"""
+    module, threads = fake_whisper
+    service = STTService(model="tiny", backend=LocalWhisperBackend("tiny"))
+    await service.load()
+    module.load_model.assert_called_once_with("tiny", device="cpu")
+
+    wav = _speech_wav()
+    results = await asyncio.gather(*(service.transcribe_audio(wav) for _ in range(3)))
+    assert results == ["hola desde local"] * 3
+    module.load_model.assert_called_once()
+    assert threads and all(name.startswith("whisper") for name in threads)
+    await service.close()
+
+
+@pytest.mark.asyncio
+async def test_local_backend_loads_lazily_without_preload(fake_whisper):
+    module, _ = fake_whisper
+    backend = LocalWhisperBackend("base")
+    assert await backend.transcribe(np.zeros(16000, dtype=np.float32)) == " hola desde local "
+    module.load_model.assert_called_once()
+    await backend.close()
+
+
+def _decoded(text, avg_logprob=-0.2, compression_ratio=1.2, no_speech_prob=0.01):
+    return SimpleNamespace(
+        text=text, avg_logprob=avg_logprob, compression_ratio=compression_ratio, no_speech_prob=no_speech_prob
+    )
+
+
+@pytest.fixture
+def fake_batched_whisper():
+    """`whisper` y `torch` simulados; cada clip lleva su índice como amplitud"""
+    batches = []
+
+    def decode(mels, options):
+        batches.append(len(mels))
+        return [_decoded(f"clip {int(round(mel[0, 0]))}") for mel in mels]
+
+    model = MagicMock()
+    model.dims.n_mels = 80
+    model.decode.side_effect = decode
+    whisper = MagicMock()
+    whisper.load_model.return_value = model
+    whisper.pad_or_trim.side_effect = lambda clip: np.pad(clip, (0, 100 - len(clip)))
+    whisper.log_mel_spectrogram.side_effect = lambda clip, n_mels: np.full((n_mels, 4), clip[0])
+    torch = MagicMock()
+    torch.stack.side_effect = lambda mels: MagicMock(to=lambda device: np.stack(mels))
+    with patch.dict(sys.modules, {"whisper": whisper, "torch": torch}):
+        yield batches
+
+
+@pytest.mark.asyncio
+async def test_concurrent_clips_are_decoded_in_batches(fake_batched_whisper):
+    """Los clips de varias sesiones se agrupan y cada resultado vuelve a su petición"""
+    backend = BatchingWhisperBackend("tiny", max_batch_size=4, max_wait_ms=50)
+    await backend.load()
+
+    clips = [np.full(10, float(i), dtype=np.float32) for i in range(6)]
+    results = await asyncio.gather(*(backend.transcribe(clip) for clip in clips))
+    assert results == [f"clip {i}" for i in range(6)]
+    assert fake_batched_whisper == [4, 2]
+    await backend.close()
+
+
+@pytest.mark.asyncio
+async def test_single_clip_waits_at_most_the_batch_window(fake_batched_whisper):
+    backend = BatchingWhisperBackend("tiny", max_batch_size=8, max_wait_ms=5)
+    result = await asyncio.wait_for(backend.transcribe(np.full(10, 3.0, dtype=np.float32)), 1.0)
+    assert result == "clip 3"
+    assert fake_batched_whisper == [1]
+    await backend.close()
+
+
+# Resultado de decodificar cada clip (identificado por su amplitud) a cada temperatura
+_DECODINGS = {
+    0: lambda t: _decoded("hola"),
+    1: lambda t: _decoded("sí sí sí sí sí", compression_ratio=3.1) if t < 0.2 else _decoded("sí, claro"),
+    2: lambda t: _decoded("gracias", avg_logprob=-1.4, no_speech_prob=0.9),
+    3: lambda t: _decoded(f"dudoso {t:g}", avg_logprob=-1.5),
+}
+
+
+def _whisper_transcribe(model, audio, temperature, compression_ratio_threshold, logprob_threshold,
+                        no_speech_threshold, **kwargs):
+    """Lo que hace whisper.transcribe con un clip de una sola ventana de 30 s"""
+    for t in temperature:
+        result = model.decode_one(int(audio[0]), t)
+        needs_fallback = (
+            result.compression_ratio > compression_ratio_threshold or result.avg_logprob < logprob_threshold
+        )
+        if result.no_speech_prob > no_speech_threshold:
+            needs_fallback = False
+        if not needs_fallback:
+            break
+    silent = result.no_speech_prob > no_speech_threshold and not result.avg_logprob > logprob_threshold
+    return {"text": "" if silent else result.text}
+
+
+@pytest.fixture
+def fake_whisper_with_fallback():
+    """Modelo simulado con `decode` por lotes y `transcribe` con los umbrales de whisper"""
+    batches = []
+
+    def decode(mels, options):
+        batches.append((options.temperature, len(mels)))
+        return [model.decode_one(int(round(mel[0, 0])), options.temperature) for mel in mels]
+
+    model = MagicMock()
+    model.dims.n_mels = 80
+    model.decode_one = lambda clip, t: _DECODINGS[clip](t)
+    model.decode.side_effect = decode
+    model.transcribe.side_effect = lambda audio, **kwargs: _whisper_transcribe(model, audio, **kwargs)
+    whisper = MagicMock()
+    whisper.load_model.return_value = model
+    whisper.DecodingOptions.side_effect = lambda **kwargs: SimpleNamespace(**kwargs)
+    whisper.pad_or_trim.side_effect = lambda clip: np.pad(clip, (0, 100 - len(clip)))
+    whisper.log_mel_spectrogram.side_effect = lambda clip, n_mels: np.full((n_mels, 4), clip[0])
+    torch = MagicMock()
+    torch.stack.side_effect = lambda mels: MagicMock(to=lambda device: np.stack(mels))
+    with patch.dict(sys.modules, {"whisper": whisper, "torch": torch}):
+        yield batches
+
+
+@pytest.mark.asyncio
+async def test_batched_decoding_matches_local_transcribe(fake_whisper_with_fallback):
+    """Temperatura de respaldo, umbrales y descarte de silencio iguales con y sin lotes"""
+    clips = [np.full(10, float(i), dtype=np.float32) for i in _DECODINGS]
+    local = LocalWhisperBackend("tiny")
+    expected = [await local.transcribe(clip) for clip in clips]
+    await local.close()
+
+    backend = BatchingWhisperBackend("tiny", max_batch_size=4, max_wait_ms=50)
+    results = await asyncio.gather(*(backend.transcribe(clip) for clip in clips))
+    await backend.close()
+
+    assert results == expected == ["hola", "sí, claro", "", "dudoso 1"]
+    # Solo se repiten los clips que lo necesitan, juntos en un lote por temperatura
+    assert fake_whisper_with_fallback == [(0.0, 4), (0.2, 2), (0.4, 1), (0.6, 1), (0.8, 1), (1.0, 1)]
@@ -0,0 +1,74 @@
+import io
+import os
+import wave
+import asyncio
+import numpy as np
+import pytest
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, MagicMock
+
+os.environ.setdefault("OPENAI_API_KEY", "test-key")
+
+from services.stt_service import STTService
+
+
+def _speech_wav(seconds=1.0, sample_rate=16000):
+    t = np.arange(int(seconds * sample_rate)) / sample_rate
+    pcm = (0.3 * np.sin(2 * np.pi * 200 * t) * 32767).astype(np.int16)
+    buffer = io.BytesIO()
+    with wave.open(buffer, "wb") as wf:
+        wf.setnchannels(1)
+        wf.setsampwidth(2)
+        wf.setframerate(sample_rate)
+        wf.writeframes(pcm.tobytes())
+    return buffer.getvalue()
+
+
+@pytest.mark.asyncio
+async def test_uploads_from_memory_with_timeout():
+    """El audio se sube desde memoria, sin fichero temporal, con el timeout configurado"""
+    client = MagicMock()
+    client.audio.transcriptions.create = AsyncMock(return_value=SimpleNamespace(text=" hola mundo "))
+    service = STTService(client=client, timeout=3.0)
+
+    assert await service.transcribe_audio(_speech_wav()) == "hola mundo"
+    kwargs = client.audio.transcriptions.create.call_args.kwargs
+    filename, payload = kwargs["file"]
+    assert filename == "audio.wav" and payload.startswith(b"RIFF")
+    assert kwargs["timeout"] == 3.0
+
+
+@pytest.mark.asyncio
+async def test_concurrency_is_capped():
+    """Nunca hay más transcripciones en vuelo que el límite configurado"""
+    in_flight = 0
+    peak = 0
+
+    async def slow_create(**kwargs):
+        nonlocal in_flight, peak
+        in_flight += 1
+        peak = max(peak, in_flight)
+        await asyncio.sleep(0.01)
+        in_flight -= 1
+        return SimpleNamespace(text="hola")
+
+    client = MagicMock()
+    client.audio.transcriptions.create = slow_create
+    service = STTService(client=client, max_concurrency=2)
+
+    wav = _speech_wav()
+    results = await asyncio.gather(*(service.transcribe_audio(wav) for _ in range(6)))
+    assert results == ["hola"] * 6
+    assert peak == 2
+
+
+@pytest.mark.asyncio
+async def test_undecodable_audio_keeps_its_format():
+    """El audio que no se decodifica localmente se sube tal cual con su extensión"""
+    client = MagicMock()
+    client.audio.transcriptions.create = AsyncMock(return_value=SimpleNamespace(text="hola"))
+    service = STTService(client=client)
+
+    webm = b"\x1aE\xdf\xa3" + b"\x00" * 200
+    assert await service.transcribe_audio(webm) == "hola"
+    assert client.audio.transcriptions.create.call_args.kwargs["file"] == ("audio.webm", webm)
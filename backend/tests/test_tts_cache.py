@@ -0,0 +1,46 @@
+import os
+import time
+
+from services.tts_cache import TTSCache
+
+
+def test_key_ignores_whitespace_but_not_voice_settings():
+    key = TTSCache.make_key("Hola,  ¿qué tal? ", "es", 170, 0.8)
+    assert key == TTSCache.make_key("Hola, ¿qué tal?", "es", 170, 0.8)
+    assert key != TTSCache.make_key("Hola, ¿qué tal?", "es", 200, 0.8)
+    assert key != TTSCache.make_key("Hola, ¿qué tal?", "en", 170, 0.8)
+
+
+def test_memory_tier_is_lru_bounded_by_bytes(tmp_path):
+    cache = TTSCache(None, memory_bytes=250)
+    for name in "abc":
+        cache.put(name, name.encode() * 100)
+    # "a" se expulsa al entrar "c"
+    assert cache.peek("a") is None
+    assert cache.peek("b") == b"b" * 100
+    assert cache.stats()["memory_bytes"] == 200
+
+
+def test_disk_tier_survives_restart_and_promotes(tmp_path):
+    TTSCache(tmp_path).put("clave", b"RIFF audio")
+
+    cache = TTSCache(tmp_path)
+    assert cache.peek("clave") is None
+    assert cache.get("clave") == b"RIFF audio"
+    assert cache.peek("clave") == b"RIFF audio"
+    stats = cache.stats()
+    assert (stats["disk_hits"], stats["memory_hits"], stats["misses"]) == (1, 1, 0)
+    assert cache.get("otra") is None and cache.stats()["misses"] == 1
+
+
+def test_disk_budget_evicts_least_recently_used(tmp_path):
+    cache = TTSCache(tmp_path, memory_bytes=0, disk_bytes=250)
+    cache.put("vieja", b"x" * 100)
+    old = time.time() - 60
+    os.utime(tmp_path / "vieja.wav", (old, old))
+    cache.put("media", b"y" * 100)
+    cache.put("nueva", b"z" * 100)
+
+    assert not (tmp_path / "vieja.wav").exists()
+    assert cache.get("nueva") == b"z" * 100
+    assert cache.stats()["disk_bytes"] <= 250
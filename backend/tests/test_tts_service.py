@@ -0,0 +1,137 @@
+import sys
+import asyncio
+import pytest
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+from unittest.mock import MagicMock, patch
+
+from services import tts_service as tts_module
+from services.tts_cache import TTSCache
+from services.tts_service import TTSservice
+
+
+class FakeEngine:
+    """Motor pyttsx3 simulado: escribe el texto pendiente en su fichero al ejecutar"""
+
+    def __init__(self):
+        self.properties = {"rate": 200, "volume": 1.0, "voice": "english"}
+        self.pending = []
+
+    def getProperty(self, name):
+        if name != "voices":
+            return self.properties[name]
+        return [
+            SimpleNamespace(id="english", name="English", languages=["en"]),
+            SimpleNamespace(id="spanish", name="Spanish", languages=["es"]),
+        ]
+
+    def setProperty(self, name, value):
+        self.properties[name] = value
+
+    def save_to_file(self, text, path):
+        self.pending.append((text, path))
+
+    def runAndWait(self):
+        for text, path in self.pending:
+            with open(path, "wb") as f:
+                f.write(f"RIFF{text}|{self.properties.get('rate')}".encode())
+        self.pending = []
+
+
+@pytest.fixture
+def fake_pyttsx3():
+    module = MagicMock()
+    module.init.side_effect = FakeEngine
+    with patch.dict(sys.modules, {"pyttsx3": module}):
+        yield module
+
+
+@pytest.mark.asyncio
+async def test_engine_is_initialized_once_per_worker(fake_pyttsx3, tmp_path):
+    executor = ThreadPoolExecutor(max_workers=1, initializer=tts_module._init_worker)
+    service = TTSservice(workers=1, executor=executor, cache=TTSCache(tmp_path))
+    await service.start()
+
+    texts = [f"frase {i}" for i in range(5)]
+    results = await asyncio.gather(*(service.generate_audio(text, rate=150) for text in texts))
+
+    # Cada petición recibe su propio audio aunque se lancen a la vez
+    assert results == [f"RIFF{text}|150".encode() for text in texts]
+    fake_pyttsx3.init.assert_called_once()
+    assert tts_module._engine.properties["voice"] == "spanish"
+    service.close()
+
+
+@pytest.mark.asyncio
+async def test_unset_parameters_restore_engine_defaults(fake_pyttsx3, tmp_path):
+    """Lo que no se indica no hereda los valores de la síntesis anterior"""
+    executor = ThreadPoolExecutor(max_workers=1, initializer=tts_module._init_worker)
+    service = TTSservice(workers=1, executor=executor, cache=TTSCache(tmp_path))
+
+    assert await service.generate_audio("uno", rate=120, volume=0.3, voice="english") == b"RIFFuno|120"
+    assert await service.generate_audio("dos") == b"RIFFdos|200"
+    assert tts_module._engine.properties == {"rate": 200, "volume": 1.0, "voice": "spanish"}
+    service.close()
+
+
+@pytest.mark.asyncio
+async def test_voice_catalog_is_cached(fake_pyttsx3, tmp_path):
+    executor = ThreadPoolExecutor(max_workers=1, initializer=tts_module._init_worker)
+    service = TTSservice(workers=1, executor=executor, cache=TTSCache(tmp_path))
+
+    voices = await service.voices()
+    assert [v["id"] for v in voices] == ["english", "spanish"]
+    with patch.object(tts_module, "_voice_catalog", side_effect=AssertionError):
+        assert await service.voices() is voices
+    service.close()
+
+
+@pytest.mark.asyncio
+async def test_repeated_phrases_are_served_from_cache(fake_pyttsx3, tmp_path):
+    executor = ThreadPoolExecutor(max_workers=1, initializer=tts_module._init_worker)
+    service = TTSservice(workers=1, executor=executor, cache=TTSCache(tmp_path))
+
+    # Dos peticiones simultáneas de la misma frase comparten la síntesis
+    first, second = await asyncio.gather(
+        service.generate_audio("Lo siento, tuve un problema.", rate=170),
+        service.generate_audio("Lo siento,  tuve un problema. ", rate=170),
+    )
+    assert first == second
+    with patch.object(tts_module, "_synthesize", side_effect=AssertionError):
+        assert await service.generate_audio("Lo siento, tuve un problema.", rate=170) == first
+    assert service.cache.stats()["misses"] == 1
+    assert service.cache.stats()["memory_hits"] == 1
+    # Otra velocidad es otra entrada
+    assert await service.generate_audio("Lo siento, tuve un problema.", rate=200) != first
+    service.close()
+
+
+@pytest.mark.asyncio
+async def test_cancelled_leader_does_not_cancel_followers(fake_pyttsx3, tmp_path):
+    """Si la sesión que lanzó la síntesis se cancela, las demás reciben el audio igualmente"""
+    executor = ThreadPoolExecutor(max_workers=1, initializer=tts_module._init_worker)
+    service = TTSservice(workers=1, executor=executor, cache=TTSCache(tmp_path))
+    release = asyncio.Event()
+    real_get = service.cache.get
+
+    def slow_get(key):
+        asyncio.run_coroutine_threadsafe(release.wait(), loop).result()
+        return real_get(key)
+
+    loop = asyncio.get_running_loop()
+    with patch.object(service.cache, "get", side_effect=slow_get):
+        leader = asyncio.create_task(service.generate_audio("Hola a todos", rate=170))
+        await asyncio.sleep(0.01)
+        follower = asyncio.create_task(service.generate_audio("Hola a todos", rate=170))
+        await asyncio.sleep(0.01)
+        leader.cancel()
+        await asyncio.sleep(0.01)
+        release.set()
+        assert await follower == b"RIFFHola a todos|170"
+    assert leader.cancelled()
+    assert not service._inflight
+    service.close()
+
+
+def test_pool_is_not_started_on_import():
+    assert TTSservice()._executor is None
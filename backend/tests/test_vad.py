@@ -0,0 +1,70 @@
+import io
+import os
+import wave
+import numpy as np
+import pytest
+from unittest.mock import MagicMock
+
+os.environ.setdefault("OPENAI_API_KEY", "test-key")
+
+from services.vad import Endpointer, VoiceActivityDetector
+from services.stt_service import STTService
+
+SAMPLE_RATE = 16000
+
+
+def _signal(*parts):
+    """Concatena tramos (segundos, hay_voz) de ruido suave o de un tono de 200 Hz"""
+    rng = np.random.default_rng(0)
+    chunks = []
+    for seconds, voiced in parts:
+        n = int(seconds * SAMPLE_RATE)
+        chunk = rng.normal(0, 0.002, n)
+        if voiced:
+            chunk += 0.3 * np.sin(2 * np.pi * 200 * np.arange(n) / SAMPLE_RATE)
+        chunks.append(chunk)
+    return np.concatenate(chunks).astype(np.float32)
+
+
+def _wav(samples):
+    buffer = io.BytesIO()
+    with wave.open(buffer, "wb") as wf:
+        wf.setnchannels(1)
+        wf.setsampwidth(2)
+        wf.setframerate(SAMPLE_RATE)
+        wf.writeframes((samples * 32767).astype(np.int16).tobytes())
+    return buffer.getvalue()
+
+
+def test_trim_removes_leading_and_trailing_silence():
+    """El recorte conserva la voz con un margen pequeño"""
+    vad = VoiceActivityDetector(sample_rate=SAMPLE_RATE)
+    start, end = vad.speech_bounds(_signal((1.0, False), (1.0, True), (1.0, False)))
+    assert 0.7 * SAMPLE_RATE < start <= 1.0 * SAMPLE_RATE
+    assert 2.0 * SAMPLE_RATE <= end < 2.5 * SAMPLE_RATE
+
+
+def test_silence_and_short_clicks_are_not_speech():
+    """El silencio y los chasquidos muy cortos no cuentan como voz"""
+    vad = VoiceActivityDetector(sample_rate=SAMPLE_RATE)
+    assert vad.trim(_signal((2.0, False))) is None
+    assert not vad.has_speech(_signal((1.0, False), (0.03, True), (1.0, False)))
+
+
+def test_endpointer_detects_end_of_utterance_across_chunks():
+    """El final se detecta tras suficiente silencio, aunque el audio llegue en fragmentos"""
+    endpointer = Endpointer(VoiceActivityDetector(sample_rate=SAMPLE_RATE), endpoint_ms=600)
+    samples = _signal((0.5, False), (1.0, True), (1.0, False))
+    chunk = 1600  # 100 ms
+    results = [endpointer.process(samples[i:i + chunk]) for i in range(0, len(samples), chunk)]
+    first_end = results.index(True)
+    assert 20 <= first_end <= 23
+
+
+@pytest.mark.asyncio
+async def test_silent_audio_skips_the_upstream_call():
+    """Un WAV sin voz no llega a la API de Whisper"""
+    service = STTService()
+    service.client = MagicMock()
+    assert await service.transcribe_audio(_wav(_signal((2.0, False)))) is None
+    service.client.audio.transcriptions.create.assert_not_called()
@@ -0,0 +1,232 @@
+import asyncio
+import numpy as np
+import pytest
+
+from services.audio_frames import Codec, parse_audio_frame
+from services.audio_preprocessing import encode_wav
+from services.voice_pipeline import VoicePipeline
+
+
+class FakeSTT:
+    def __init__(self, delay=0.0):
+        self.delay = delay
+
+    async def transcribe_audio(self, audio):
+        await asyncio.sleep(self.delay)
+        return audio.decode() or None
+
+
+class FakeLLM:
+    async def stream_response(self, prompt, **kwargs):
+        for delta in ["Respuesta a ", prompt, ". Fin de la respuesta."]:
+            await asyncio.sleep(0)
+            yield delta
+
+    def clean_response(self, text):
+        return text
+
+
+class FakeTTS:
+    def __init__(self, delay=0.0):
+        self.delay = delay
+
+    async def generate_audio(self, text, rate=None, volume=None):
+        await asyncio.sleep(self.delay)
+        return text.encode()
+
+
+def _make_pipeline(stt=None, tts=None, **kwargs):
+    sent = []
+
+    async def send_json(message):
+        sent.append(message)
+
+    async def send_bytes(payload):
+        sent.append(payload)
+
+    pipeline = VoicePipeline(stt or FakeSTT(), FakeLLM(), tts or FakeTTS(),
+                             send_json=send_json, send_bytes=send_bytes, **kwargs)
+    return pipeline, sent
+
+
+@pytest.mark.asyncio
+async def test_turns_are_processed_in_order():
+    """Los turnos salen en orden y cada cabecera de audio va seguida de su audio"""
+    pipeline, sent = _make_pipeline()
+    pipeline.start()
+    await pipeline.submit_audio(b"primero", {})
+    await pipeline.submit_audio(b"segundo", {})
+    await pipeline.close(drain=True)
+
+    done = [m for m in sent if isinstance(m, dict) and m.get("type") == "response.done"]
+    assert [m["text"] for m in done] == ["Respuesta a primero. Fin de la respuesta.",
+                                         "Respuesta a segundo. Fin de la respuesta."]
+    for i, message in enumerate(sent):
+        if isinstance(message, dict) and message.get("type") == "audio.segment":
+            frame = parse_audio_frame(sent[i + 1])
+            assert frame.message_id == message["audio_id"]
+            assert (frame.sequence, frame.final) == (0, True)
+            assert bytes(frame.payload) == message["text"].encode()
+    audio_done = [m for m in sent if isinstance(m, dict) and m.get("type") == "audio.done"]
+    assert [(m["turn"], m["segments"]) for m in audio_done] == [(0, 2), (1, 2)]
+
+
+@pytest.mark.asyncio
+async def test_next_turn_is_transcribed_while_previous_is_synthesized():
+    """El STT del turno siguiente no espera a que termine el TTS del anterior"""
+    pipeline, sent = _make_pipeline(tts=FakeTTS(delay=0.05))
+    pipeline.start()
+    await pipeline.submit_audio(b"primero", {})
+    await pipeline.submit_audio(b"segundo", {})
+    await asyncio.sleep(0.03)
+    transcriptions = [m for m in sent if isinstance(m, dict) and m.get("type") == "transcription"]
+    assert len(transcriptions) == 2
+    await pipeline.close()
+
+
+@pytest.mark.asyncio
+async def test_submit_applies_backpressure_when_queue_is_full():
+    """Con la cola llena, submit_audio espera en lugar de acumular trabajo"""
+    pipeline, _ = _make_pipeline(stt=FakeSTT(delay=10), queue_size=1)
+    pipeline.start()
+    await pipeline.submit_audio(b"uno", {})
+    await asyncio.sleep(0)
+    await pipeline.submit_audio(b"dos", {})
+    with pytest.raises(asyncio.TimeoutError):
+        await asyncio.wait_for(pipeline.submit_audio(b"tres", {}), timeout=0.05)
+    assert pipeline.queue_depths()["stt"] == 1
+    await pipeline.close()
+
+
+class WavTTS:
+    async def generate_audio(self, text, rate=None, volume=None):
+        return encode_wav(np.zeros(22050, dtype=np.int16), 22050)
+
+
+@pytest.mark.asyncio
+async def test_audio_is_sent_in_negotiated_format():
+    """Con audioCodecs y outputSampleRate en la configuración el audio sale ya codificado"""
+    pipeline, sent = _make_pipeline(tts=WavTTS())
+    pipeline.start()
+    await pipeline.submit_audio(b"hola", {"audioCodecs": ["pcm"], "outputSampleRate": 8000})
+    await pipeline.close(drain=True)
+
+    frames = [parse_audio_frame(m) for m in sent if isinstance(m, bytes)]
+    assert frames and all((f.codec, f.sample_rate) == (Codec.PCM_S16LE, 8000) for f in frames)
+    assert len(frames[0].payload) == 2 * 8000
+
+
+@pytest.mark.asyncio
+async def test_invalid_audio_config_does_not_stop_tts_stage():
+    """Una configuración de audio inválida del cliente no detiene la síntesis"""
+    pipeline, sent = _make_pipeline(tts=WavTTS())
+    pipeline.start()
+    await pipeline.submit_audio(b"hola", {"audioCodecs": 5, "outputSampleRate": "abc"})
+    await pipeline.close(drain=True)
+
+    audio_done = [m for m in sent if isinstance(m, dict) and m.get("type") == "audio.done"]
+    assert [m["segments"] for m in audio_done] == [2]
+    frames = [parse_audio_frame(m) for m in sent if isinstance(m, bytes)]
+    assert frames and all(f.codec == Codec.WAV for f in frames)
+
+
+@pytest.mark.asyncio
+async def test_send_failure_does_not_stop_tts_stage():
+    """Un error al enviar un segmento se registra y la etapa sigue con los siguientes"""
+    pipeline, sent = _make_pipeline()
+    failures = []
+
+    async def flaky_send_bytes(payload):
+        if not failures:
+            failures.append(payload)
+            raise RuntimeError("conexión saturada")
+        sent.append(payload)
+
+    pipeline._send_bytes = flaky_send_bytes
+    pipeline.start()
+    await pipeline.submit_audio(b"primero", {})
+    await pipeline.submit_audio(b"segundo", {})
+    await pipeline.close(drain=True)
+
+    assert len(failures) == 1
+    audio_done = [m for m in sent if isinstance(m, dict) and m.get("type") == "audio.done"]
+    assert [m["turn"] for m in audio_done] == [0, 1]
+
+
+class FailingLLM(FakeLLM):
+    def __init__(self, partial):
+        self.partial = partial
+
+    async def stream_response(self, prompt, **kwargs):
+        from services.llm_service import FailedDelta
+
+        if self.partial:
+            yield "Respuesta a medias"
+        yield FailedDelta("" if self.partial else "Lo siento, tuve un problema.")
+
+
+class FakeMemory:
+    def __init__(self):
+        self.turns = []
+
+    def messages(self, system_prompt, text):
+        return []
+
+    def add_turn(self, text, response):
+        self.turns.append((text, response))
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("partial", [False, True])
+async def test_failed_stream_is_reported_and_not_remembered(monkeypatch, partial):
+    """Un fallo del LLM en streaming se envía con status error y no entra en la memoria"""
+    monkeypatch.setenv("OPENAI_API_KEY", "test-key")
+    memory = FakeMemory()
+    pipeline, sent = _make_pipeline(memory=memory)
+    pipeline.llm_service = FailingLLM(partial)
+    pipeline.start()
+    await pipeline.submit_audio(b"hola", {})
+    await pipeline.close(drain=True)
+
+    done = [m for m in sent if isinstance(m, dict) and m.get("type") == "response.done"]
+    deltas = [m["delta"] for m in sent if isinstance(m, dict) and m.get("type") == "response.delta"]
+    assert [m["status"] for m in done] == ["error"]
+    assert deltas == (["Respuesta a medias"] if partial else ["Lo siento, tuve un problema."])
+    assert memory.turns == []
+
+
+class ScriptedLLM(FakeLLM):
+    def __init__(self, deltas, delay=0.0):
+        self.deltas = deltas
+        self.delay = delay
+
+    async def stream_response(self, prompt, **kwargs):
+        for delta in self.deltas:
+            await asyncio.sleep(self.delay)
+            yield delta
+
+
+@pytest.mark.asyncio
+async def test_slow_tts_does_not_count_against_llm_timeout():
+    """La espera por una cola de TTS llena es backpressure, no tiempo del LLM"""
+    pipeline, sent = _make_pipeline(tts=FakeTTS(delay=0.02), queue_size=1, llm_timeout=0.05)
+    pipeline.llm_service = ScriptedLLM([f"Frase número {i}. " for i in range(12)])
+    pipeline.start()
+    await pipeline.submit_audio(b"hola", {})
+    await pipeline.close(drain=True)
+
+    assert not [m for m in sent if isinstance(m, dict) and m.get("type") == "error"]
+    done = [m for m in sent if isinstance(m, dict) and m.get("type") == "response.done"]
+    assert [m["status"] for m in done] == ["success"]
+
+
+@pytest.mark.asyncio
+async def test_slow_llm_still_times_out():
+    pipeline, sent = _make_pipeline(llm_timeout=0.05)
+    pipeline.llm_service = ScriptedLLM(["Hola. ", "¿Qué tal?"], delay=0.04)
+    pipeline.start()
+    await pipeline.submit_audio(b"hola", {})
+    await pipeline.close(drain=True)
+
+    errors = [m["message"] for m in sent if isinstance(m, dict) and m.get("type") == "error"]
+    assert errors == ["Tiempo de espera agotado al procesar la solicitud"]
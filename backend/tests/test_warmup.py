@@ -0,0 +1,142 @@
+import asyncio
+import pytest
+from unittest.mock import AsyncMock, MagicMock
+
+from services.warmup import Warmup, build_warmup, prefill_phrases, warm_local_llm, warm_stt, warm_tts
+
+
+@pytest.mark.asyncio
+async def test_ready_only_after_all_steps_finish():
+    release = asyncio.Event()
+
+    async def slow():
+        await release.wait()
+        return {"loaded": True}
+
+    warmup = Warmup().add("rapido", lambda: asyncio.sleep(0)).add("lento", slow)
+    warmup.start()
+    await asyncio.sleep(0.01)
+    assert not warmup.ready
+    assert warmup.status()["steps"]["lento"]["status"] == "running"
+
+    release.set()
+    await warmup.wait()
+    assert warmup.ready
+    assert warmup.status()["steps"]["lento"]["loaded"] is True
+
+
+@pytest.mark.asyncio
+async def test_failed_or_slow_steps_do_not_block_readiness():
+    async def failing():
+        raise RuntimeError("sin modelo")
+
+    warmup = Warmup(timeout=0.05).add("roto", failing).add("colgado", lambda: asyncio.sleep(10))
+    await warmup.run()
+    steps = warmup.status()["steps"]
+    assert warmup.ready
+    assert steps["roto"] == {"status": "error", "error": "sin modelo", "ms": steps["roto"]["ms"]}
+    assert steps["colgado"]["status"] == "timeout"
+
+
+def test_prefill_phrases_match_pipeline_segments():
+    response = "Claro que sí, ahora mismo te lo miro. Dame un segundo"
+    # Las mismas oraciones que el segmentador del pipeline entrega al TTS
+    assert prefill_phrases([response], limit=10) == ["Claro que sí, ahora mismo te lo miro.", "Dame un segundo"]
+    assert prefill_phrases(["Uno dos tres cuatro.", "Cinco seis siete ocho."], limit=1) == ["Uno dos tres cuatro."]
+
+
+class FakeTTS:
+    def __init__(self):
+        self.started = False
+        self.calls = []
+
+    async def start(self):
+        self.started = True
+
+    async def voices(self):
+        return [{"id": "es"}]
+
+    async def generate_audio(self, text, rate=None, volume=None):
+        self.calls.append((text, rate, volume))
+        return b"wav"
+
+
+class FakeBackend:
+    name = "fake"
+
+    def __init__(self):
+        self.audio = None
+
+    async def transcribe(self, audio):
+        self.audio = audio
+        return ""
+
+
+class FakeSTT:
+    def __init__(self):
+        self.backend = FakeBackend()
+        self.loaded = False
+
+    async def load(self):
+        self.loaded = True
+
+
+@pytest.mark.asyncio
+async def test_warm_tts_synthesizes_with_pipeline_defaults():
+    tts = FakeTTS()
+    result = await warm_tts(tts, ["Hola."])
+    assert tts.started
+    assert result == {"voices": 1, "prefilled": 1}
+    # Mismos parámetros que el pipeline con la configuración por defecto
+    assert ("Hola.", 170, 0.8) in tts.calls
+
+
+@pytest.mark.asyncio
+async def test_warm_stt_transcribes_directly_on_backend():
+    stt = FakeSTT()
+    assert await warm_stt(stt) == {"backend": "fake"}
+    assert stt.loaded and len(stt.backend.audio) == 16000
+
+
+@pytest.mark.asyncio
+async def test_warm_stt_skips_billable_api_transcription():
+    from services.stt_backends import OpenAIWhisperBackend
+
+    client = MagicMock()
+    client.audio.transcriptions.create = AsyncMock()
+    stt = FakeSTT()
+    stt.backend = OpenAIWhisperBackend(client=client)
+    assert await warm_stt(stt) == {"backend": "openai"}
+    assert stt.loaded and not client.audio.transcriptions.create.called
+
+
+@pytest.mark.asyncio
+async def test_build_warmup_prefills_canned_responses(monkeypatch):
+    from services import warmup as warmup_module
+
+    async def no_http():
+        return {}
+
+    monkeypatch.setattr(warmup_module, "warm_http", no_http)
+    tts = FakeTTS()
+    warmup = build_warmup(FakeSTT(), tts, prefill=4)
+    await warmup.run()
+    assert warmup.ready
+    assert warmup.status()["steps"]["tts"]["prefilled"] == 4
+
+
+@pytest.mark.asyncio
+async def test_local_llm_is_warmed_only_when_configured(monkeypatch):
+    from services.local_llm import LocalLLMClient, get_local_llm
+
+    monkeypatch.setattr(get_local_llm(), "model_path", "")
+    assert "local_llm" not in build_warmup(FakeSTT(), FakeTTS()).status()["steps"]
+    monkeypatch.setattr(get_local_llm(), "model_path", "echo")
+    assert "local_llm" in build_warmup(FakeSTT(), FakeTTS()).status()["steps"]
+
+    client = LocalLLMClient(model_path="echo", start_timeout=30)
+    try:
+        assert await warm_local_llm(client) is not None
+        assert client.running
+    finally:
+        await client.close()